@@ -0,0 +1,77 @@
+"""スナップショットの保存・読み込みを従来の JSON と各コーデックで比較するベンチマーク
+
+    python benchmarks/bench_codecs.py [--sizes 1000 10000 100000] [--codecs compact binary]
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_event_collection import make_events  # noqa: E402
+from event_codec import CODECS, msgpack  # noqa: E402
+from event_store import JournalStore, deserialize_event, serialize_event  # noqa: E402
+
+
+# --- 従来の保存・読み込み (save_events_to_file / load_events_from_file の元の実装と同じ) ---
+def legacy_save(path, events):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([serialize_event(ev) for ev in events], f, ensure_ascii=False, indent=4)
+
+
+def legacy_load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [deserialize_event(record) for record in json.load(f)]
+
+
+def bench(n, codec_names, directory):
+    events = make_events(n)
+    for i, ev in enumerate(events):
+        ev['description'] = "会場: 市民体育館 / 持ち物: 参加費" if i % 3 else ''
+        if i % 10 == 0: # 複数日のイベントも混ぜる (終了日のあるレコードは1件ずつ変換される)
+            ev['end_date'] = ev['date'] + datetime.timedelta(days=2)
+    legacy_path = os.path.join(directory, f"legacy-{n}.json")
+
+    def seconds(fn):
+        return min(timeit.repeat(fn, number=1, repeat=3))
+
+    rows = [('legacy', seconds(lambda: legacy_save(legacy_path, events)), seconds(lambda: legacy_load(legacy_path)),
+             os.path.getsize(legacy_path))]
+    for name in codec_names:
+        path = os.path.join(directory, f"{name}-{n}.snapshot")
+        store = JournalStore(path, codec=name)
+        save = seconds(lambda: store.save_all(events))
+        load = seconds(store.load_events)
+        assert store.load_events() == events, name
+        rows.append((name, save, load, os.path.getsize(path)))
+    return rows
+
+
+def main():
+    available = [name for name in CODECS if name != 'msgpack' or msgpack is not None]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--codecs", nargs="+", default=available, choices=available)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench-codecs-")
+    try:
+        print(f"{'events':>8} {'codec':>8} {'save (ms)':>10} {'load (ms)':>10} {'size (KB)':>10} "
+              f"{'save x':>7} {'load x':>7} {'size':>6}")
+        for n in args.sizes:
+            rows = bench(n, args.codecs, directory)
+            _, base_save, base_load, base_size = rows[0]
+            for name, save, load, size in rows:
+                print(f"{n:>8} {name:>8} {save * 1e3:>10.1f} {load * 1e3:>10.1f} {size / 1024:>10.0f} "
+                      f"{base_save / save:>6.1f}x {base_load / load:>6.1f}x {size / base_size:>5.0%}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
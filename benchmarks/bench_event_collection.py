@@ -0,0 +1,106 @@
+"""event_list の線形探索と EventCollection の id 索引を比較するベンチマーク
+
+    python benchmarks/bench_event_collection.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_collection import EventCollection  # noqa: E402
+
+
+def make_events(n, seed=0):
+    rng = random.Random(seed)
+    base = datetime.date(2025, 1, 1)
+    return [{
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'title': f"イベント{i}",
+        'date': base + datetime.timedelta(days=rng.randrange(365)),
+        'deadline': base + datetime.timedelta(days=rng.randrange(365)),
+        'description': '',
+    } for i in range(n)]
+
+
+# --- 従来の event_list に対する処理 (entry_cal.py の元の実装と同じ) ---
+def list_get(events, event_id):
+    return next((ev for ev in events if ev.get('id') == event_id), None)
+
+
+def list_update(events, new_event):
+    for i, ev in enumerate(events):
+        if ev.get('id') == new_event['id']:
+            events[i] = new_event
+            break
+
+
+def list_delete(events, event_id):
+    return [ev for ev in events if ev.get('id') != event_id]
+
+
+def list_position(events, event_id):
+    options = [("イベントを選択...", None)] + [(ev['title'], ev['id']) for ev in events]
+    for i, option in enumerate(options):
+        if option[1] == event_id:
+            return i
+    return 0
+
+
+def bench(n, repeat):
+    events = make_events(n)
+    collection = EventCollection(events)
+    rng = random.Random(1)
+    targets = [rng.choice(events)['id'] for _ in range(repeat)]
+    results = {}
+
+    def per_op(fn):
+        return min(timeit.repeat(fn, number=1, repeat=3)) / repeat * 1e6
+
+    results['get'] = (per_op(lambda: [list_get(events, t) for t in targets]),
+                      per_op(lambda: [collection.get(t) for t in targets]))
+    results['update'] = (per_op(lambda: [list_update(events, {'id': t, 'title': 'x'}) for t in targets]),
+                         per_op(lambda: [collection.update({'id': t, 'title': 'x'}) for t in targets]))
+    results['position'] = (per_op(lambda: [list_position(events, t) for t in targets]),
+                           per_op(lambda: [collection.position(t) for t in targets]))
+
+    # 削除は対象が減っていくので、毎回コピーから始める (コピーの時間は計測に含めない)
+    state = {}
+
+    def delete_list():
+        remaining = state['list']
+        for t in targets:
+            remaining = list_delete(remaining, t)
+
+    def delete_collection():
+        remaining = state['collection']
+        for t in targets:
+            remaining.delete(t)
+
+    results['delete'] = (
+        min(timeit.repeat(delete_list, setup=lambda: state.update(list=list(events)), number=1, repeat=3)) / repeat * 1e6,
+        min(timeit.repeat(delete_collection, setup=lambda: state.update(collection=EventCollection(events)),
+                          number=1, repeat=3)) / repeat * 1e6,
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20, help="1サイズあたりの操作回数")
+    args = parser.parse_args()
+
+    print(f"{'events':>8} {'op':>9} {'list (us/op)':>14} {'index (us/op)':>14} {'speedup':>9}")
+    for n in args.sizes:
+        for op, (list_us, index_us) in bench(n, args.repeat).items():
+            speedup = list_us / index_us if index_us > 0 else float('inf')
+            print(f"{n:>8} {op:>9} {list_us:>14.2f} {index_us:>14.2f} {speedup:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
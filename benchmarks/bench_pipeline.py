@@ -0,0 +1,168 @@
+"""entry_cal.py の各処理を合成データで計測し、結果を JSON で出力するベンチマーク
+
+    python benchmarks/bench_pipeline.py [--sizes 1000 10000 100000 1000000] [--output result.json]
+
+コミットごとの結果を保存しておけば、変更の前後を比較できる。各段階の値は repeat 回のうちの最短時間 (秒)。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_payload import CalendarPayloadCache, date_calendar_payload, deadline_calendar_payload  # noqa: E402
+from calendar_window import default_window  # noqa: E402
+from event_archive import EventArchive, archive_past_events  # noqa: E402
+from event_store import JournalStore, snapshot_codec  # noqa: E402
+from event_columns import EventColumns  # noqa: E402
+from event_search import SearchIndex  # noqa: E402
+from event_views import (clash_warning, deadline_counts, duplicate_warnings, expired_deadline_lines,  # noqa: E402
+                         selectbox_index, selector_page, upcoming_deadline_lines)
+from shared_store import SharedEventStore  # noqa: E402
+from synthetic import SYNTHETIC_TODAY, generate_events  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+SEARCH_QUERIES = ("東京", "マラソン大会", "京都 将棋", "参加費", "オープン 予選")
+
+
+def best_of(fn, repeat):
+    """fn を repeat 回実行した最短時間 (秒) と、最後の戻り値を返す"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def notice_panel(shared_store, today):
+    """お知らせ欄 (申込締切情報の1ページ目・締切済・重複チェック) の内容を作る"""
+    expired_count, _, _ = deadline_counts(shared_store, today)
+    return (upcoming_deadline_lines(shared_store, today),
+            expired_deadline_lines(shared_store, today, expired_count),
+            duplicate_warnings(shared_store))
+
+
+def columnar_summary(shared_store, today):
+    """列を作り直して、締切の区分・日付ごとの件数・月ごとの件数をまとめて求める"""
+    columns = EventColumns(shared_store.events())
+    return columns.status_counts(today), columns.date_counts(), columns.month_histogram()
+
+
+def search_index_build(shared_store):
+    """作り置きの無い状態から検索の索引を作る (最初の検索で作られる)"""
+    index = SearchIndex()
+    index.rebuild(shared_store.events())
+    index.search("")
+    return index
+
+
+def event_selector(shared_store, editing_id):
+    """イベント選択の選択肢 (検索語なし・検索語ごと) と編集中のイベントの位置を作る"""
+    options = []
+    for query in ("",) + SEARCH_QUERIES:
+        page_options, _, _ = selector_page(shared_store, query, editing_id=editing_id)
+        options.append((page_options, selectbox_index(page_options, editing_id)))
+    return options
+
+
+def editor_fragment(shared_store, editing_id, today):
+    """フォームに入力したときに再実行される部分 (選択肢の1ページ目と日程の重なりの確認) を作る"""
+    page_options, _, _ = selector_page(shared_store, editing_id=editing_id)
+    event_date = today + datetime.timedelta(days=7)
+    return page_options, selectbox_index(page_options, editing_id), clash_warning(shared_store, event_date,
+                                                                                  exclude_id=editing_id)
+
+
+def calendar_payloads(shared_store, build, field, window):
+    """作り置きの無い状態から、表示期間 1 か月分のカレンダーのイベント辞書を作る"""
+    cache = CalendarPayloadCache(build)
+    return cache.payloads(lambda: shared_store.events_in_window(field, *window), shared_store.version, window)
+
+
+def bench_size(n, seed, repeat, directory):
+    """n 件のデータで各段階を計測し、{段階: 秒} を返す"""
+    events = generate_events(n, seed)
+    store = JournalStore(os.path.join(directory, f"events-{n}.json"))
+    today = SYNTHETIC_TODAY
+    window = default_window(today)
+    results = {}
+
+    results['save_events_to_file'], _ = best_of(lambda: store.save_all(events), repeat)
+    results['load_events_from_file'], loaded = best_of(store.load_events, repeat)
+    assert len(loaded) == n
+    results['shared_store_build'], shared = best_of(lambda: SharedEventStore(store), repeat)
+    results['notice_panel'], _ = best_of(lambda: notice_panel(shared, today), repeat)
+    results['columnar_summary'], _ = best_of(lambda: columnar_summary(shared, today), repeat)
+    editing_id = events[n // 2]['id']
+    results['search_index_build'], _ = best_of(lambda: search_index_build(shared), repeat)
+    shared.search("") # 共有ストアの検索の索引は最初の検索で作られるので、ここで作っておく
+    results['selectbox_options'], _ = best_of(lambda: event_selector(shared, editing_id), repeat)
+    results['editor_fragment'], _ = best_of(lambda: editor_fragment(shared, editing_id, today), repeat)
+    results['deadline_calendar_payloads'], _ = best_of(
+        lambda: calendar_payloads(shared, deadline_calendar_payload, 'deadline', window), repeat)
+    results['date_calendar_payloads'], _ = best_of(
+        lambda: calendar_payloads(shared, date_calendar_payload, 'date', window), repeat)
+    results['snapshot_bytes'] = os.path.getsize(store.path)
+    # 過去のイベントをアーカイブに移し、残った作業中の一覧で読み込みとお知らせ欄を計測する (移すのは1回だけ)
+    archive = EventArchive.for_store(store)
+    results['archive_tiering'], _ = best_of(lambda: archive_past_events(shared, archive, today), 1)
+    store.compact() # 削除はジャーナルに追記されるので、読み込みの前にスナップショットに畳み込んでおく
+    results['hot_shared_store_build'], hot = best_of(lambda: SharedEventStore(store), repeat)
+    results['hot_notice_panel'], _ = best_of(lambda: notice_panel(hot, today), repeat)
+    results['hot_events'] = len(hot.events())
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="結果の JSON を書き出すファイル (省略時は標準出力)")
+    args = parser.parse_args()
+
+    report = {
+        'benchmark': 'pipeline',
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'snapshot_codec': snapshot_codec().name,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': {},
+    }
+    directory = tempfile.mkdtemp(prefix="bench-pipeline-")
+    try:
+        for n in args.sizes:
+            report['results'][str(n)] = bench_size(n, args.seed, args.repeat, directory)
+            print(f"{n} events done", file=sys.stderr)
+    finally:
+        shutil.rmtree(directory)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
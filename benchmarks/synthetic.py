@@ -0,0 +1,82 @@
+"""ベンチマーク用の合成イベントデータを作る (シードを固定すれば毎回同じデータになる)
+
+    python benchmarks/synthetic.py 10000 > events_data.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import serialize_event  # noqa: E402
+
+SYNTHETIC_TODAY = datetime.date(2026, 4, 1) # 実行日によって結果が変わらないように「今日」を固定する
+
+CITIES = ("札幌", "仙台", "さいたま", "千葉", "東京", "横浜", "新潟", "金沢", "静岡", "名古屋",
+          "京都", "大阪", "神戸", "岡山", "広島", "松山", "福岡", "熊本", "鹿児島", "那覇")
+ACTIVITIES = ("マラソン", "ハーフマラソン", "トライアスロン", "サイクリング", "水泳", "テニス", "卓球",
+              "バドミントン", "将棋", "囲碁", "書道", "合唱", "吹奏楽", "プログラミング", "写真")
+TITLE_PATTERNS = (
+    "第{n}回{city}{activity}大会",
+    "{city}市民{activity}選手権",
+    "{season}の{activity}フェスティバル{year}",
+    "{city}{activity}教室 ({season}期)",
+    "全日本{activity}オープン {city}予選",
+)
+SEASONS = ("春", "夏", "秋", "冬")
+DESCRIPTION_PARTS = (
+    "会場: {city}市総合運動公園",
+    "参加費: {fee:,}円 (当日支払い不可)",
+    "定員: {capacity}名 (先着順)",
+    "持ち物: 運動靴、タオル、飲み物",
+    "雨天決行・荒天中止",
+    "申込は公式ウェブサイトから受け付けます。",
+    "集合時間は開始の30分前です。",
+    "小学生以下は保護者の同伴が必要です。",
+)
+LEAD_DAYS = (7, 10, 14, 14, 21, 30, 30, 45, 60, 90) # イベント日から申込締切日までの日数 (よくある値ほど多く入れる)
+
+
+def synthetic_event(rng, index, today=SYNTHETIC_TODAY, past_days=365, future_days=730, multi_day_ratio=0.1):
+    """1件分の合成イベント (日付は datetime.date) を返す"""
+    city = rng.choice(CITIES)
+    activity = rng.choice(ACTIVITIES)
+    date = today + datetime.timedelta(days=rng.randint(-past_days, future_days))
+    if rng.random() < 0.6: # イベントは週末に寄せる
+        date += datetime.timedelta(days=(5 - date.weekday()) % 7)
+    event = {
+        'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        'title': rng.choice(TITLE_PATTERNS).format(n=index % 50 + 1, city=city, activity=activity,
+                                                   season=rng.choice(SEASONS), year=date.year),
+        'date': date,
+        'deadline': date - datetime.timedelta(days=rng.choice(LEAD_DAYS)),
+        'description': "" if rng.random() < 0.15 else "\n".join(
+            part.format(city=city, fee=rng.randrange(500, 10_000, 500), capacity=rng.randrange(20, 2_000, 10))
+            for part in rng.sample(DESCRIPTION_PARTS, rng.randint(1, 4))),
+    }
+    if rng.random() < multi_day_ratio:
+        event['end_date'] = date + datetime.timedelta(days=rng.randint(1, 3))
+    return event
+
+
+def generate_events(n, seed=0, today=SYNTHETIC_TODAY, **options):
+    """n 件の合成イベントのリストを返す"""
+    rng = random.Random(seed)
+    return [synthetic_event(rng, i, today=today, **options) for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    json.dump([serialize_event(ev) for ev in generate_events(args.count, args.seed)], sys.stdout,
+              ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import datetime
+import threading
+
+# 編集中のイベントを強調表示するときに上書きする項目
+HIGHLIGHT_STYLE = {'backgroundColor': 'tomato', 'borderColor': 'red'}
+
+
+def deadline_calendar_payload(ev):
+    """申込締切日カレンダーに渡すイベント辞書"""
+    return {
+        'title': f"締切: {ev['title']}",
+        'start': ev['deadline'].isoformat(),
+        'end': ev['deadline'].isoformat(),
+        'allDay': True,
+        'extendedProps': {'id': ev.get('id'), 'original_title': ev['title']}
+    }
+
+
+def date_calendar_payload(ev):
+    """イベント日カレンダーに渡すイベント辞書"""
+    return {
+        'title': ev['title'],
+        'start': ev['date'].isoformat(),
+        # FullCalendar の終日イベントの end は終了日の翌日 (その日を含まない)
+        'end': (ev['end_date'] + datetime.timedelta(days=1)).isoformat() if ev.get('end_date') else ev['date'].isoformat(),
+        'allDay': True,
+        'extendedProps': {'id': ev.get('id'), 'original_title': ev['title']}
+    }
+
+
+class CalendarPayloadCache:
+    """カレンダーに渡すイベント辞書の一覧を、データの version と表示期間ごとに作り置きする
+
+    イベント辞書はイベントごとにも作り置きし、イベントが差し替えられていなければ
+    (SharedEventStore はイベントを書き換えずに差し替えるので、同一オブジェクトなら未変更)
+    version が進んでも isoformat() などをやり直さずに使い回す。
+    編集中のイベントの強調表示は、作り置きの一覧をコピーして該当の1件だけ差し替える。
+    作り置きの辞書は全セッションで共有するので、書き換えてはいけない。
+    """
+
+    def __init__(self, build, max_lists=16):
+        self._build = build
+        self._max_lists = max_lists
+        self._lock = threading.Lock()
+        self._entries = {}  # id -> (イベント, イベント辞書)
+        self._lists = {}    # (version, 表示期間) -> (イベント辞書の一覧, id -> 一覧での位置)
+
+    def payloads(self, fetch_events, version, window, highlight_id=None):
+        """表示期間のイベント辞書の一覧を返す。fetch_events() は作り置きが無いときだけ呼ばれる"""
+        key = (version, window)
+        with self._lock:
+            cached = self._lists.get(key)
+            if cached is None:
+                cached = self._build_list(fetch_events())
+                if len(self._lists) >= self._max_lists:
+                    self._lists.pop(next(iter(self._lists)))
+                self._lists[key] = cached
+        payload_list, position_of = cached
+        position = position_of.get(highlight_id) if highlight_id else None
+        if position is None:
+            return payload_list
+        patched = list(payload_list)
+        patched[position] = {**payload_list[position], **HIGHLIGHT_STYLE}
+        return patched
+
+    def _build_list(self, events):
+        payload_list = []
+        position_of = {}
+        for ev in events:
+            entry = self._entries.get(ev['id'])
+            if entry is None or entry[0] is not ev:
+                entry = (ev, self._build(ev))
+                self._entries[ev['id']] = entry
+            position_of[ev['id']] = len(payload_list)
+            payload_list.append(entry[1])
+        # 削除されたイベントや表示されなくなったイベントの作り置きが溜まりすぎたら捨てる
+        if len(self._entries) > 4 * len(payload_list) + 1000:
+            self._entries = {ev['id']: self._entries[ev['id']] for ev in events}
+        return payload_list, position_of
@@ -0,0 +1,28 @@
+import datetime
+
+# dayGridMonth は月初を含む週から6週間分を表示するので、最初の描画ではその範囲を仮の表示期間にする
+_MONTH_GRID_DAYS = 42
+
+
+def default_window(today):
+    """datesSet がまだ届いていないときの表示期間 (today の月の月表示) を (開始日, 終了日) で返す"""
+    first_of_month = today.replace(day=1)
+    # 週の始まりは日曜 (FullCalendar の ja ロケールの既定)
+    start = first_of_month - datetime.timedelta(days=(first_of_month.weekday() + 1) % 7)
+    return start, start + datetime.timedelta(days=_MONTH_GRID_DAYS - 1)
+
+
+def window_from_state(calendar_state):
+    """streamlit_calendar の戻り値が datesSet なら表示期間を (開始日, 終了日) で返す。それ以外は None
+
+    datesSet の end は表示期間の翌日 (その日を含まない) なので、1日戻して両端を含む期間にする。
+    """
+    if not calendar_state or calendar_state.get('callback') != 'datesSet':
+        return None
+    dates_set = calendar_state.get('datesSet') or {}
+    try:
+        start = datetime.date.fromisoformat(dates_set['start'][:10])
+        end = datetime.date.fromisoformat(dates_set['end'][:10]) - datetime.timedelta(days=1)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return start, end
@@ -1,67 +1,154 @@
 import datetime
 import streamlit as st
 import streamlit_calendar as st_calendar
-from collections import Counter
+import csv # 一括登録のエラー処理のため
 import json # JSON操作のため
-import os   # ファイルの存在確認のため
+import sqlite3 # SQLite バックエンドのエラー処理のため
 import uuid # 一意のIDを生成するため
+from event_api import EventApi, server_config_from_env, start_server
+from event_archive import EventArchive, archive_after_days, archive_past_events, window_events
+from event_bulk import apply_bulk
+from event_codec import SnapshotDecodeError
+from event_export import ExportCache
+from event_history import EventHistory, HistoryConflictError
+from event_model import InvalidEventError
+from event_recurrence import RRULE_FIELD, RecurrenceRule
+from event_import import import_stream
+from event_store import ValidationReport, open_store
+from event_views import (BULK_SELECT_COLUMN, archive_search_lines, archive_status_line, bulk_table_rows, clash_warning,
+                         deadline_counts, deadline_status_line, duplicate_warnings, expired_deadline_lines, has_notice_events, month_counts, selectbox_index, selector_page,
+                         upcoming_deadline_lines)
+from gcal_sync import CalendarSync, SyncJob, SyncState, client_from_env
+from calendar_payload import CalendarPayloadCache, date_calendar_payload, deadline_calendar_payload
+from calendar_window import default_window, window_from_state
+from reminder_service import ReminderScheduler, ReminderState, notifier_from_env
+from rerun_profiler import (DEBUG_ENV, DEBUG_QUERY_PARAM, PROFILE_ENV, PROFILE_QUERY_PARAM, RerunProfiler, RerunStats,
+                            flag_enabled, timed_fragment)
+from shared_store import SharedEventStore
 
-# --- 定数定義 ---
-DATA_FILE = "events_data.json" # イベントデータを保存するファイル名
+# --- 再実行の計測 ---
+@st.cache_resource
+def get_rerun_stats():
+    """全セッションの再実行の段階ごとの所要時間 (直近の分の p50/p95 を計算する)"""
+    return RerunStats()
+
+# ?profile=1 または環境変数 ENTRY_CAL_PROFILE=1 のときは再実行全体を cProfile で記録する
+rerun_profiler = RerunProfiler(get_rerun_stats(), profile=flag_enabled(st.query_params, PROFILE_QUERY_PARAM, PROFILE_ENV))
+rerun_profiler.phase("load")
 
 # --- データ永続化関数 ---
+# 保存先は環境変数 EVENT_STORE_BACKEND で選ぶ (journal: JSON + 追記ジャーナル (既定) / json / sqlite)
+event_store = open_store()
+
 def save_events_to_file(events):
-    """イベントリストをJSONファイルに保存する"""
-    serializable_events = []
-    for event in events:
-        serializable_event = event.copy()
-        if 'id' not in serializable_event or serializable_event['id'] is None:
-            serializable_event['id'] = str(uuid.uuid4())
-        if 'date' in serializable_event and isinstance(serializable_event['date'], datetime.date):
-            serializable_event['date'] = serializable_event['date'].isoformat()
-        if 'deadline' in serializable_event and isinstance(serializable_event['deadline'], datetime.date):
-            serializable_event['deadline'] = serializable_event['deadline'].isoformat()
-        serializable_events.append(serializable_event)
-    
+    """イベントリスト全体をストレージに保存する"""
+    try:
+        event_store.save_all(events)
+    except (IOError, sqlite3.Error) as e:
+        st.error(f"エラー: イベントデータの保存に失敗しました。 {e}")
+
+def persist_event_change(op, payload, label):
+    """1件分の変更 (add/update/delete) を保存して共有のイベント一覧に反映する。成功したら True
+
+    変更はこのセッションの履歴に残り、「元に戻す」で取り消せる。
+    """
     try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(serializable_events, f, ensure_ascii=False, indent=4)
-    except IOError as e:
+        st.session_state.event_history.apply(shared_event_store, [(op, payload)], label)
+        return True
+    except (IOError, sqlite3.Error) as e:
         st.error(f"エラー: イベントデータの保存に失敗しました。 {e}")
+        return False
+
+def persist_bulk_change(ids, action, label, days=0, deadline=None):
+    """選んだイベントへのまとめての変更を1回で保存して反映する。変更した件数 (失敗したら None) を返す"""
+    try:
+        return apply_bulk(shared_event_store, ids, action, days, deadline,
+                          history=st.session_state.event_history, label=label)
+    except (IOError, sqlite3.Error) as e:
+        st.error(f"エラー: イベントデータの保存に失敗しました。 {e}")
+    except InvalidEventError:
+        st.error("エラー: 日付をずらした結果が扱える範囲を超えるイベントがあります。")
+    return None
 
 def load_events_from_file():
-    """JSONファイルからイベントリストを読み込む"""
-    if not os.path.exists(DATA_FILE):
-        return [] # ファイルが存在しない場合は空のリストを返す
-    
+    """ストレージからイベントリストを読み込む"""
+    report = ValidationReport()
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            loaded_events_str = json.load(f)
-            deserialized_events = []
-            for event_str in loaded_events_str:
-                # ISOフォーマット文字列をdatetime.dateオブジェクトに変換
-                deserialized_event = event_str.copy()
-                if 'date' in deserialized_event and isinstance(deserialized_event['date'], str):
-                    try:
-                        deserialized_event['date'] = datetime.date.fromisoformat(deserialized_event['date'])
-                    except ValueError:
-                        st.warning(f"警告: イベント「{deserialized_event.get('title', '(無題)')}」の日付形式が無効です。このイベントは読み込まれません。")
-                        continue # 不正な形式のデータはスキップ
-                if 'deadline' in deserialized_event and isinstance(deserialized_event['deadline'], str):
-                    try:
-                        deserialized_event['deadline'] = datetime.date.fromisoformat(deserialized_event['deadline'])
-                    except ValueError:
-                        st.warning(f"警告: イベント「{deserialized_event.get('title', '(無題)')}」の締切日形式が無効です。このイベントは読み込まれません。")
-                        continue # 不正な形式のデータはスキップ
-                deserialized_events.append(deserialized_event)
-            return deserialized_events
-    except (IOError, json.JSONDecodeError) as e:
+        # スナップショットは少しずつ読みながら Event にし、不正なレコードや壊れた部分は飛ばして読み進める
+        events = event_store.load_events(report=report)
+    except (IOError, json.JSONDecodeError, SnapshotDecodeError, sqlite3.Error) as e:
         st.error(f"エラー: イベントデータの読み込みに失敗しました。 {e}")
-        return [] 
+        return []
+    if report:
+        show_load_report(report)
+    return events
+
+def show_load_report(report):
+    """読み込めなかったレコードを、1件ずつではなく種類ごとの件数と先頭の例にまとめて警告する"""
+    kind_labels = {'date': "日付", 'deadline': "締切日", 'end_date': "終了日",
+                   'syntax': "JSON の形式", 'record': "レコードの形式", 'truncated': "ファイルの途中での終わり"}
+    breakdown = "、".join(f"{kind_labels.get(kind, kind)} {count}件" for kind, count in report.error_counts.items())
+    st.warning(f"⚠️ イベントデータのうち {report.error_count}件を読み込めなかったため除外しました ({breakdown})。"
+               f"読み込めた {report.accepted}件は利用できます。")
+    with st.expander("読み込めなかったレコードの例"):
+        st.markdown("\n".join(f"- {f'{location}件目' if location else 'ジャーナル'}「{title}」: {message}"
+                               for location, title, message in report.examples))
+        if report.error_count > len(report.examples):
+            st.caption(f"ほか {report.error_count - len(report.examples)}件")
     
+@st.cache_resource
+def get_shared_event_store():
+    """プロセス内で1つだけのイベントストアを返す (全セッションで共有し、セッションごとには読み込まない)"""
+    return SharedEventStore(event_store, loader=load_events_from_file)
+
+shared_event_store = get_shared_event_store()
+
+@st.cache_resource
+def get_reminder_scheduler():
+    """締切のリマインダーを送るスレッド (環境変数 REMINDER_NOTIFIER で送り方を設定したときだけ動かす)"""
+    notifier = notifier_from_env()
+    if notifier is None:
+        return None
+    scheduler = ReminderScheduler(notifier, ReminderState())
+    shared_event_store.add_index('reminders', scheduler) # 以後はイベントの変更のたびに該当の予定だけ入れ直す
+    scheduler.start()
+    return scheduler
+
+get_reminder_scheduler()
+
+@st.cache_resource
+def get_event_archive():
+    """過去のイベントのアーカイブ (全セッションで共有し、過去の表示や検索で必要になるまで読み込まない)"""
+    return EventArchive.for_store(event_store)
+
+@st.cache_resource
+def archive_past_events_once(today):
+    """日付が変わって最初の再実行で、終わってから日数の経ったイベントを共有の一覧からアーカイブに移す"""
+    after_days = archive_after_days() # 環境変数 EVENT_ARCHIVE_AFTER_DAYS (既定 30日、"off" で無効)
+    if after_days is None:
+        return 0
+    return archive_past_events(shared_event_store, event_archive, today, after_days)
+
+event_archive = get_event_archive()
+try:
+    archive_past_events_once(datetime.date.today())
+except (IOError, sqlite3.Error) as e: # 失敗した場合はキャッシュされないので、次の再実行でやり直す
+    st.error(f"エラー: 過去のイベントのアーカイブに失敗しました。 {e}")
+
+@st.cache_resource
+def get_event_api_server():
+    """HTTP/JSON API (環境変数 EVENT_API_PORT を設定したときだけ、画面と同じ共有ストアの上で動かす)"""
+    config = server_config_from_env()
+    if config is None:
+        return None
+    host, port, token = config
+    return start_server(EventApi(shared_event_store, event_archive, token=token), host, port)
+
+get_event_api_server()
+shared_event_store.refresh_if_stale() # 別プロセスがファイルを書き換えていれば読み直す
+
 # --- セッションステートの初期化 ---
-if 'event_list' not in st.session_state:
-    st.session_state.event_list = load_events_from_file()
+rerun_profiler.phase("session")
 
 
 if 'edit_mode' not in st.session_state:
@@ -70,6 +157,8 @@ if 'editing_event_id' not in st.session_state:
     st.session_state.editing_event_id = None
 if 'should_clear_form' not in st.session_state:
     st.session_state.should_clear_form = True
+if 'event_history' not in st.session_state: # 元に戻す/やり直すの履歴 (変更したイベントだけを持つ)
+    st.session_state.event_history = EventHistory()
 if 'submitted' not in st.session_state:
     st.session_state.submitted = False
 if 'load_event_to_form_flag' not in st.session_state:
@@ -80,80 +169,97 @@ FORM_EVENT_NAME_KEY = 'form_event_name'
 FORM_EVENT_DATE_KEY = 'form_event_date'
 FORM_EVENT_DEADLINE_KEY = 'form_event_deadline'
 FORM_EVENT_DESCRIPTION_KEY = 'form_event_description'
+FORM_EVENT_MULTI_DAY_KEY = 'form_event_multi_day'
+FORM_EVENT_END_DATE_KEY = 'form_event_end_date'
+FORM_EVENT_RRULE_KEY = 'form_event_rrule'
 SELECTBOX_EVENT_SELECTION_KEY = 'selectbox_event_selection_key'
+NOTICE_PAGE_KEY = 'notice_page'
+EVENT_SEARCH_KEY = 'event_search'
+EVENT_SEARCH_PAGE_KEY = 'event_search_page'
+IMPORT_FILE_KEY = 'import_file'
+ARCHIVE_SEARCH_KEY = 'archive_search'
+EXPORT_INCLUDE_ARCHIVE_KEY = 'export_include_archive'
+EXPORT_PREPARED_KEY = 'export_prepared' # 形式 -> 準備を頼まれたときのデータの version
+BULK_START_KEY = 'bulk_start'
+BULK_END_KEY = 'bulk_end'
+BULK_QUERY_KEY = 'bulk_query'
+BULK_SELECT_ALL_KEY = 'bulk_select_all'
+BULK_ACTION_KEY = 'bulk_action'
+BULK_DAYS_KEY = 'bulk_days'
+BULK_DEADLINE_KEY = 'bulk_deadline'
+BULK_ACTION_LABELS = {'delete': "削除", 'shift': "日付をずらす", 'deadline': "申込締切日を変更"}
+PAGE_RERUN_KEY = 'page_rerun_requested' # フラグメントの外 (カレンダーの強調表示など) も描き直す必要があるか
+# カレンダーごとの表示期間 (datesSet で受け取った範囲) を保持するキー
+CALENDAR_WINDOW_KEYS = {'deadline_calendar': 'deadline_calendar_window', 'event_date_calendar': 'event_date_calendar_window'}
 
 
-# フォームの初期値を設定 (クリア時や初回ロード時)
-if st.session_state.should_clear_form:
-    st.session_state[FORM_EVENT_NAME_KEY] = 'イベント名'
-    st.session_state[FORM_EVENT_DATE_KEY] = datetime.date.today() + datetime.timedelta(days=7)
-    st.session_state[FORM_EVENT_DEADLINE_KEY] = datetime.date.today()
-    st.session_state[FORM_EVENT_DESCRIPTION_KEY] = ''
-    st.session_state.should_clear_form = False
-    st.session_state.edit_mode = False
-    st.session_state.editing_event_id = None
-    # selectbox の選択もリセットされるようにキーの値をNoneにする (次回描画時にindexが先頭になる)
-    if SELECTBOX_EVENT_SELECTION_KEY in st.session_state:
-         st.session_state[SELECTBOX_EVENT_SELECTION_KEY] = None
-
-
-# 編集モードでイベントが選択された場合、フォームに値をロード
-if st.session_state.load_event_to_form_flag and st.session_state.editing_event_id:
-    event_to_load = next((ev for ev in st.session_state.event_list if ev.get('id') == st.session_state.editing_event_id), None)
-    if event_to_load:
-        st.session_state[FORM_EVENT_NAME_KEY] = event_to_load.get('title', '')
-        st.session_state[FORM_EVENT_DATE_KEY] = event_to_load.get('date', datetime.date.today() + datetime.timedelta(days=7))
-        st.session_state[FORM_EVENT_DEADLINE_KEY] = event_to_load.get('deadline', datetime.date.today())
-        st.session_state[FORM_EVENT_DESCRIPTION_KEY] = event_to_load.get('description', '')
-    st.session_state.load_event_to_form_flag = False
+# --- 部分的な再実行 ---
+# ページはお知らせ・イベントの編集・各カレンダーなどのフラグメントに分かれていて、フラグメントの中の
+# ウィジェットを操作したときはそのフラグメントだけが再実行される (フォームへの入力でカレンダーは描き直さない)。
+# イベントを変更したときと編集対象を切り替えたときだけ、st.rerun() でページ全体を再実行する。
+def request_page_rerun():
+    """ウィジェットのコールバックから、ページ全体の再実行を頼む (コールバックの中では st.rerun() できない)"""
+    st.session_state[PAGE_RERUN_KEY] = True
+
+def rerun_page_if_requested():
+    if st.session_state.pop(PAGE_RERUN_KEY, False):
+        st.rerun()
+
+def page_fragment(name):
+    """ページの一部を独立して再実行されるフラグメントにするデコレータ (再実行の所要時間も記録する)"""
+    def decorate(fn):
+        return st.fragment(timed_fragment(get_rerun_stats(), name)(fn))
+    return decorate
+
 
 #ページ設定
 st.set_page_config(page_title="エントリー忘れナイン", layout="wide") # ページ設定の例
 st.title("🗓️ エントリー忘れナイン")
 
 #お知らせ (変更なし、ただし日付がないイベントは適切に除外)
+rerun_profiler.phase("notice")
 st.subheader("🔔 お知らせ")
-with st.container(border=True):
-    today = datetime.date.today()
-    # 日付型が有効なイベントのみを対象とする
-    valid_events_for_notice = [
-        ev for ev in st.session_state.event_list 
-        if isinstance(ev.get('deadline'), datetime.date) and isinstance(ev.get('date'), datetime.date)
-    ]
-
-    if not valid_events_for_notice: # お知らせ対象の有効なイベントがない場合
-        st.info("現在、日付が有効な登録イベントはありません。")
-    else:
+
+@page_fragment("notice")
+def show_notice_panel():
+    """お知らせ欄 (ページの切り替えではお知らせ欄だけを再実行する)"""
+    with st.container(border=True):
+        today = datetime.date.today()
+        if not has_notice_events(shared_event_store): # お知らせ対象の有効なイベントがない場合
+            st.info("現在、日付が有効な登録イベントはありません。")
+            return
         st.markdown("##### 申込締切情報")
-        sorted_events_by_deadline = sorted(valid_events_for_notice, key=lambda x: x['deadline'])
-        deadline_messages = []
-        for ev in sorted_events_by_deadline:
-            delta = ev['deadline'] - today
-            deadline_str = ev['deadline'].strftime('%Y年%m月%d日')
-            if delta.days < 0:
-                deadline_messages.append(f"- 【{ev['title']}】: 申込締切済 ({deadline_str})")
-            elif delta.days == 0:
-                deadline_messages.append(f"- **【{ev['title']}】: 本日締切！** ({deadline_str}) 🏃")
-            else:
-                deadline_messages.append(f"- 【{ev['title']}】: 申込締切まであと **{delta.days}日** ({deadline_str})")
+        st.caption(deadline_status_line(shared_event_store, today))
+        # 締切順の索引から、表示するページの分だけ取り出す (再実行のたびに全件を並べ替えない)
+        expired_count, upcoming_count, page_count = deadline_counts(shared_event_store, today)
+        notice_page = 1
+        if page_count > 1:
+            notice_page = st.number_input(f"ページ (全{page_count}ページ / {upcoming_count}件)", min_value=1,
+                                          max_value=page_count, value=1, step=1, key=NOTICE_PAGE_KEY)
+        deadline_messages = upcoming_deadline_lines(shared_event_store, today, notice_page)
         if deadline_messages:
             st.markdown("\n".join(deadline_messages))
-        else:
+        elif not expired_count:
             st.info("申込締切情報のあるイベントはありません。")
+        if expired_count:
+            with st.expander(f"申込締切済のイベント: {expired_count}件"):
+                st.markdown("\n".join(expired_deadline_lines(shared_event_store, today, expired_count)))
 
         st.divider()
         st.markdown("##### イベント日の重複チェック")
-        event_dates_only = [ev['date'] for ev in valid_events_for_notice] # お知らせ同様、有効なイベントのみ
-        date_counts = Counter(event_dates_only)
-        duplicate_found = False
-        for date_val, count in date_counts.items():
-            if count >= 2:
-                st.warning(f"⚠️ **重複注意:** {date_val.strftime('%Y年%m月%d日')} には {count}件のイベントが予定されています。")
-                duplicate_found = True
-        if not duplicate_found:
+        # 日付ごとの件数と複数日イベントの期間は索引で差分管理しているので、ここでは数え直さない
+        warnings = duplicate_warnings(shared_event_store)
+        for warning in warnings:
+            st.warning(warning)
+        if not warnings:
             st.success("✅ 現在、日付が重複しているイベントはありません。")
+        with st.expander("月ごとのイベント数"):
+            st.bar_chart(month_counts(shared_event_store, today), x='月', y='件数')
+
+show_notice_panel()
 
 # --- イベント選択UI --
+rerun_profiler.phase("selectbox")
 
 def handle_event_selection_change():
     selected_tuple = st.session_state[SELECTBOX_EVENT_SELECTION_KEY]
@@ -169,165 +275,513 @@ def handle_event_selection_change():
             st.session_state.should_clear_form = True
         st.session_state.editing_event_id = None
         st.session_state.edit_mode = False
+    request_page_rerun() # カレンダーの強調表示を編集対象に合わせる
 
 
-if st.session_state.event_list:
-    event_options_for_selectbox = [("イベントを選択...", None)] + [
-        (ev.get('title', f"無題 (ID:{ev.get('id', '')[:6]})"), ev.get('id'))
-        for ev in st.session_state.event_list if ev.get('id')
-    ]
-    
-    current_editing_id = st.session_state.get('editing_event_id')
-    current_index = 0
-    if current_editing_id:
-        for i, option in enumerate(event_options_for_selectbox):
-            if option[1] == current_editing_id:
-                current_index = i
-                break
-    
+def reset_event_search_page():
+    st.session_state[EVENT_SEARCH_PAGE_KEY] = 1
+
+
+def show_event_selector():
+    """イベント選択の検索欄と selectbox"""
+    if not shared_event_store.events():
+        st.info("登録されているイベントはありません。")
+        return
+    # 全件ではなく、検索結果 (検索語が無ければ登録順) の1ページ分だけを選択肢にする
+    search_col, page_col = st.columns([3, 1])
+    with search_col:
+        search_query = st.text_input("イベントを検索 (タイトル・説明):", key=EVENT_SEARCH_KEY,
+                                     on_change=reset_event_search_page)
+    editing_id = st.session_state.get('editing_event_id')
+    search_page = st.session_state.get(EVENT_SEARCH_PAGE_KEY, 1)
+    options, match_count, page_count = selector_page(shared_event_store, search_query, search_page,
+                                                     editing_id=editing_id)
+    if search_page > page_count: # 変更で件数が減ってページが無くなった場合
+        search_page = st.session_state[EVENT_SEARCH_PAGE_KEY] = 1
+        options, match_count, page_count = selector_page(shared_event_store, search_query, 1, editing_id=editing_id)
+    if page_count > 1:
+        with page_col:
+            st.number_input(f"ページ (全{page_count}ページ / {match_count}件)", min_value=1, max_value=page_count,
+                            step=1, key=EVENT_SEARCH_PAGE_KEY)
+    if search_query.strip() and not match_count:
+        st.caption("一致するイベントはありません。")
     st.selectbox(
         "編集/削除するイベントを選択:",
-        options=event_options_for_selectbox,
+        options=options,
         format_func=lambda x: x[0], # (タイトル, ID) のタプルのタイトル部分を表示
         key=SELECTBOX_EVENT_SELECTION_KEY,
         on_change=handle_event_selection_change,
-        index=current_index
+        index=selectbox_index(options, editing_id)
     )
-else:
-    st.info("登録されているイベントはありません。")
 
-# --- 入力フォーム ---
-st.header("イベント情報入力")
-event_name = st.text_input('イベント名', key=FORM_EVENT_NAME_KEY)
-event_date = st.date_input('イベント日', key=FORM_EVENT_DATE_KEY, min_value=datetime.date(2000,1,1))
-event_deadline = st.date_input('申込締切日', key=FORM_EVENT_DEADLINE_KEY, min_value=datetime.date(2000,1,1))
-event_description = st.text_area('説明', key=FORM_EVENT_DESCRIPTION_KEY)
-
-# --- ボタン処理 ---
-if st.session_state.edit_mode and st.session_state.editing_event_id:
-    current_form_title = st.session_state.get(FORM_EVENT_NAME_KEY) if st.session_state.get(FORM_EVENT_NAME_KEY) else "選択されたイベント"
-    st.subheader(f"### ✏️ 現在編集中: {current_form_title}")
-
-    col_update, col_delete, col_cancel = st.columns(3)
-    with col_update:
-        if st.button("🖋 更新"):
-            if not st.session_state[FORM_EVENT_NAME_KEY]: # 簡単なバリデーション
-                st.warning("イベント名を入力してください。")
+# --- 過去のイベント (アーカイブ) ---
+archive_status = archive_status_line(event_archive)
+
+@page_fragment("archive")
+def show_archive_history():
+    with st.expander("🗄 過去のイベント (アーカイブ)"):
+        st.caption(archive_status + " カレンダーを過去の月に動かすと表示されます。")
+        archive_query = st.text_input("過去のイベントを検索 (タイトル・説明):", key=ARCHIVE_SEARCH_KEY)
+        if archive_query.strip(): # 検索したときに初めてアーカイブを読み込む
+            archive_lines = archive_search_lines(event_archive, archive_query)
+            if archive_lines:
+                st.markdown("\n".join(archive_lines))
             else:
-                updated_event_data = {
-                    'id': st.session_state.editing_event_id,
-                    'title': st.session_state[FORM_EVENT_NAME_KEY],
-                    'date': st.session_state[FORM_EVENT_DATE_KEY],
-                    'deadline': st.session_state[FORM_EVENT_DEADLINE_KEY],
-                    'description': st.session_state[FORM_EVENT_DESCRIPTION_KEY]
+                st.caption("一致するイベントはありません。")
+
+# --- 入力フォーム ---
+def prepare_form_state():
+    """フォームのウィジェットを作る前に、クリアや編集対象の読み込みで値を入れ替える"""
+    # フォームの初期値を設定 (クリア時や初回ロード時)
+    if st.session_state.should_clear_form:
+        st.session_state[FORM_EVENT_NAME_KEY] = 'イベント名'
+        st.session_state[FORM_EVENT_DATE_KEY] = datetime.date.today() + datetime.timedelta(days=7)
+        st.session_state[FORM_EVENT_DEADLINE_KEY] = datetime.date.today()
+        st.session_state[FORM_EVENT_DESCRIPTION_KEY] = ''
+        st.session_state[FORM_EVENT_MULTI_DAY_KEY] = False
+        st.session_state[FORM_EVENT_END_DATE_KEY] = st.session_state[FORM_EVENT_DATE_KEY]
+        st.session_state[FORM_EVENT_RRULE_KEY] = ''
+        st.session_state.should_clear_form = False
+        st.session_state.edit_mode = False
+        st.session_state.editing_event_id = None
+        # selectbox の選択もリセットされるようにキーの値をNoneにする (次回描画時にindexが先頭になる)
+        if SELECTBOX_EVENT_SELECTION_KEY in st.session_state:
+             st.session_state[SELECTBOX_EVENT_SELECTION_KEY] = None
+
+    # 編集モードでイベントが選択された場合、フォームに値をロード
+    if st.session_state.load_event_to_form_flag and st.session_state.editing_event_id:
+        event_to_load = shared_event_store.get(st.session_state.editing_event_id)
+        if event_to_load:
+            st.session_state[FORM_EVENT_NAME_KEY] = event_to_load.get('title', '')
+            st.session_state[FORM_EVENT_DATE_KEY] = event_to_load.get('date', datetime.date.today() + datetime.timedelta(days=7))
+            st.session_state[FORM_EVENT_DEADLINE_KEY] = event_to_load.get('deadline', datetime.date.today())
+            st.session_state[FORM_EVENT_DESCRIPTION_KEY] = event_to_load.get('description', '')
+            st.session_state[FORM_EVENT_MULTI_DAY_KEY] = event_to_load.get('end_date') is not None
+            st.session_state[FORM_EVENT_END_DATE_KEY] = event_to_load.get('end_date') or st.session_state[FORM_EVENT_DATE_KEY]
+            st.session_state[FORM_EVENT_RRULE_KEY] = event_to_load.get(RRULE_FIELD, '')
+        st.session_state.load_event_to_form_flag = False
+
+
+@page_fragment("editor")
+def show_event_editor():
+    """イベントの選択・入力フォーム・登録/更新/削除のボタン
+
+    入力のたびに再実行されるのはこのフラグメントだけで、かかる時間はイベント数によらない
+    (選択肢は1ページ分、日程の重なりは区間木で調べる)。
+    """
+    rerun_page_if_requested()
+    prepare_form_state()
+    show_event_selector()
+
+    st.header("イベント情報入力")
+    event_name = st.text_input('イベント名', key=FORM_EVENT_NAME_KEY)
+    event_date = st.date_input('イベント日', key=FORM_EVENT_DATE_KEY, min_value=datetime.date(2000,1,1))
+    event_multi_day = st.checkbox('複数日のイベント', key=FORM_EVENT_MULTI_DAY_KEY)
+    event_end_date = None
+    if event_multi_day:
+        event_end_date = st.date_input('終了日', key=FORM_EVENT_END_DATE_KEY, min_value=datetime.date(2000,1,1))
+    event_deadline = st.date_input('申込締切日', key=FORM_EVENT_DEADLINE_KEY, min_value=datetime.date(2000,1,1))
+    event_description = st.text_area('説明', key=FORM_EVENT_DESCRIPTION_KEY)
+    event_rrule_text = st.text_input('繰り返し (空欄なら繰り返さない)', key=FORM_EVENT_RRULE_KEY,
+                                     placeholder="FREQ=MONTHLY;COUNT=12",
+                                     help="FREQ (DAILY / WEEKLY / MONTHLY / YEARLY)・INTERVAL・COUNT・UNTIL を ; で区切って指定します。"
+                                          "各回の申込締切日はイベント日との差を保ってずれます。")
+    event_rrule = None
+    rrule_invalid = False
+    if event_rrule_text.strip():
+        try:
+            event_rrule = str(RecurrenceRule.parse(event_rrule_text))
+        except ValueError as e:
+            rrule_invalid = True
+            st.warning(f"繰り返しの指定が不正です: {e}")
+
+    # 入力中の日程が既存のイベントと重なっていないかを区間木で確認する (全件は走査しない)
+    end_date_invalid = event_end_date is not None and event_end_date < event_date
+    if end_date_invalid:
+        st.warning("終了日はイベント日以降の日付を入力してください。")
+    elif event_date:
+        clash_message = clash_warning(shared_event_store, event_date, event_end_date,
+                                      exclude_id=st.session_state.editing_event_id)
+        if clash_message:
+            st.warning(clash_message)
+
+    # --- ボタン処理 ---
+    # 変更を保存したら st.rerun() でページ全体を再実行し、お知らせ欄とカレンダーにも反映する
+    if st.session_state.edit_mode and st.session_state.editing_event_id:
+        current_form_title = st.session_state.get(FORM_EVENT_NAME_KEY) if st.session_state.get(FORM_EVENT_NAME_KEY) else "選択されたイベント"
+        st.subheader(f"### ✏️ 現在編集中: {current_form_title}")
+
+        col_update, col_delete, col_cancel = st.columns(3)
+        with col_update:
+            if st.button("🖋 更新"):
+                if not st.session_state[FORM_EVENT_NAME_KEY]: # 簡単なバリデーション
+                    st.warning("イベント名を入力してください。")
+                elif not end_date_invalid and not rrule_invalid:
+                    updated_event_data = {
+                        'id': st.session_state.editing_event_id,
+                        'title': st.session_state[FORM_EVENT_NAME_KEY],
+                        'date': st.session_state[FORM_EVENT_DATE_KEY],
+                        'deadline': st.session_state[FORM_EVENT_DEADLINE_KEY],
+                        'description': st.session_state[FORM_EVENT_DESCRIPTION_KEY]
+                    }
+                    if event_end_date is not None and event_end_date > event_date:
+                        updated_event_data['end_date'] = event_end_date
+                    if event_rrule:
+                        updated_event_data[RRULE_FIELD] = event_rrule
+                    event_exists = shared_event_store.get(st.session_state.editing_event_id) is not None
+                    if event_exists and persist_event_change('update', updated_event_data, f"「{updated_event_data['title']}」の更新"):
+                        st.success(f"イベント '{updated_event_data['title']}' が更新されました！")
+                        st.session_state.should_clear_form = True
+                        st.rerun()
+                    elif not event_exists:
+                        st.error("更新対象のイベントが見つかりませんでした。")
+        with col_delete:
+            if st.button("イベントを削除する", type="primary"):
+                id_to_delete = st.session_state.editing_event_id
+                event_to_delete = shared_event_store.get(id_to_delete) # 削除前のタイトル取得
+                title_deleted = event_to_delete.get('title', '(無題のイベント)') if event_to_delete else ""
+                if persist_event_change('delete', id_to_delete, f"「{title_deleted}」の削除"):
+                    st.success(f"イベント '{title_deleted}' が削除されました！")
+                    st.session_state.should_clear_form = True
+                    st.rerun()
+        with col_cancel:
+            if st.button("キャンセル"):
+                st.session_state.should_clear_form = True
+                st.rerun()
+    else:
+        if st.button('🆕 登録'):
+            if not event_name:
+                 st.warning("イベント名を入力してください。")
+            elif not end_date_invalid and not rrule_invalid:
+                new_event_data = {
+                    'id': str(uuid.uuid4()),
+                    'title': event_name,
+                    'date': event_date,
+                    'deadline': event_deadline,
+                    'description': event_description
                 }
-                event_updated = False
-                for i, ev in enumerate(st.session_state.event_list):
-                    if ev.get('id') == st.session_state.editing_event_id:
-                        st.session_state.event_list[i] = updated_event_data
-                        event_updated = True
-                        break
-                if event_updated:
-                    save_events_to_file(st.session_state.event_list)
-                    st.success(f"イベント '{updated_event_data['title']}' が更新されました！")
+                if event_end_date is not None and event_end_date > event_date:
+                    new_event_data['end_date'] = event_end_date
+                if event_rrule:
+                    new_event_data[RRULE_FIELD] = event_rrule
+                if persist_event_change('add', new_event_data, f"「{event_name}」の登録"):
+                    st.session_state.submitted = True
                     st.session_state.should_clear_form = True
                     st.rerun()
-                else:
-                    st.error("更新対象のイベントが見つかりませんでした。")
-    with col_delete:
-        if st.button("イベントを削除する", type="primary"):
-            id_to_delete = st.session_state.editing_event_id
-            title_deleted = ""
-            for ev in st.session_state.event_list: # 削除前のタイトル取得
-                if ev.get('id') == id_to_delete:
-                    title_deleted = ev.get('title', '(無題のイベント)')
-                    break
-            st.session_state.event_list = [ev for ev in st.session_state.event_list if ev.get('id') != id_to_delete]
-            save_events_to_file(st.session_state.event_list)
-            st.success(f"イベント '{title_deleted}' が削除されました！")
-            st.session_state.should_clear_form = True
-            st.rerun()
-    with col_cancel:
-        if st.button("キャンセル"):
-            st.session_state.should_clear_form = True
-            st.rerun()
-else:
-    if st.button('🆕 登録'):
-        if not event_name:
-             st.warning("イベント名を入力してください。")
+
+    if st.session_state.submitted:
+        st.success(f"'{event_name}' を登録しました！")
+        st.session_state.submitted = False
+
+# --- 元に戻す・やり直す ---
+def sync_form_after_history_change():
+    """元に戻す/やり直すで編集中のイベントが変わったら、フォームを読み直すかクリアする"""
+    editing_id = st.session_state.editing_event_id
+    if not editing_id:
+        return
+    if shared_event_store.get(editing_id) is None:
+        st.session_state.should_clear_form = True
+    else:
+        st.session_state.load_event_to_form_flag = True
+
+@page_fragment("history")
+def show_history_buttons():
+    """このセッションで行った変更を元に戻す/やり直すボタン (変更はページ全体に反映する)"""
+    history = st.session_state.event_history
+    history_message = st.session_state.pop('history_message', None)
+    if history_message:
+        st.success(history_message)
+    col_undo, col_redo = st.columns(2)
+    with col_undo:
+        undo_label = history.undo_label
+        undo_clicked = st.button(f"↩ 元に戻す: {undo_label}" if undo_label else "↩ 元に戻す", disabled=undo_label is None)
+    with col_redo:
+        redo_label = history.redo_label
+        redo_clicked = st.button(f"↪ やり直す: {redo_label}" if redo_label else "↪ やり直す", disabled=redo_label is None)
+    if not (undo_clicked or redo_clicked):
+        return
+    try:
+        if undo_clicked:
+            st.session_state.history_message = f"{history.undo(shared_event_store)}を元に戻しました。"
         else:
-            new_event_data = {
-                'id': str(uuid.uuid4()),
-                'title': event_name,
-                'date': event_date,
-                'deadline': event_deadline,
-                'description': event_description
-            }
-            st.session_state.event_list.append(new_event_data)
-            save_events_to_file(st.session_state.event_list)
-            st.session_state.submitted = True
-            st.session_state.should_clear_form = True
-            st.rerun()
+            st.session_state.history_message = f"{history.redo(shared_event_store)}をやり直しました。"
+    except HistoryConflictError as e:
+        st.warning(f"{e.label}の後に他の画面などでイベントが変更されているため、{'元に戻せません' if undo_clicked else 'やり直せません'}。"
+                   "この操作は履歴から外しました。")
+        return
+    except (IOError, sqlite3.Error) as e:
+        st.error(f"エラー: イベントデータの保存に失敗しました。 {e}")
+        return
+    sync_form_after_history_change()
+    st.rerun()
 
-if st.session_state.submitted:
-    st.success(f"'{event_name}' を登録しました！")
-    st.session_state.submitted = False
+rerun_profiler.phase("form")
+show_history_buttons()
+show_event_editor()
+if archive_status:
+    show_archive_history()
+
+# --- まとめて編集・削除 ---
+rerun_profiler.phase("bulk")
+
+@page_fragment("bulk")
+def show_bulk_panel():
+    """表で選んだイベントをまとめて削除・日付の変更をする (何件でも保存と再実行は1回)"""
+    with st.expander("🧹 まとめて編集・削除"):
+        bulk_message = st.session_state.pop('bulk_message', None)
+        if bulk_message:
+            st.success(bulk_message)
+        today = datetime.date.today()
+        col_start, col_end, col_query = st.columns([1, 1, 2])
+        with col_start:
+            bulk_start = st.date_input("イベント日 (から)", value=today - datetime.timedelta(days=30), key=BULK_START_KEY)
+        with col_end:
+            bulk_end = st.date_input("イベント日 (まで)", value=today + datetime.timedelta(days=30), key=BULK_END_KEY)
+        with col_query:
+            bulk_query = st.text_input("タイトル・説明で絞り込み", key=BULK_QUERY_KEY)
+        if bulk_end < bulk_start:
+            st.warning("期間の終わりは始まり以降の日付を入力してください。")
+            return
+        rows, match_count = bulk_table_rows(shared_event_store, bulk_start, bulk_end, bulk_query)
+        if not rows:
+            st.caption("該当するイベントはありません。")
+            return
+        if match_count > len(rows):
+            st.caption(f"{match_count}件のうち先頭の{len(rows)}件を表示しています。期間や絞り込みを狭めてください。")
+        select_all = st.checkbox(f"表示中の{len(rows)}件をすべて選択", key=BULK_SELECT_ALL_KEY)
+        if select_all:
+            for row in rows:
+                row[BULK_SELECT_COLUMN] = True
+        # 表の編集内容は行の位置で覚えられるので、表示する行が変わったら選択を引き継がないようにキーを変える
+        table_key = f"bulk_table_{hash((shared_event_store.version, bulk_start, bulk_end, bulk_query, select_all))}"
+        edited_rows = st.data_editor(rows, key=table_key, hide_index=True, use_container_width=True,
+                                     column_config={'id': None, BULK_SELECT_COLUMN: st.column_config.CheckboxColumn(width="small")},
+                                     disabled=[column for column in rows[0] if column != BULK_SELECT_COLUMN])
+        selected_ids = [row['id'] for row in edited_rows if row[BULK_SELECT_COLUMN]]
+
+        bulk_action = st.radio("操作", options=list(BULK_ACTION_LABELS), format_func=BULK_ACTION_LABELS.get,
+                               horizontal=True, key=BULK_ACTION_KEY)
+        shift_days, new_deadline = 0, None
+        if bulk_action == 'shift':
+            shift_days = st.number_input("ずらす日数 (前にずらすときは負の数)", min_value=-3650, max_value=3650,
+                                         value=7, step=1, key=BULK_DAYS_KEY)
+        elif bulk_action == 'deadline':
+            new_deadline = st.date_input("新しい申込締切日", value=today, key=BULK_DEADLINE_KEY)
+        if st.button(f"選択した {len(selected_ids)}件に適用", type="primary", disabled=not selected_ids):
+            changed = persist_bulk_change(selected_ids, bulk_action, f"{len(selected_ids)}件の{BULK_ACTION_LABELS[bulk_action]}",
+                                          shift_days, new_deadline)
+            if changed is not None:
+                st.session_state.bulk_message = f"{changed}件のイベントを{BULK_ACTION_LABELS[bulk_action]}しました。"
+                if st.session_state.editing_event_id in selected_ids: # 編集中のフォームに古い内容が残らないようにする
+                    if bulk_action == 'delete':
+                        st.session_state.should_clear_form = True
+                    else:
+                        st.session_state.load_event_to_form_flag = True
+                st.rerun() # 変更はページ全体に反映する (再実行は何件でも1回)
+
+show_bulk_panel()
+
+# --- 一括登録 ---
+rerun_profiler.phase("import_export")
+
+@page_fragment("import")
+def show_import_panel():
+    with st.expander("📥 CSV / iCalendar から一括登録"):
+        st.caption("CSV の見出しは イベント名, イベント日, 申込締切日, 説明 (終了日は任意)。日付は YYYY-MM-DD 形式です。")
+        uploaded_file = st.file_uploader("ファイルを選択", type=["csv", "ics"], key=IMPORT_FILE_KEY)
+        if uploaded_file is not None and st.button("取り込む"):
+            try:
+                import_report = import_stream(uploaded_file, uploaded_file.name, shared_event_store)
+            except (IOError, sqlite3.Error, UnicodeDecodeError, csv.Error) as e:
+                st.error(f"エラー: ファイルの取り込みに失敗しました。 {e}")
+            else:
+                st.session_state.import_report = import_report
+                st.rerun()
+        # 1件ごとの警告は出さず、取り込み結果をまとめて表示する
+        import_report = st.session_state.get('import_report')
+        if import_report is not None:
+            st.success(f"{import_report.accepted}件のイベントを登録しました。")
+            if import_report:
+                st.warning(f"⚠️ {import_report.error_count}件の行は不正なため取り込みませんでした。")
+                st.markdown("\n".join(
+                    f"- {location}行目「{title}」: {message}" for location, title, message in import_report.examples))
+                if import_report.error_count > len(import_report.examples):
+                    st.caption(f"ほか {import_report.error_count - len(import_report.examples)}件")
+
+show_import_panel()
+
+# --- エクスポート ---
+@st.cache_resource
+def get_export_cache():
+    """エクスポートの作り置き (全セッションで共有し、データの version が変わるまで使い回す)"""
+    return ExportCache()
+
+@st.cache_resource
+def get_archive_export_cache():
+    """アーカイブのイベントも含めたエクスポートの作り置き"""
+    return ExportCache()
+
+def events_with_archive():
+    hot_events = shared_event_store.events()
+    return hot_events + tuple(ev for ev in event_archive.events() if shared_event_store.get(ev['id']) is None)
+
+@page_fragment("export")
+def show_export_panel():
+    with st.expander("📤 iCalendar / CSV でエクスポート"):
+        export_source = (get_export_cache(), shared_event_store.version, shared_event_store.events)
+        # アーカイブを含めるのは選んだときだけ (選ばなければアーカイブは読み込まない)
+        if archive_status and st.checkbox("過去のイベント (アーカイブ) も含める", key=EXPORT_INCLUDE_ARCHIVE_KEY):
+            export_source = (get_archive_export_cache(), f"{shared_event_store.version}-{event_archive.version}",
+                             events_with_archive)
+        export_cache, export_version, export_events = export_source
+        # ファイルを作って読み込むのは準備ボタンを押したときだけ (再実行のたびに全件を書き出さない)
+        prepared = st.session_state.setdefault(EXPORT_PREPARED_KEY, {})
+        col_ics, col_csv = st.columns(2)
+        for export_col, export_format, export_label in ((col_ics, 'ics', "iCalendar (.ics)"), (col_csv, 'csv', "CSV")):
+            with export_col:
+                if prepared.get(export_format) != export_version:
+                    if st.button(f"{export_label} を準備", key=f"prepare_export_{export_format}"):
+                        prepared[export_format] = export_version
+                        st.rerun(scope="fragment")
+                    continue
+                export_artifact = export_cache.get(export_format, export_version, export_events)
+                with export_artifact.open() as export_file:
+                    st.download_button(f"{export_label} をダウンロード", data=export_file, file_name=export_artifact.filename,
+                                       mime=export_artifact.content_type, key=f"export_{export_format}")
+
+show_export_panel()
 
 # --- カレンダー表示エリア ---
+rerun_profiler.phase("calendars")
 col1, col2 = st.columns(2)
 
-valid_events_for_calendar = [
-    ev for ev in st.session_state.event_list 
-    if isinstance(ev.get('date'), datetime.date) and isinstance(ev.get('deadline'), datetime.date)
-]
-
-calendar_events_deadline_display = []
-for ev in valid_events_for_calendar:
-    event_for_deadline_cal = {
-        'title': f"締切: {ev['title']}",
-        'start': ev['deadline'].isoformat(),
-        'end': ev['deadline'].isoformat(),
-        'allDay': True,
-        'extendedProps': {'id': ev.get('id'), 'original_title': ev['title']}
+def calendar_window(calendar_key):
+    """カレンダーの現在の表示期間 (開始日, 終了日) を返す"""
+    return st.session_state.get(CALENDAR_WINDOW_KEYS[calendar_key]) or default_window(datetime.date.today())
+
+def follow_calendar_window(calendar_key, calendar_state, shown_window):
+    """datesSet で表示期間が変わっていたら保存し、そのカレンダーだけを再実行して新しい期間のイベントを送り直す"""
+    new_window = window_from_state(calendar_state)
+    if new_window and new_window != shown_window:
+        st.session_state[CALENDAR_WINDOW_KEYS[calendar_key]] = new_window
+        try:
+            st.rerun(scope="fragment")
+        except st.errors.StreamlitAPIException: # ページ全体の再実行の途中ではフラグメントだけの再実行はできない
+            st.rerun()
+
+def calendar_view_options(window):
+    # 再マウントされても表示中の月から始まるように、表示期間の中ほどの日付を初期日付にする
+    start, end = window
+    return {"initialDate": (start + (end - start) / 2).isoformat()}
+
+@st.cache_resource
+def get_calendar_payload_caches():
+    """カレンダーごとのイベント辞書の作り置き (全セッションで共有)"""
+    return {
+        'deadline_calendar': CalendarPayloadCache(deadline_calendar_payload),
+        'event_date_calendar': CalendarPayloadCache(date_calendar_payload),
     }
-    if st.session_state.editing_event_id == ev.get('id'):
-        event_for_deadline_cal['backgroundColor'] = 'tomato'
-        event_for_deadline_cal['borderColor'] = 'red'
-    calendar_events_deadline_display.append(event_for_deadline_cal)
+
+calendar_payload_caches = get_calendar_payload_caches()
+
+@page_fragment("calendar")
+def show_calendar(calendar_key, field, title, calendar_options):
+    """カレンダーを1つ表示する (表示期間を動かしたときはこのカレンダーだけを再実行する)
+
+    表示期間に入るイベントだけを索引から取り出して送る (全履歴は送らない)。
+    表示期間がアーカイブの範囲に掛かるとき (過去の月を表示したとき) だけ、アーカイブからも取り出す。
+    データの version と表示期間が変わらなければ作り置きを使い、強調表示は該当の1件だけ差し替える。
+    """
+    window = calendar_window(calendar_key)
+    calendar_events = calendar_payload_caches[calendar_key].payloads(
+        lambda: window_events(shared_event_store, event_archive, field, *window),
+        (shared_event_store.version, event_archive.version), window, highlight_id=st.session_state.editing_event_id)
+    st.subheader(title)
+    calendar_state = st_calendar.calendar(events=calendar_events, options={**calendar_options, **calendar_view_options(window)},
+                                          callbacks=["datesSet"], key=calendar_key)
+    follow_calendar_window(calendar_key, calendar_state, window)
 
 with col1:
-    st.subheader("イベント申込締切日")
-    calendar_options_deadline = {
+    show_calendar("deadline_calendar", 'deadline', "イベント申込締切日", {
         "locale": "ja",
         "headerToolbar": {"left": "prev,next today", "center": "title", "right": "dayGridMonth,timeGridWeek,listWeek"},
-        "initialView": "dayGridMonth", "height": "auto"
-    }
-    st_calendar.calendar(events=calendar_events_deadline_display, options=calendar_options_deadline, key="deadline_calendar")
-
-calendar_events_date_display = []
-for ev in valid_events_for_calendar:
-    event_for_date_cal = {
-        'title': ev['title'],
-        'start': ev['date'].isoformat(),
-        'end': ev['date'].isoformat(),
-        'allDay': True,
-        'extendedProps': {'id': ev.get('id'), 'original_title': ev['title']}
-    }
-    if st.session_state.editing_event_id == ev.get('id'):
-        event_for_date_cal['backgroundColor'] = 'tomato'
-        event_for_date_cal['borderColor'] = 'red'
-    calendar_events_date_display.append(event_for_date_cal)
+        "initialView": "dayGridMonth", "height": "auto",
+    })
 
 with col2:
-    st.subheader("イベント日")
-    calendar_options_event_date = {
+    show_calendar("event_date_calendar", 'date', "イベント日", {
         "locale": "ja",
         "headerToolbar": {"left": "prev,next today", "center": "title", "right": "dayGridMonth,timeGridWeek,listWeek"},
-        "initialView": "dayGridMonth", "selectable": True, "height": "auto"
-    }
-    st_calendar.calendar(events=calendar_events_date_display, options=calendar_options_event_date, key="event_date_calendar")
+        "initialView": "dayGridMonth", "selectable": True, "height": "auto",
+    })
 
+rerun_profiler.phase("gcal_sync")
 st.divider()
 st.subheader("Google カレンダーに送信")
-st.button("Googleカレンダーにイベントを送信")
+
+@st.cache_resource
+def get_gcal_sync_jobs():
+    """実行中の同期ジョブ (プロセスで1つ。全セッションで共有し、同時に2つ走らないようにする)"""
+    return {'job': None}
+
+@st.fragment(run_every=1)
+def poll_gcal_sync(job):
+    """実行中の同期の進捗を表示する (1秒ごとにこの部分だけ再実行し、終わったらページ全体を1回再実行する)"""
+    if not job.running:
+        st.rerun() # 結果を表示し、以後はこのフラグメントを作らない (ポーリングを止める)
+    st.progress(job.fraction(), text=f"Google カレンダーに送信中... ({job.done}/{job.total})")
+    if st.button("送信を中止"):
+        job.cancel()
+
+def show_gcal_sync_progress(sync_jobs):
+    """同期の進捗か結果を表示する (1秒ごとに再実行するのは実行中だけ)"""
+    job = sync_jobs['job']
+    if job is None:
+        return
+    if job.running:
+        poll_gcal_sync(job)
+    elif job.error is not None:
+        st.error(f"Google カレンダーへの送信に失敗しました: {job.error}")
+    elif job.result is not None:
+        synced, failed, errors = job.result
+        if failed:
+            st.warning(f"⚠️ {synced}件を送信し、{failed}件は送信できませんでした。もう一度送信すると再試行します。")
+            st.markdown("\n".join(f"- {message}" for message in errors))
+        else:
+            st.success(f"{synced}件の変更を Google カレンダーに送信しました。")
+
+@page_fragment("gcal_sync")
+def show_gcal_sync_button(sync_jobs):
+    if st.button("Googleカレンダーにイベントを送信"):
+        gcal_config = client_from_env()
+        if gcal_config is None:
+            st.info("環境変数 GOOGLE_CALENDAR_ID と GOOGLE_OAUTH_TOKEN を設定してください。")
+        elif sync_jobs['job'] is not None and sync_jobs['job'].running:
+            st.info("送信中です。終わるまでお待ちください。")
+        else:
+            gcal_client, gcal_calendar_id = gcal_config
+            # 前回の送信から変更されたイベントだけを、別スレッドでバッチにまとめて送る
+            # (アーカイブに移したイベントは一覧から消えても Google 側では削除しない)
+            sync_jobs['job'] = SyncJob(CalendarSync(gcal_client, gcal_calendar_id, SyncState()),
+                                       shared_event_store.events(), retained_ids=event_archive.ids()).start()
+            st.rerun() # 進捗のポーリングを始めるためにページ全体を再実行する
+
+gcal_sync_jobs = get_gcal_sync_jobs()
+show_gcal_sync_button(gcal_sync_jobs)
+show_gcal_sync_progress(gcal_sync_jobs)
+
+# --- デバッグ欄 (?debug=1 または環境変数 ENTRY_CAL_DEBUG=1 のときだけ表示) ---
+rerun_durations = rerun_profiler.finish()
+if rerun_profiler.profile_text is not None or flag_enabled(st.query_params, DEBUG_QUERY_PARAM, DEBUG_ENV):
+    with st.expander(f"🛠 再実行の計測 (今回 {rerun_durations['total'] * 1e3:.1f} ms)"):
+        st.markdown("##### 今回の再実行")
+        st.table([{'段階': phase, 'ms': round(seconds * 1e3, 2)} for phase, seconds in rerun_durations.items()])
+        rerun_stats = get_rerun_stats()
+        st.markdown(f"##### 直近の再実行 (全セッション、累計 {rerun_stats.reruns}回)")
+        st.caption("fragment: で始まる段階は、フラグメントごとの所要時間です (フラグメントだけの再実行も含む)。")
+        st.table([{'段階': phase, '回数': count, 'p50 (ms)': round(p50 * 1e3, 2), 'p95 (ms)': round(p95 * 1e3, 2),
+                   '最大 (ms)': round(worst * 1e3, 2)} for phase, count, p50, p95, worst in rerun_stats.summary()])
+        if rerun_profiler.profile_text is not None:
+            st.markdown("##### cProfile (累積時間の多い順)")
+            st.code(rerun_profiler.profile_text)
     
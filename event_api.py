@@ -0,0 +1,491 @@
+"""イベントの一覧・期間での問い合わせ・登録・更新・削除を行う HTTP/JSON API (標準ライブラリだけで動く)
+
+    python event_api.py [--host 127.0.0.1] [--port 8765] [--backend journal]
+
+Streamlit アプリの中でスレッドとして動かす (環境変数 EVENT_API_PORT を設定する) と、画面と同じ
+共有ストアを使うので、画面からの保存と書き込みがぶつからない。
+
+    GET    /events?limit=100&cursor=...                        登録順の一覧
+    GET    /events?field=date&start=2026-04-01&end=2026-04-30  期間に入るイベント (field は date / deadline)
+    GET    /events/<id>
+    POST   /events                                             登録 (id は省略可)
+    PUT    /events/<id>                                        更新 (If-Match で競合を検出できる)
+    DELETE /events/<id>
+    POST   /events/bulk                                        {"ops": [{"op": "add", "event": {...}}, ...]}
+    GET    /export.ics, /export.csv
+"""
+import argparse
+import base64
+import binascii
+import bisect
+import collections
+import datetime
+import hashlib
+import hmac
+import http.server
+import json
+import os
+import sqlite3
+import threading
+import urllib.parse
+
+from event_archive import EventArchive, window_events
+from event_export import ExportCache, etag_matches, export_response
+from event_import import validate_record
+from event_model import InvalidEventError, as_event
+from event_store import open_store
+from shared_store import SharedEventStore
+
+# --- 定数定義 ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+API_PORT_ENV = "EVENT_API_PORT"    # 設定すると Streamlit アプリの中で API を動かす
+API_HOST_ENV = "EVENT_API_HOST"
+API_TOKEN_ENV = "EVENT_API_TOKEN"  # 設定すると Authorization: Bearer <トークン> の無い要求を断る
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BULK_OPS = 10_000
+MAX_BODY_BYTES = 16 * 1024 * 1024
+RESPONSE_CACHE_SIZE = 256          # データの version ごとに作り置きする応答 (一覧・期間ごとのページ) の数
+DATE_FIELDS = ('date', 'deadline')
+
+
+class ApiError(Exception):
+    """HTTP のエラー応答にする例外 (status と JSON の本文)"""
+
+    def __init__(self, status, message, errors=None):
+        super().__init__(message)
+        self.status = status
+        self.errors = errors
+
+
+def _json_bytes(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+
+
+def _etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _encode_cursor(position):
+    return base64.urlsafe_b64encode(_json_bytes(position)).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor, second_type):
+    """カーソルを [文字列, second_type] の組に戻す。形が違えば 400"""
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ApiError(400, "cursor が不正です") from None
+    if (not isinstance(after, list) or len(after) != 2 or not isinstance(after[0], str)
+            or not isinstance(after[1], second_type) or isinstance(after[1], bool)):
+        raise ApiError(400, "cursor が不正です")
+    return after
+
+
+def _check_id(event_id):
+    if not isinstance(event_id, str) or not event_id:
+        raise ApiError(400, "id は空でない文字列です")
+    return event_id
+
+
+def _query_int(query, name, default, maximum):
+    value = query.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} は整数です") from None
+    if not 1 <= value <= maximum:
+        raise ApiError(400, f"{name} は 1 〜 {maximum} です")
+    return value
+
+
+def _query_date(query, name):
+    try:
+        return datetime.date.fromisoformat(query[name])
+    except KeyError:
+        raise ApiError(400, f"{name} が必要です") from None
+    except ValueError:
+        raise ApiError(400, f"{name} は YYYY-MM-DD 形式の日付です") from None
+
+
+def _validated(record, event_id=None):
+    """画面や一括登録と同じ検証をして Event にする。不正なら 400 の ApiError"""
+    if not isinstance(record, dict):
+        raise ApiError(400, "イベントは JSON のオブジェクトです")
+    if event_id is not None:
+        record = {**record, 'id': event_id}
+    elif record.get('id') is not None:
+        _check_id(record['id'])
+    try:
+        return as_event(validate_record(record))
+    except InvalidEventError as e:
+        raise ApiError(400, f"{e.field} が不正です", [{'field': e.field, 'message': str(e)}]) from None
+    except (TypeError, ValueError) as e:
+        kind, message = e.args if len(e.args) == 2 else ('other', str(e))
+        raise ApiError(400, message, [{'field': kind, 'message': message}]) from None
+
+
+class ResponseCache:
+    """GET の応答 (本文と ETag) や期間ごとの問い合わせ結果を、キーごとにデータの version が変わるまで使い回す
+
+    古いものから捨てる (LRU)。
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict() # キー -> (version, 値)
+
+    def get(self, key, version, build):
+        """key の値を返す。build() は作り置きが無いか version が古いときだけ呼ばれる"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = build()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+class EventApi:
+    """要求 (メソッド, パス, クエリ, ヘッダ, 本文) から応答 (ステータス, ヘッダ, 本文のイテレータ) を作る
+
+    HTTP サーバには依存しないので、ソケットを開かずに呼び出して確かめられる。
+    書き込みは SharedEventStore.apply() を通るので、画面と同じ保存先・同じ索引に反映される。
+    """
+
+    def __init__(self, shared_store, archive=None, token=None):
+        self.shared_store = shared_store
+        self.archive = archive or EventArchive.for_store(shared_store.backend)
+        self.token = token
+        self.responses = ResponseCache()
+        self.exports = ExportCache()
+
+    def handle(self, method, path, query=None, headers=None, body=b""):
+        headers = headers or {}
+        try:
+            self._authorize(headers)
+            self.shared_store.refresh_if_stale() # 別プロセスが書き換えていれば読み直す
+            return self._route(method, path.rstrip("/") or "/", query or {}, headers, body)
+        except ApiError as e:
+            error = {'error': str(e)}
+            if e.errors:
+                error['errors'] = e.errors
+            return self._json(e.status, error)
+        except (IOError, sqlite3.Error) as e: # 画面と同じく、保存や読み込みの失敗はエラーとして返す
+            return self._json(500, {'error': f"イベントデータの保存または読み込みに失敗しました。 {e}"})
+
+    def _authorize(self, headers):
+        if self.token is None:
+            return
+        scheme, _, credentials = headers.get('Authorization', '').partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.strip(), self.token):
+            raise ApiError(401, "認証が必要です")
+
+    def _route(self, method, path, query, headers, body):
+        parts = path.strip("/").split("/")
+        if parts[0].startswith("export.") and len(parts) == 1 and method == "GET":
+            return self._export(parts[0][len("export."):], headers)
+        if parts[0] != "events" or len(parts) > 2:
+            raise ApiError(404, "見つかりません")
+        if len(parts) == 1:
+            if method == "GET":
+                return self._list(query, headers)
+            if method == "POST":
+                return self._create(self._body(body))
+        elif parts[1] == "bulk":
+            if method == "POST":
+                return self._bulk(self._body(body))
+        else:
+            event_id = urllib.parse.unquote(parts[1])
+            if method == "GET":
+                return self._get(event_id, headers)
+            if method == "PUT":
+                return self._update(event_id, self._body(body), headers)
+            if method == "DELETE":
+                return self._delete(event_id, headers)
+        raise ApiError(405, f"{method} は使えません")
+
+    # --- 応答 ---
+    def _version(self):
+        return (self.shared_store.version, self.archive.version)
+
+    @staticmethod
+    def _json(status, data, headers=None):
+        body = _json_bytes(data)
+        return status, {'Content-Type': "application/json; charset=utf-8", 'Content-Length': str(len(body)),
+                        **(headers or {})}, iter((body,))
+
+    @staticmethod
+    def _cached(body, etag, headers):
+        """If-None-Match が一致すれば本文なしの 304 を返す"""
+        response_headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(headers.get('If-None-Match'), etag):
+            return 304, response_headers, iter(())
+        response_headers.update({'Content-Type': "application/json; charset=utf-8", 'Content-Length': str(len(body))})
+        return 200, response_headers, iter((body,))
+
+    @staticmethod
+    def _body(body):
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(400, "本文が JSON ではありません") from None
+
+    # --- 読み出し ---
+    def _list(self, query, headers):
+        """登録順の一覧 (field / start / end があれば、その期間に入るイベントを日付順に) を1ページ返す"""
+        limit = _query_int(query, 'limit', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        cursor = query.get('cursor')
+        if 'field' in query or 'start' in query or 'end' in query:
+            field = query.get('field', 'date')
+            if field not in DATE_FIELDS:
+                raise ApiError(400, f"field は {' / '.join(DATE_FIELDS)} です")
+            start, end = _query_date(query, 'start'), _query_date(query, 'end')
+            if end < start:
+                raise ApiError(400, "end は start 以降の日付です")
+            key = ('range', field, start, end, limit, cursor)
+            build = lambda: self._range_page(field, start, end, limit, cursor)
+        else:
+            key = ('list', limit, cursor)
+            build = lambda: self._list_page(limit, cursor)
+        return self._cached(*self.responses.get(key, self._version(), lambda: self._with_etag(build())), headers)
+
+    @staticmethod
+    def _with_etag(body):
+        return body, _etag(body)
+
+    def _list_page(self, limit, cursor):
+        events = self.shared_store.events()
+        start = 0
+        if cursor is not None:
+            # カーソルは直前のページの最後の id と位置。id が削除されていれば、後ろが詰まるのでその位置から続ける
+            after = _decode_cursor(cursor, int)
+            if after[1] < 0:
+                raise ApiError(400, "cursor が不正です")
+            position = self.shared_store.position(after[0])
+            start = position + 1 if position is not None else after[1]
+        page = events[start:start + limit]
+        next_cursor = None
+        if start + limit < len(events):
+            next_cursor = _encode_cursor([page[-1]['id'], start + limit - 1])
+        return _json_bytes({'events': [event.to_record() for event in page], 'total': len(events),
+                            'next_cursor': next_cursor})
+
+    def _range_records(self, field, start, end):
+        """期間に入るイベントのレコードと、その並び順のキー (日付, id) のリスト (期間ごとに作り置きする)
+
+        繰り返しのイベントの各回とアーカイブのイベントも含めて、画面のカレンダーと同じ内容にする。
+        """
+        events = sorted(window_events(self.shared_store, self.archive, field, start, end),
+                        key=lambda event: (event[field], event['id']))
+        return ([event.to_record() for event in events],
+                [(event[field].isoformat(), event['id']) for event in events])
+
+    def _range_page(self, field, start, end, limit, cursor):
+        records, keys = self.responses.get(('range-records', field, start, end), self._version(),
+                                           lambda: self._range_records(field, start, end))
+        first = 0
+        if cursor is not None:
+            # カーソルは直前のページの最後の (日付, id)。その次から返す (間で変更されても飛ばしや重複が無い)
+            after = _decode_cursor(cursor, str)
+            first = bisect.bisect_right(keys, tuple(after))
+        page = records[first:first + limit]
+        next_cursor = None
+        if first + limit < len(records):
+            next_cursor = _encode_cursor([page[-1][field], page[-1]['id']])
+        return _json_bytes({'events': page, 'total': len(records), 'next_cursor': next_cursor})
+
+    def _lookup(self, event_id):
+        """id のイベント (繰り返しの各回の id は元のイベントに解決しない)。無ければ None"""
+        event = self.shared_store.get(_check_id(event_id))
+        return event if event is not None and event['id'] == event_id else None
+
+    def _find(self, event_id):
+        """_lookup と同じだが、無ければ 404"""
+        event = self._lookup(event_id)
+        if event is None:
+            raise ApiError(404, f"イベント {event_id} はありません")
+        return event
+
+    def _get(self, event_id, headers):
+        event = self._find(event_id)
+        return self._cached(*self.responses.get(('event', event_id), self._version(),
+                                                lambda: self._with_etag(_json_bytes({'event': event.to_record()}))), headers)
+
+    # --- 書き込み ---
+    def _check_if_match(self, event, headers):
+        """If-Match があれば、GET で返した ETag と一致しない (他で変更された) とき 412 にする"""
+        if_match = headers.get('If-Match')
+        if if_match and not etag_matches(if_match, _etag(_json_bytes({'event': event.to_record()}))):
+            raise ApiError(412, "イベントは他で変更されています")
+
+    def _saved(self, status, event, headers=None):
+        body = {'event': event.to_record()}
+        return self._json(status, body, {'ETag': _etag(_json_bytes(body)), **(headers or {})})
+
+    # 確認と保存は batch() の中で行い、その間に他のリクエストやセッションの変更が割り込まないようにする
+    def _create(self, record):
+        event = _validated(record)
+        with self.shared_store.batch():
+            if self.shared_store.get(event['id']) is not None:
+                raise ApiError(409, f"イベント {event['id']} は既にあります")
+            self.shared_store.apply([('add', event)])
+        return self._saved(201, event, {'Location': f"/events/{urllib.parse.quote(event['id'])}"})
+
+    def _update(self, event_id, record, headers):
+        event = _validated(record, event_id)
+        with self.shared_store.batch():
+            self._check_if_match(self._find(event_id), headers)
+            self.shared_store.apply([('update', event)])
+        return self._saved(200, event)
+
+    def _delete(self, event_id, headers):
+        with self.shared_store.batch():
+            self._check_if_match(self._find(event_id), headers)
+            self.shared_store.apply([('delete', event_id)])
+        return 204, {}, iter(())
+
+    def _bulk(self, payload):
+        """変更の列を全て検証してから1回で保存する (1件でも不正なら何も変更しない)"""
+        ops = payload.get('ops') if isinstance(payload, dict) else None
+        if not isinstance(ops, list):
+            raise ApiError(400, '本文は {"ops": [...]} です')
+        if len(ops) > MAX_BULK_OPS:
+            raise ApiError(413, f"一度に送れる変更は {MAX_BULK_OPS} 件までです")
+        with self.shared_store.batch():
+            changes, errors = self._bulk_changes(ops)
+            if changes and not errors:
+                self.shared_store.apply(changes)
+        if errors:
+            raise ApiError(400, f"{len(errors)} 件の変更が不正なため、何も変更しませんでした", errors)
+        return self._json(200, {'applied': len(changes), 'version': self.shared_store.version})
+
+    def _bulk_changes(self, ops):
+        """変更の列を検証して (変更の列, エラーの列) を返す。各変更は、それより前の変更を反映した状態で確かめる"""
+        changes, errors = [], []
+        pending = {} # この列の中で先に変更した id -> 変更後のイベント (削除なら None)
+
+        def current(event_id):
+            _check_id(event_id)
+            return pending[event_id] if event_id in pending else self._lookup(event_id)
+
+        for index, op in enumerate(ops):
+            try:
+                kind = op.get('op') if isinstance(op, dict) else None
+                if kind == 'add':
+                    event = _validated(op.get('event'))
+                    if current(event['id']) is not None:
+                        raise ApiError(409, f"イベント {event['id']} は既にあります")
+                elif kind == 'update':
+                    record = op.get('event')
+                    event_id = record.get('id') if isinstance(record, dict) else None
+                    if current(event_id) is None:
+                        raise ApiError(404, f"イベント {event_id} はありません")
+                    event = _validated(record, event_id)
+                elif kind == 'delete':
+                    event_id = op.get('id')
+                    if current(event_id) is None:
+                        raise ApiError(404, f"イベント {event_id} はありません")
+                    event = None
+                else:
+                    raise ApiError(400, "op は add / update / delete です")
+            except ApiError as e:
+                error = {'index': index, 'status': e.status, 'message': str(e)}
+                if e.errors:
+                    error['errors'] = e.errors
+                errors.append(error)
+                continue
+            pending[event['id'] if event is not None else event_id] = event
+            changes.append((kind, event if event is not None else event_id))
+        return changes, errors
+
+    # --- エクスポート ---
+    def _export(self, fmt, headers):
+        if fmt not in ('ics', 'csv'):
+            raise ApiError(404, "見つかりません")
+        return export_response(self.exports, fmt, self.shared_store.version, self.shared_store.events,
+                               if_none_match=headers.get('If-None-Match'))
+
+
+# --- HTTP サーバ ---
+class ApiRequestHandler(http.server.BaseHTTPRequestHandler):
+    """EventApi に要求を渡す (api はサーバごとに make_server で設定する)"""
+
+    api = None
+    protocol_version = "HTTP/1.1"
+
+    def _dispatch(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            status, headers, chunks = EventApi._json(413, {'error': "本文が大きすぎます"})
+            self.close_connection = True
+        else:
+            body = self.rfile.read(length) if length else b""
+            status, headers, chunks = self.api.handle(self.command, url.path, query, self.headers, body)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', "0")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError): # 受け取り終わる前に切断された
+            self.close_connection = True
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass # アクセスログは出さない (Streamlit のログに混ざるので)
+
+
+def make_server(api, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    handler = type("BoundApiRequestHandler", (ApiRequestHandler,), {'api': api})
+    return http.server.ThreadingHTTPServer((host, port), handler)
+
+
+def start_server(api, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """API サーバをデーモンスレッドで動かし、サーバを返す (止めるときは shutdown())"""
+    server = make_server(api, host, port)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="event-api", daemon=True).start()
+    return server
+
+
+def server_config_from_env():
+    """環境変数の設定から (ホスト, ポート, トークン) を返す。EVENT_API_PORT が無ければ None"""
+    port = os.environ.get(API_PORT_ENV)
+    if not port:
+        return None
+    return os.environ.get(API_HOST_ENV, DEFAULT_HOST), int(port), os.environ.get(API_TOKEN_ENV) or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.environ.get(API_HOST_ENV, DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.environ.get(API_PORT_ENV) or DEFAULT_PORT))
+    parser.add_argument("--backend", help="保存先のストレージ (journal / json / sqlite)")
+    args = parser.parse_args()
+    api = EventApi(SharedEventStore(open_store(args.backend)), token=os.environ.get(API_TOKEN_ENV) or None)
+    server = make_server(api, args.host, args.port)
+    print(f"http://{args.host}:{server.server_address[1]}/events で待ち受けています")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
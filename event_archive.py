@@ -0,0 +1,172 @@
+import datetime
+import json
+import os
+import threading
+
+from event_collection import EventCollection
+from event_index import IntervalIndex, SortedDateIndex
+from event_recurrence import is_recurring
+from event_search import SEARCH_PAGE_SIZE, SearchIndex
+from event_store import DATA_FILE, atomic_write_json, file_stamp, snapshot_codec, stream_snapshot, write_snapshot
+
+# --- 定数定義 ---
+ARCHIVE_SUFFIX = ".archive"          # アーカイブのファイル名サフィックス (データファイルと同じ場所に置く)
+ARCHIVE_META_SUFFIX = ".meta"        # アーカイブの範囲と件数を持つファイル (アーカイブを読まずに分かるようにする)
+ARCHIVE_AFTER_DAYS = 30              # イベント日 (複数日なら終了日) と締切日がこの日数より前のイベントをアーカイブする
+ARCHIVE_AFTER_DAYS_ENV = "EVENT_ARCHIVE_AFTER_DAYS" # 上の日数を変える環境変数 ("off" ならアーカイブしない)
+
+
+def archive_after_days():
+    """アーカイブするまでの日数 (環境変数 EVENT_ARCHIVE_AFTER_DAYS)。"off" なら None"""
+    value = os.environ.get(ARCHIVE_AFTER_DAYS_ENV, "").strip().lower()
+    if value == "off":
+        return None
+    return max(0, int(value)) if value else ARCHIVE_AFTER_DAYS
+
+
+def is_archivable(event, cutoff):
+    """cutoff より前に終わり、締切も cutoff より前のイベントか (繰り返しのイベントは先の回があるので対象外)"""
+    if is_recurring(event):
+        return False
+    last = event.end_date_ordinal or event.date_ordinal
+    return last < cutoff.toordinal() and event.deadline_ordinal < cutoff.toordinal()
+
+
+class EventArchive:
+    """作業中の一覧から外した過去のイベントの置き場所 (コールドな層)
+
+    アーカイブはデータファイルの隣の別ファイルにスナップショットと同じ形式で書き出し、
+    過去に表示期間を動かしたときや過去のイベントを検索したときに初めて読み込む。
+    アーカイブに入っているのは before の日付より前に終わったイベントだけで、before と件数は
+    小さなメタファイルに持つので、表示期間がアーカイブに掛かるかどうかは読み込まずに分かる。
+    """
+
+    def __init__(self, path, codec=None):
+        self.path = path
+        self.meta_path = path + ARCHIVE_META_SUFFIX
+        self.codec = snapshot_codec(codec)
+        self._lock = threading.RLock()
+        self._events = None  # 読み込むまでは None
+        self._stamp = None
+        self._indexes = {}
+        self.before = None   # この日付より前に終わったイベントがアーカイブにある (アーカイブが空なら None)
+        self.count = 0
+        self.version = 0     # アーカイブの中身が変わるたびに進む
+        self._read_meta()
+
+    @classmethod
+    def for_store(cls, backend):
+        """ストレージ backend のデータファイルの隣に置くアーカイブ"""
+        return cls(getattr(backend, 'path', DATA_FILE) + ARCHIVE_SUFFIX)
+
+    @property
+    def loaded(self):
+        return self._events is not None
+
+    def reaches(self, start):
+        """start 以降の表示期間がアーカイブのイベントに掛かるか (掛からなければ読み込まなくてよい)"""
+        return self.before is not None and start < self.before
+
+    # --- 読み込み ---
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.before = datetime.date.fromisoformat(meta['before'])
+            self.count = meta['count']
+        except (FileNotFoundError, KeyError, TypeError, ValueError):
+            self.before, self.count = None, 0
+
+    def _ensure_loaded(self):
+        """まだ読み込んでいないか、別プロセスがアーカイブを書き換えていれば読み込む"""
+        stamp = file_stamp(self.path, self.meta_path)
+        if self._events is not None and stamp == self._stamp:
+            return
+        if self._events is not None:
+            self.version += 1
+        self._events = EventCollection(stream_snapshot(self.path)[0])
+        self._indexes = {'deadline': SortedDateIndex('deadline'), 'interval': IntervalIndex(), 'search': SearchIndex()}
+        for index in self._indexes.values():
+            index.rebuild(self._events)
+        self._stamp = stamp
+        self._read_meta()
+
+    def events(self):
+        with self._lock:
+            self._ensure_loaded()
+            return tuple(self._events)
+
+    def ids(self):
+        with self._lock:
+            self._ensure_loaded()
+            return {event['id'] for event in self._events}
+
+    def get(self, event_id):
+        with self._lock:
+            self._ensure_loaded()
+            return self._events.get(event_id)
+
+    # --- 問い合わせ (SharedEventStore と同じ形で返す) ---
+    def events_in_window(self, field, start, end):
+        """表示期間 start 〜 end に入るアーカイブのイベントを返す (期間がアーカイブに掛からなければ読み込まない)"""
+        if not self.reaches(start):
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            if field == 'date':
+                ids = self._indexes['interval'].overlapping(start, end)
+            elif field == 'deadline':
+                ids = self._indexes['deadline'].ids_between(start, end)
+            else:
+                raise ValueError(f"unknown date field: {field}")
+            return [self._events.get(event_id) for event_id in ids]
+
+    def search(self, query, limit=SEARCH_PAGE_SIZE, offset=0):
+        """アーカイブのイベントを検索し、(一致した件数, 点数の高い順に offset から limit 件のイベント) を返す"""
+        if self.before is None:
+            return 0, []
+        with self._lock:
+            self._ensure_loaded()
+            total, ids = self._indexes['search'].search(query, limit, offset)
+            return total, [self._events.get(event_id) for event_id in ids]
+
+    # --- 書き込み ---
+    def append(self, events, before):
+        """events をアーカイブに加えて書き出す。before は events が全てその日より前に終わっている日付"""
+        with self._lock:
+            self._ensure_loaded()
+            for event in events:
+                self._events.add(event)
+                for index in self._indexes.values():
+                    index.on_add(event)
+            write_snapshot(self.path, list(self._events), self.codec)
+            self.before = max(before, self.before or before)
+            self.count = len(self._events)
+            atomic_write_json(self.meta_path, {'before': self.before.isoformat(), 'count': self.count})
+            self._stamp = file_stamp(self.path, self.meta_path)
+            self.version += 1
+
+
+def archive_past_events(shared_store, archive, today, after_days=ARCHIVE_AFTER_DAYS):
+    """today の after_days 日前より前に終わったイベントを共有の一覧からアーカイブに移し、移した件数を返す
+
+    アーカイブに書き出してから一覧から削除するので、途中で失敗してもイベントは失われない
+    (両方に残った場合は次の実行で上書きされる)。
+    """
+    cutoff = today - datetime.timedelta(days=after_days)
+    with shared_store.batch(): # 選んでから削除するまでの間に他のセッションが変更しないようにする
+        # 締切が cutoff より前のものだけを締切順の索引から取り出して調べる (全件は走査しない)
+        candidates = map(shared_store.get, shared_store.indexes['deadline'].ids_before(cutoff))
+        stale = [event for event in candidates if is_archivable(event, cutoff)]
+        if stale:
+            archive.append(stale, cutoff)
+            shared_store.apply([('delete', event['id']) for event in stale])
+    return len(stale)
+
+
+def window_events(shared_store, archive, field, start, end):
+    """表示期間のイベントを作業中の一覧と (期間が掛かるときだけ) アーカイブから返す"""
+    events = shared_store.events_in_window(field, start, end)
+    # アーカイブへの書き出しの後で削除に失敗したイベントは両方にあるので、作業中の一覧の方を使う
+    events += [event for event in archive.events_in_window(field, start, end) if shared_store.get(event['id']) is None]
+    return events
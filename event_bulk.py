@@ -0,0 +1,51 @@
+import datetime
+
+from event_model import Event, InvalidEventError
+
+# --- 定数定義 ---
+BULK_ACTIONS = ('delete', 'shift', 'deadline') # 削除 / 日付をずらす / 申込締切日を変える
+_MAX_ORDINAL = datetime.date.max.toordinal()
+
+
+def shifted(event, days):
+    """イベント日・終了日・申込締切日をそろって days 日ずらしたイベント (日付の間隔は変えない)"""
+    end_date = event.end_date_ordinal
+    ordinals = [event.date_ordinal + days, event.deadline_ordinal + days] + ([] if end_date is None else [end_date + days])
+    if not all(1 <= ordinal <= _MAX_ORDINAL for ordinal in ordinals):
+        raise InvalidEventError('date', dict(event))
+    return Event.from_ordinals(event.id, event.title, ordinals[0], ordinals[1], event.description,
+                               None if end_date is None else ordinals[2], event.extra)
+
+
+def bulk_ops(shared_store, ids, action, days=0, deadline=None):
+    """選んだ id のイベントへの変更の列を作る (他のセッションで削除済みの id は飛ばす)"""
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"unknown bulk action: {action}")
+    ops = []
+    for event_id in dict.fromkeys(ids): # 同じ id が2回選ばれても1回だけ
+        event = shared_store.get(event_id)
+        if event is None or event['id'] != event_id:
+            continue
+        if action == 'delete':
+            ops.append(('delete', event_id))
+        elif action == 'shift':
+            ops.append(('update', shifted(event, days)))
+        else:
+            ops.append(('update', event.replace(deadline=deadline)))
+    return ops
+
+
+def apply_bulk(shared_store, ids, action, days=0, deadline=None, history=None, label=None):
+    """選んだイベントをまとめて変更し、変更した件数を返す
+
+    変更は batch() の中で1回の apply にまとめるので、何件でも保存は1回、索引の更新も1回で、
+    変更の列を作ってから保存するまでの間に他のセッションの変更が割り込むこともない。
+    history (EventHistory) を渡すと、まとめての変更が1つの操作として元に戻せるように残る。
+    """
+    with shared_store.batch():
+        ops = bulk_ops(shared_store, ids, action, days, deadline)
+        if ops and history is not None:
+            history.apply(shared_store, ops, label or action)
+        elif ops:
+            shared_store.apply(ops)
+    return len(ops)
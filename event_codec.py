@@ -0,0 +1,659 @@
+import array
+import codecs
+import contextlib
+import datetime
+import gc
+import json
+import operator
+import re
+import struct
+import sys
+
+from event_model import Event, day
+
+try:
+    import orjson
+except ImportError: # orjson が無ければ標準の json を使う
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # msgpack 形式は msgpack が入っているときだけ使える
+    msgpack = None
+
+# --- 定数定義 ---
+SNAPSHOT_CODEC_ENV = "EVENT_SNAPSHOT_CODEC" # スナップショットの書き出し形式を選ぶ環境変数
+DEFAULT_CODEC = 'compact'
+BINARY_MAGIC = b"EVTC"  # 列ごとに詰めたバイナリ形式の先頭4バイト
+MSGPACK_MAGIC = b"EVTM" # msgpack 形式の先頭4バイト
+BINARY_VERSION = 1
+STREAM_CHUNK_SIZE = 256 * 1024         # JSON を少しずつ読むときに1回に読むバイト数
+STREAM_MAX_RECORD_CHARS = 1024 * 1024  # 1件の要素として読み足す最大の長さ (超えたら壊れた要素として読み飛ばす)
+
+_DATE_COLUMNS = ('date', 'deadline', 'end_date')
+_STRING_COLUMNS = ('id', 'title', 'description')
+_KNOWN_FIELDS = frozenset(_DATE_COLUMNS + _STRING_COLUMNS)
+_BASE_FIELDS = ('id', 'title', 'date', 'deadline', 'description')
+_HEADER = struct.Struct("<4sBI") # マジック, 版, 件数
+_LENGTH = struct.Struct("<I")
+_SPACE = re.compile(r"\s*")
+_KEY_SEPARATOR = re.compile(r"\s*:\s*")
+_SEPARATOR = re.compile(r"\s*,\s*")
+_NEXT_RECORD = re.compile(r",\s*(?=\{)") # 壊れた要素の後で、次のレコード (オブジェクト) の始まりを探す
+
+
+class SnapshotDecodeError(ValueError):
+    """スナップショットの形式が壊れている"""
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """大量の辞書を作る間は循環参照の GC を止める (作るたびに既存の全オブジェクトを走査し直すのを避ける)"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# --- 日付の変換 ---
+def _json_default(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _parse_ordinal(value):
+    if value.__class__ is str:
+        return datetime.date.fromisoformat(value).toordinal()
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    raise TypeError(value)
+
+
+def _plain(records):
+    """Event を JSON に書き出せる辞書にする (辞書はそのまま)"""
+    return [record.to_record() if record.__class__ is Event else record for record in records]
+
+
+def record_converter():
+    """デコードしたレコードを Event にする関数 (1件ずつ変換するもの, リストをまとめて変換するもの) を返す
+
+    日付が不正か id の無いレコードは ValueError などを送出する。同じ日付の文字列は1回だけ解析する
+    (イベント数に比べて日付の種類はずっと少ない)。まとめて変換する方は基本項目だけのレコード
+    を1件ずつ確かめずに変換し、終了日などの項目があるレコードだけを1件ずつ変換する。
+    変換できないレコードが混じっていれば KeyError などを送出するので、呼び出し側が1件ずつ変換し直す。
+    """
+    ordinals = {}
+
+    def ordinal_of(value):
+        if value is None:
+            return None
+        ordinal = ordinals.get(value)
+        if ordinal is None:
+            ordinal = ordinals[value] = _parse_ordinal(value)
+        return ordinal
+
+    new_event = Event.from_ordinals
+    known = _KNOWN_FIELDS
+    base_fields = operator.itemgetter(*_BASE_FIELDS)
+
+    def convert(record):
+        event_id = record.get('id')
+        date = ordinals.get(record.get('date')) or ordinal_of(record.get('date'))
+        deadline = ordinals.get(record.get('deadline')) or ordinal_of(record.get('deadline'))
+        end_date = record.get('end_date')
+        if end_date is not None:
+            end_date = ordinal_of(end_date)
+            if end_date < date:
+                raise ValueError(end_date)
+            if end_date == date:
+                end_date = None
+        if event_id is None or date is None or deadline is None:
+            raise ValueError(event_id)
+        extra = None
+        if not record.keys() <= known:
+            extra = {key: value for key, value in record.items() if key not in known}
+        return new_event(event_id, record.get('title', ''), date, deadline, record.get('description', ''), end_date, extra)
+
+    def missing_id():
+        raise ValueError(None)
+
+    def build(rows):
+        return [new_event(event_id, title, ordinals[date], ordinals[deadline], description)
+                if event_id is not None else missing_id()
+                for event_id, title, date, deadline, description in rows]
+
+    def convert_all(records):
+        rows = list(map(base_fields, records))
+        try:
+            events = build(rows)
+        except KeyError: # 初めて見る日付を解析してからもう一度変換する
+            for row in rows:
+                ordinal_of(row[2])
+                ordinal_of(row[3])
+            events = build(rows)
+        if sum(map(len, records)) != len(rows) * len(_BASE_FIELDS):
+            # 終了日などがあるレコード (複数日のイベントなど) だけ1件ずつ変換し直す
+            for position, size in enumerate(map(len, records)):
+                if size != len(_BASE_FIELDS):
+                    events[position] = convert(records[position])
+        return events
+
+    return convert, convert_all
+
+
+def to_events(records):
+    """デコードしたレコードを Event にし、(Event のリスト, Event にできなかったレコードの位置) を返す
+
+    日付が不正なレコードと id の無い (旧形式の) レコードは辞書のまま残すので、
+    deserialize_records で改めてエラーにしたり id を付与したりできる。
+    """
+    convert, _ = record_converter()
+    events = []
+    invalid = []
+    with gc_paused():
+        for position, record in enumerate(records):
+            try:
+                events.append(convert(record))
+            except (ValueError, TypeError, AttributeError):
+                events.append(record)
+                invalid.append(position)
+    return events, invalid
+
+
+# --- JSON の逐次読み込み ---
+class _TextReader:
+    """バイトのストリームをチャンクごとに文字列にして読む (読み終えた部分は次に読み足すときに捨てる)"""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """次のチャンクを読み足す。もう読むものがなければ False"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = not chunk
+        self.text = self.text[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def next_char(self):
+        """空白を読み飛ばして次の文字を返す (終わりなら '')"""
+        while True:
+            self.pos = _SPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def scan(self, decode):
+        """次の値を decode (raw_decode) で読む。値がチャンクをまたぐときは読み足してから読み直す"""
+        while True:
+            try:
+                value, end = decode(self.text, self.pos)
+                if end < len(self.text) or self.eof: # 末尾で終わった値は、続きがあるかもしれない
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof or len(self.text) - self.pos > STREAM_MAX_RECORD_CHARS:
+                    raise
+            self.fill()
+
+    def complete_values(self):
+        """バッファの中で完結している要素をまとめて1回でデコードして返す (まとめて読めなければ空のリスト)
+
+        最後の要素の区切り (「},{」) までを配列としてデコードする。区切りに見えたのが文字列の中だった場合などは
+        配列として読めないので、呼び出し側が1件ずつ読む。
+        """
+        text, start = self.text, self.pos
+        end = text.rfind("}", start)
+        while end > start:
+            match = _SEPARATOR.match(text, end + 1)
+            if match and text.startswith("{", match.end()):
+                break
+            end = text.rfind("}", start, end)
+        else:
+            return []
+        try:
+            values = json.loads(f"[{text[start:end + 1]}]")
+        except json.JSONDecodeError:
+            return []
+        self.pos = match.end()
+        return values
+
+    def resync(self):
+        """壊れた値を読み飛ばして次のレコードの始まりに進む。見つからずに終わりまで来たら False"""
+        while True:
+            match = _NEXT_RECORD.search(self.text, self.pos + 1)
+            if match:
+                self.pos = match.end()
+                return True
+            if self.eof:
+                return False
+            self.pos = max(self.pos, len(self.text) - self.chunk_size) # 探し終えた部分は捨てる
+            self.fill()
+
+
+def iter_json_batches(stream, on_error=None, chunk_size=STREAM_CHUNK_SIZE):
+    """JSON の配列のスナップショットを少しずつ読み、(先頭の要素が何件目か, 要素のリスト) を返すジェネレータ
+
+    ファイル全体を読み込まないので、メモリに載るのは読みかけのチャンクとその中の要素だけになる。
+    要素はチャンクごとにまとめて返すので、呼び出し側はまとめて変換できる。
+    壊れた要素は次の要素の始まりまで読み飛ばし、途中で切れたファイルはそこまでの要素を返して終わる。
+    どちらも on_error(何件目か, 種類 ('syntax' / 'truncated'), メッセージ) で知らせる。
+    """
+    reader = _TextReader(stream, chunk_size)
+    decoder = json.JSONDecoder()
+    decode, scan_once, separator = decoder.raw_decode, decoder.scan_once, _SEPARATOR.match
+    report = on_error or (lambda position, kind, message: None)
+    char = reader.next_char()
+    if char == "":
+        report(0, 'truncated', "スナップショットが空です")
+        return
+    if char != "[":
+        raise SnapshotDecodeError("スナップショットがリストではありません")
+    reader.pos += 1
+    if reader.next_char() == "]":
+        return
+    position = 0
+    while True:
+        # チャンクの中で完結している要素はまとめてデコードし、まとめて読めなければ1件ずつ続けて読む
+        values = reader.complete_values()
+        text, pos = reader.text, reader.pos
+        size = len(text)
+        while True:
+            try:
+                value, end = scan_once(text, pos)
+            except (StopIteration, json.JSONDecodeError):
+                break
+            match = separator(text, end)
+            if match is None or match.end() == size:
+                break
+            values.append(value)
+            pos = match.end()
+        reader.pos = pos
+        if values:
+            yield position + 1, values
+            position += len(values)
+        # チャンクの境目・壊れた要素・配列の終わりは1件ずつ確かめながら読む
+        if reader.next_char() == "":
+            report(position, 'truncated', f"ファイルが {position}件目の後で終わっています")
+            return
+        position += 1
+        try:
+            yield position, [reader.scan(decode)]
+        except json.JSONDecodeError as e:
+            if not reader.resync():
+                report(position, 'truncated', f"ファイルが {position}件目の途中で終わっています")
+                return
+            report(position, 'syntax', f"JSON の形式が不正です ({e.msg})")
+            continue
+        char = reader.next_char()
+        if char == ",":
+            reader.pos += 1
+        elif char == "]":
+            return
+        elif char == "":
+            report(position, 'truncated', f"ファイルが {position}件目の後で終わっています")
+            return
+        elif reader.resync(): # 区切りの無い余分な値は次の要素まで読み飛ばす
+            report(position, 'syntax', f"{position}件目の後の形式が不正です")
+        else:
+            report(position, 'truncated', f"ファイルが {position}件目の後で終わっています")
+            return
+
+
+# --- コーデック ---
+class SnapshotCodec:
+    """スナップショット (イベントレコードのリスト) と bytes を相互に変換する
+
+    encode() には Event か、日付が datetime.date でも ISO 文字列でもよいイベント辞書を渡せる。
+    decode() は (Event のリスト, Event にできなかった (日付が不正か id の無い) レコードの位置) を返す。
+    Event にできなかったレコードは辞書のままリストに入る。on_error を渡すと、途中で切れたデータを
+    読めるコーデック (binary) は読めたところまで (基本項目以外の項目が読めなかったイベントは除く) を返し、
+    on_error(件数, 'truncated', メッセージ) で知らせる。
+    """
+
+    name = None
+
+    def encode(self, records):
+        raise NotImplementedError
+
+    def decode(self, data, on_error=None):
+        raise NotImplementedError
+
+
+class JsonCodec(SnapshotCodec):
+    """従来と同じ、字下げした JSON"""
+
+    name = 'json'
+
+    def encode(self, records):
+        return json.dumps(_plain(records), ensure_ascii=False, indent=4, default=_json_default).encode("utf-8")
+
+    def decode(self, data, on_error=None):
+        with gc_paused():
+            records = orjson.loads(data) if orjson is not None else json.loads(data)
+        if not isinstance(records, list):
+            raise SnapshotDecodeError("スナップショットがリストではありません")
+        return to_events(records)
+
+
+class CompactJsonCodec(JsonCodec):
+    """空白を入れない JSON (orjson があれば orjson で書き出す)"""
+
+    name = 'compact'
+
+    def encode(self, records):
+        if orjson is not None:
+            return orjson.dumps(_plain(records)) # datetime.date は ISO 形式で書き出される
+        return json.dumps(_plain(records), ensure_ascii=False, separators=(',', ':'), default=_json_default).encode("utf-8")
+
+
+class BinaryCodec(SnapshotCodec):
+    """日付を序数の int 配列、文字列を列ごとに連結した blob にした列指向のバイナリ形式
+
+    ヘッダ (マジック, 版, 件数) の後に、date と deadline の列 (int32 x 件数)、
+    end_date の列 (件数 + 位置の int32 列 + 序数の int32 列。持つイベントが少ないので疎に持つ)、
+    文字列の列 (長さ + NUL 区切りの UTF-8) x 3、その他の項目 (長さ + JSON) が続く。
+    読み込みは列ごとにまとめて変換するので、レコードごとの日付の解析がない。
+    列に入らない値 (その他の項目、無い項目、NUL を含む文字列、不正な日付) は
+    位置 -> {'set': {...}, 'unset': [...]} として JSON の部分に入れる。
+    """
+
+    name = 'binary'
+
+    def encode(self, records):
+        try:
+            columns = self._columns(records)
+        except (KeyError, AttributeError, TypeError, ValueError):
+            columns = None
+        if columns is None: # 列に入らない値があれば1件ずつ調べる
+            columns = self._columns_per_record(records)
+        dates, end_positions, end_ordinals, strings, extras = columns
+        parts = [_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(records)),
+                 _ints(dates[0]), _ints(dates[1]),
+                 _LENGTH.pack(len(end_positions)), _ints(end_positions), _ints(end_ordinals)]
+        for text in strings + [json.dumps(extras, ensure_ascii=False, default=_json_default) if extras else ""]:
+            blob = text.encode("utf-8")
+            parts += [_LENGTH.pack(len(blob)), blob]
+        return b"".join(parts)
+
+    @staticmethod
+    def _columns(records):
+        """全レコードが列に収まる (日付は datetime.date、文字列に NUL が無い) ときの速い経路"""
+        if all(record.__class__ is Event for record in records):
+            return BinaryCodec._event_columns(records)
+        dates = [[record[field].toordinal() for record in records] for field in ('date', 'deadline')]
+        end_positions, end_ordinals = [], []
+        for position, record in enumerate(records):
+            if 'end_date' in record:
+                end_ordinals.append(record['end_date'].toordinal())
+                end_positions.append(position)
+        strings = []
+        for field in _STRING_COLUMNS:
+            blob = "\0".join([record[field] for record in records])
+            if blob.count("\0") != max(len(records) - 1, 0):
+                return None
+            strings.append(blob)
+        extras = {position: {'set': {k: v for k, v in record.items() if k not in _KNOWN_FIELDS}, 'unset': []}
+                  for position, record in enumerate(records) if not record.keys() <= _KNOWN_FIELDS}
+        return dates, end_positions, end_ordinals, strings, extras
+
+    @staticmethod
+    def _event_columns(records):
+        """Event だけのときは序数と属性をそのまま列にする"""
+        dates = [[record.date_ordinal for record in records], [record.deadline_ordinal for record in records]]
+        end_positions, end_ordinals = [], []
+        for position, record in enumerate(records):
+            if record.end_date_ordinal is not None:
+                end_ordinals.append(record.end_date_ordinal)
+                end_positions.append(position)
+        strings = []
+        for column in ([record.id for record in records], [record.title for record in records],
+                       [record.description for record in records]):
+            blob = "\0".join(column)
+            if blob.count("\0") != max(len(records) - 1, 0):
+                return None
+            strings.append(blob)
+        extras = {position: {'set': record.extra, 'unset': []}
+                  for position, record in enumerate(records) if record.extra}
+        return dates, end_positions, end_ordinals, strings, extras
+
+    @staticmethod
+    def _columns_per_record(records):
+        dates = {'date': [], 'deadline': [], 'end_date': []}
+        end_positions = []
+        strings = {field: [] for field in _STRING_COLUMNS}
+        extras = {}
+        for position, record in enumerate(records):
+            extra_set, extra_unset = {}, []
+            for field in _DATE_COLUMNS:
+                value = record.get(field)
+                if value.__class__ is str:
+                    try:
+                        value = datetime.date.fromisoformat(value)
+                    except ValueError:
+                        pass # 不正な日付は文字列のまま残す
+                if isinstance(value, datetime.date):
+                    ordinal = value.toordinal()
+                else:
+                    ordinal = 0
+                    if field not in record:
+                        if field != 'end_date':
+                            extra_unset.append(field)
+                    elif value is not None or field == 'end_date':
+                        extra_set[field] = value
+                if field != 'end_date':
+                    dates[field].append(ordinal)
+                elif ordinal:
+                    end_positions.append(position)
+                    dates[field].append(ordinal)
+            for field in _STRING_COLUMNS:
+                value = record.get(field)
+                if value.__class__ is str and "\0" not in value:
+                    strings[field].append(value)
+                    continue
+                strings[field].append("")
+                if field in record:
+                    extra_set[field] = value
+                else:
+                    extra_unset.append(field)
+            if not record.keys() <= _KNOWN_FIELDS:
+                extra_set.update((key, value) for key, value in record.items() if key not in _KNOWN_FIELDS)
+            if extra_set or extra_unset:
+                extras[position] = {'set': extra_set, 'unset': extra_unset}
+        return ([dates['date'], dates['deadline']], end_positions, dates['end_date'],
+                ["\0".join(strings[field]) for field in _STRING_COLUMNS], extras)
+
+    def decode(self, data, on_error=None):
+        reader = _Reader(data)
+        header = reader.take(_HEADER.size)
+        count = 0
+        if not reader.truncated:
+            magic, version, count = _HEADER.unpack(header)
+            if magic != BINARY_MAGIC or version != BINARY_VERSION:
+                raise SnapshotDecodeError(f"未対応のバイナリ形式です (版 {version})")
+        date_column = reader.ints(count)
+        deadline_column = reader.ints(count)
+        end_count = reader.length()
+        end_positions = reader.ints(end_count)
+        end_ordinals = reader.ints(end_count)
+        texts = []
+        for _field in _STRING_COLUMNS:
+            blob = reader.blob()
+            pieces = blob.decode("utf-8", "ignore" if reader.truncated else "strict").split("\0") if count else []
+            if reader.truncated:
+                pieces = pieces[:-1] # 切れた位置の要素 (と、それより後の列) は読めない
+            elif len(pieces) != count:
+                raise SnapshotDecodeError("バイナリ形式の文字列の件数が一致しません")
+            texts.append(pieces)
+        extras = reader.blob()
+        if reader.truncated:
+            if on_error is None:
+                raise SnapshotDecodeError("バイナリ形式のデータが途中で切れています")
+            extras, extras_known = _readable_extras(extras.decode("utf-8", "ignore"))
+        else:
+            extras = json.loads(extras) if extras else {}
+
+        # 同じ日付の序数は同じ int オブジェクトを使う (イベントごとに int を持たない)
+        ordinals = {ordinal: ordinal for column in (date_column, deadline_column) for ordinal in set(column)}
+        ordinal = ordinals.__getitem__
+        ids, titles, descriptions = texts
+        with gc_paused():
+            events = [
+                Event.from_ordinals(event_id, title, date, deadline, description)
+                for event_id, title, date, deadline, description in zip(
+                    ids, titles, map(ordinal, date_column), map(ordinal, deadline_column), descriptions)
+            ]
+        count = len(events)
+        for position, end_ordinal in zip(end_positions, end_ordinals):
+            if position < count:
+                events[position]._end_date = end_ordinal
+        if reader.truncated:
+            on_error(count, 'truncated', f"バイナリ形式のデータが {count}件目の後で切れています")
+            # 基本項目以外の項目 (繰り返しの規則など) が読めなかったイベントは、欠けたまま保存し直されないように除く
+            for position in range(extras_known, count):
+                on_error(position + 1, 'truncated', "データが途中で切れているため、基本項目以外の項目を読めません")
+            del events[extras_known:]
+            count = len(events)
+            # 列に入らなかった日付 (0) の項目が読めなかったイベントは、日付の無いレコードとして扱う
+            for position in range(count):
+                if not (date_column[position] and deadline_column[position]):
+                    extras.setdefault(str(position), {'set': {}, 'unset': []})
+        invalid = []
+        for position, extra in extras.items():
+            position = int(position)
+            if position >= count:
+                continue
+            event = events[position]
+            record = {'id': event.id, 'title': event.title, 'description': event.description}
+            for field, value in (('date', event.date_ordinal), ('deadline', event.deadline_ordinal),
+                                 ('end_date', event.end_date_ordinal)):
+                if value: # 列に入らなかった日付は 0
+                    record[field] = day(value)
+            for key in extra['unset']:
+                record.pop(key, None)
+            record.update(extra['set'])
+            converted, bad = to_events([record])
+            events[position] = converted[0]
+            if bad:
+                invalid.append(position)
+        invalid.sort()
+        return events, invalid
+
+
+def _readable_extras(text):
+    """途中で切れた「その他の項目」の JSON から、最後まで読めた位置の分だけを取り出す
+
+    (位置 -> 項目, 項目があるかどうかが分かっている先頭からの件数) を返す。位置は昇順に書き出されている。
+    """
+    decode = json.JSONDecoder().raw_decode
+    extras = {}
+    known = 0
+    if not text.startswith("{"):
+        return extras, known
+    pos = _SPACE.match(text, 1).end()
+    while True:
+        try:
+            key, pos = decode(text, pos)
+            known = int(key) # この位置より前には、読めた分のほかに項目は無い
+            pos = _KEY_SEPARATOR.match(text, pos).end()
+            value, pos = decode(text, pos)
+        except (json.JSONDecodeError, AttributeError, ValueError): # AttributeError は「:」が無いとき
+            return extras, known
+        extras[key] = value
+        known += 1
+        match = _SEPARATOR.match(text, pos)
+        if match is None:
+            return extras, known
+        pos = match.end()
+
+
+def _ints(values):
+    column = array.array('i', values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+class _Reader:
+    """バイナリ形式を先頭から順に読む (途中で切れていたら読めた分だけを返し、truncated を立てる)"""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+        self.truncated = False
+
+    def take(self, size):
+        chunk = self.data[self.offset:self.offset + size]
+        if len(chunk) != size:
+            self.truncated = True
+        self.offset += len(chunk)
+        return chunk
+
+    def length(self):
+        chunk = self.take(_LENGTH.size)
+        return _LENGTH.unpack(chunk)[0] if len(chunk) == _LENGTH.size else 0
+
+    def ints(self, count):
+        chunk = self.take(4 * count)
+        column = array.array('i')
+        column.frombytes(chunk[:len(chunk) - len(chunk) % 4])
+        if sys.byteorder != "little":
+            column.byteswap()
+        return column
+
+    def blob(self):
+        return self.take(self.length())
+
+
+class MsgpackCodec(SnapshotCodec):
+    """msgpack 形式 (msgpack が入っているときだけ使える)"""
+
+    name = 'msgpack'
+
+    def encode(self, records):
+        if msgpack is None:
+            raise RuntimeError("msgpack 形式で保存するには msgpack をインストールしてください")
+        return MSGPACK_MAGIC + msgpack.packb(_plain(records), default=_json_default)
+
+    def decode(self, data, on_error=None):
+        if msgpack is None:
+            raise SnapshotDecodeError("msgpack 形式のスナップショットを読むには msgpack をインストールしてください")
+        records = msgpack.unpackb(data[len(MSGPACK_MAGIC):])
+        return to_events(records)
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), CompactJsonCodec(), BinaryCodec(), MsgpackCodec())}
+
+
+def get_codec(name=None):
+    """名前 (省略時は既定の形式) のコーデックを返す"""
+    try:
+        return CODECS[name or DEFAULT_CODEC]
+    except KeyError:
+        raise ValueError(f"unknown snapshot codec: {name}") from None
+
+
+def detect_codec(data):
+    """先頭のバイト列からスナップショットの形式を判定する (マジックが無ければ JSON)"""
+    if data[:4] == BINARY_MAGIC:
+        return CODECS['binary']
+    if data[:4] == MSGPACK_MAGIC:
+        return CODECS['msgpack']
+    return CODECS['json']
+
+
+def decode_snapshot(data):
+    """形式を判定してスナップショットを読む"""
+    return detect_codec(data).decode(data)
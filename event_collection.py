@@ -0,0 +1,112 @@
+class _FenwickTree:
+    """位置 i の 0/1 を持ち、先頭からの合計を O(log n) で求める Binary Indexed Tree"""
+
+    def __init__(self, flags):
+        self._tree = [0] * (len(flags) + 1)
+        for i, flag in enumerate(flags, start=1):
+            self._tree[i] += flag
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def add(self, index, delta):
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index):
+        """index より前 (index を含まない) の合計"""
+        total = 0
+        i = index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class EventCollection:
+    """id をキーにした順序付きのイベントコレクション
+
+    反復順は登録順 (更新しても位置は変わらない) で、従来の event_list と同じ。
+    id での取得・追加・更新・削除は O(1)、表示順での位置 (セレクトボックスの index) は O(log n)。
+    各イベントには登録時に通し番号 (スロット) を割り当て、削除済みスロットを
+    Fenwick 木で数えることで位置を求める。削除済みが増えたらスロットを詰め直す。
+    """
+
+    def __init__(self, events=()):
+        self._by_id = {}
+        self._slot_of = {}
+        self._slots = []
+        for event in events:
+            event_id = event['id']
+            if event_id in self._by_id:
+                self._by_id[event_id] = event
+                continue
+            self._by_id[event_id] = event
+            self._slot_of[event_id] = len(self._slots)
+            self._slots.append(event_id)
+        self._tree = _FenwickTree([1] * len(self._slots))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __contains__(self, event_id):
+        return event_id in self._by_id
+
+    def get(self, event_id, default=None):
+        return self._by_id.get(event_id, default)
+
+    def position(self, event_id):
+        """表示順での位置 (0始まり) を返す。存在しなければ None"""
+        slot = self._slot_of.get(event_id)
+        if slot is None:
+            return None
+        return self._tree.prefix_sum(slot)
+
+    def add(self, event):
+        """末尾に追加する。同じ id があれば位置を保ったまま置き換える"""
+        event_id = event['id']
+        if event_id in self._by_id:
+            self._by_id[event_id] = event
+            return
+        if len(self._slots) == len(self._tree):
+            self._rebuild(capacity=max(16, 2 * len(self._slots)))
+        slot = len(self._slots)
+        self._slots.append(event_id)
+        self._slot_of[event_id] = slot
+        self._by_id[event_id] = event
+        self._tree.add(slot, 1)
+
+    def update(self, event):
+        """同じ id のイベントを置き換え、置き換え前のイベントを返す。存在しなければ None"""
+        old = self._by_id.get(event['id'])
+        if old is not None:
+            self._by_id[event['id']] = event
+        return old
+
+    def delete(self, event_id):
+        """削除したイベントを返す。存在しなければ None"""
+        old = self._by_id.pop(event_id, None)
+        if old is None:
+            return None
+        slot = self._slot_of.pop(event_id)
+        self._slots[slot] = None
+        self._tree.add(slot, -1)
+        if len(self._slots) > 64 and len(self._by_id) * 2 < len(self._slots):
+            self._rebuild(capacity=len(self._tree))
+        return old
+
+    def _rebuild(self, capacity):
+        """削除済みスロットを詰め、Fenwick 木を capacity 分の大きさで作り直す (O(n))"""
+        self._slots = list(self._by_id)
+        self._slot_of = {event_id: slot for slot, event_id in enumerate(self._slots)}
+        flags = [1] * len(self._slots)
+        flags.extend([0] * (max(capacity, len(self._slots)) - len(self._slots)))
+        self._tree = _FenwickTree(flags)
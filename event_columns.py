@@ -0,0 +1,91 @@
+import array
+import bisect
+import collections
+import datetime
+
+from event_model import day
+
+try:
+    import numpy
+except ImportError: # numpy が無ければ同じ計算を Python のループで行う
+    numpy = None
+
+# --- 定数定義 ---
+# 締切までの日数による区分: (名前, 日数の下限)。日数が下限以上で次の下限未満ならその区分
+STATUS_BUCKETS = (
+    ('expired', None), # 締切済 (日数 < 0)
+    ('today', 0),      # 本日締切
+    ('week', 1),       # 7日以内
+    ('month', 8),      # 30日以内
+    ('later', 31),     # それより先
+)
+_BUCKET_EDGES = [lower for _, lower in STATUS_BUCKETS[1:]]
+_UNIX_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal() # numpy の datetime64[D] の 0
+
+
+class EventColumns:
+    """イベント一覧を列 (日付・締切日の序数の配列と、イベントへの位置) にしたもの
+
+    締切までの日数・区分ごとの件数・日付ごとの件数・月ごとの件数を、イベントごとの
+    Python のループではなく配列の演算でまとめて求める。numpy が無いときは同じ結果を
+    array と Python のループで求める。作った後のイベントの変更は反映されないので、
+    SharedEventStore.columns() で version と日付ごとに作り直したものを使う。
+    """
+
+    def __init__(self, events):
+        self.events = events # 列の位置 i はイベント events[i]
+        count = len(events)
+        dates = (event.date_ordinal for event in events)
+        deadlines = (event.deadline_ordinal for event in events)
+        if numpy is not None:
+            self.dates = numpy.fromiter(dates, dtype=numpy.int32, count=count)
+            self.deadlines = numpy.fromiter(deadlines, dtype=numpy.int32, count=count)
+        else:
+            self.dates = array.array('i', dates)
+            self.deadlines = array.array('i', deadlines)
+
+    def __len__(self):
+        return len(self.events)
+
+    # --- 締切 ---
+    def days_remaining(self, today):
+        """イベントごとの締切までの日数 (締切済は負) を列の順に返す"""
+        if numpy is not None:
+            return self.deadlines - numpy.int32(today.toordinal())
+        base = today.toordinal()
+        return array.array('i', [deadline - base for deadline in self.deadlines])
+
+    def status_counts(self, today):
+        """STATUS_BUCKETS の区分ごとの件数を {区分名: 件数} で返す"""
+        if numpy is not None:
+            buckets = numpy.searchsorted(_BUCKET_EDGES, self.days_remaining(today), side='right')
+            counts = numpy.bincount(buckets, minlength=len(STATUS_BUCKETS)).tolist()
+        else:
+            counts = [0] * len(STATUS_BUCKETS)
+            for days in self.days_remaining(today):
+                counts[bisect.bisect_right(_BUCKET_EDGES, days)] += 1
+        return {name: count for (name, _), count in zip(STATUS_BUCKETS, counts)}
+
+    # --- イベント日 ---
+    def date_counts(self, min_count=2):
+        """min_count 件以上のイベントがある (日付, 件数) を日付順に返す"""
+        if numpy is not None:
+            ordinals, counts = numpy.unique(self.dates, return_counts=True)
+            selected = counts >= min_count
+            return [(day(ordinal), count) for ordinal, count in
+                    zip(ordinals[selected].tolist(), counts[selected].tolist())]
+        counts = collections.Counter(self.dates)
+        return [(day(ordinal), count) for ordinal, count in sorted(counts.items()) if count >= min_count]
+
+    def month_histogram(self, field='date'):
+        """月ごとの件数を (その月の1日, 件数) の月順のリストで返す。field は 'date' か 'deadline'"""
+        column = self.dates if field == 'date' else self.deadlines
+        if numpy is not None:
+            months = (column - _UNIX_EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]')
+            values, counts = numpy.unique(months, return_counts=True)
+            return list(zip(values.astype(datetime.date).tolist(), counts.tolist()))
+        counts = collections.Counter(column) # 日付の種類はイベント数よりずっと少ないので、月への変換は種類ごとに1回
+        months = collections.Counter()
+        for ordinal, count in counts.items():
+            months[day(ordinal).replace(day=1)] += count
+        return sorted(months.items())
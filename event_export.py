@@ -0,0 +1,213 @@
+import csv
+import datetime
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from event_import import ICS_DEADLINE_PROP, ICS_KIND_PROP
+from event_recurrence import RRULE_FIELD
+
+# --- 定数定義 ---
+EXPORT_FORMATS = {
+    'ics': ("text/calendar; charset=utf-8", "events.ics"),
+    'csv': ("text/csv; charset=utf-8", "events.csv"),
+}
+CSV_HEADER = ('id', 'title', 'date', 'end_date', 'deadline', 'description')
+ICS_UID_DOMAIN = "entry-wasurenine" # UID の @ 以降
+_CHUNK_SIZE = 64 * 1024
+
+
+# --- iCalendar ---
+def _ics_escape(value):
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _ics_fold(line):
+    """RFC 5545 に従い、1行が75オクテットを超えないように折り返す (マルチバイト文字の途中では切らない)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    current, size, limit = [], 0, 75
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > limit:
+            parts.append("".join(current))
+            current, size, limit = [], 0, 74 # 継続行は先頭の空白1文字分短くする
+        current.append(ch)
+        size += width
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_date(day):
+    return day.strftime("%Y%m%d")
+
+
+def iter_ics(events, stamp=None):
+    """イベントを iCalendar として1イベントずつ文字列で返すジェネレータ
+
+    イベント日と申込締切日をそれぞれ終日の VEVENT にする。締切日の VEVENT には
+    X-ENTRY-KIND:deadline を付けるので、取り込み時には読み飛ばされる。
+    """
+    stamp = (stamp or datetime.datetime.now(datetime.timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    yield ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//entry-wasurenine//events//JA\r\n"
+           "CALSCALE:GREGORIAN\r\nX-WR-CALNAME:エントリー忘れナイン\r\n")
+    for ev in events:
+        if not isinstance(ev.get('date'), datetime.date) or not isinstance(ev.get('deadline'), datetime.date):
+            continue
+        last_day = ev.get('end_date') or ev['date']
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{ev['id']}@{ICS_UID_DOMAIN}",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{_ics_date(ev['date'])}",
+            f"DTEND;VALUE=DATE:{_ics_date(last_day + datetime.timedelta(days=1))}",
+            f"SUMMARY:{_ics_escape(ev.get('title', ''))}",
+            f"{ICS_DEADLINE_PROP};VALUE=DATE:{_ics_date(ev['deadline'])}",
+        ]
+        if ev.get('description'):
+            lines.append(f"DESCRIPTION:{_ics_escape(ev['description'])}")
+        recurrence = [f"RRULE:{ev[RRULE_FIELD]}"] if ev.get(RRULE_FIELD) else []
+        lines += recurrence
+        lines += [
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            f"UID:{ev['id']}-deadline@{ICS_UID_DOMAIN}",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{_ics_date(ev['deadline'])}",
+            f"DTEND;VALUE=DATE:{_ics_date(ev['deadline'] + datetime.timedelta(days=1))}",
+            f"SUMMARY:{_ics_escape('締切: ' + ev.get('title', ''))}",
+            f"{ICS_KIND_PROP}:deadline",
+            *recurrence,
+            "END:VEVENT",
+        ]
+        yield "".join(_ics_fold(line) for line in lines)
+    yield "END:VCALENDAR\r\n"
+
+
+# --- CSV ---
+def iter_csv(events):
+    """イベントを CSV として1行ずつ文字列で返すジェネレータ (event_import で取り込める形式)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(CSV_HEADER)
+    yield flush()
+    for ev in events:
+        writer.writerow([
+            ev.get('id', ''), ev.get('title', ''),
+            *(ev[field].isoformat() if isinstance(ev.get(field), datetime.date) else ''
+              for field in ('date', 'end_date', 'deadline')),
+            ev.get('description', ''),
+        ])
+        yield flush()
+
+
+def iter_export(fmt, events):
+    if fmt == 'ics':
+        return iter_ics(events)
+    if fmt == 'csv':
+        return iter_csv(events)
+    raise ValueError(f"unknown export format: {fmt}")
+
+
+# --- version ごとのキャッシュ ---
+class ExportArtifact:
+    """書き出し済みのエクスポート (一時ファイル) と、その ETag"""
+
+    def __init__(self, fmt, version, path, etag, size):
+        self.fmt = fmt
+        self.version = version
+        self.path = path
+        self.etag = etag
+        self.size = size
+
+    @property
+    def content_type(self):
+        return EXPORT_FORMATS[self.fmt][0]
+
+    @property
+    def filename(self):
+        return EXPORT_FORMATS[self.fmt][1]
+
+    def open(self):
+        return open(self.path, "rb")
+
+    def iter_chunks(self, chunk_size=_CHUNK_SIZE):
+        with self.open() as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+class ExportCache:
+    """形式ごとに最新 version のエクスポートを一時ファイルに書き出して使い回す
+
+    エクスポートはジェネレータから少しずつファイルに書き、書きながら ETag (SHA-256) を計算するので、
+    全体を1つの文字列としてメモリに持つことはない。データの version が変わるまでは
+    同じファイルと ETag を返すので、繰り返しのダウンロードやカレンダーアプリのポーリングは
+    書き出し直しにならず、If-None-Match が一致すれば本文を送らずに済む。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or tempfile.mkdtemp(prefix="event-export-")
+        self._lock = threading.Lock()
+        self._artifacts = {} # 形式 -> ExportArtifact
+
+    def get(self, fmt, version, fetch_events):
+        """fmt 形式の version のエクスポートを返す。fetch_events() は書き出しが必要なときだけ呼ばれる"""
+        with self._lock:
+            artifact = self._artifacts.get(fmt)
+            if artifact is not None and artifact.version == version:
+                return artifact
+            new_artifact = self._render(fmt, version, fetch_events())
+            self._artifacts[fmt] = new_artifact
+        if artifact is not None and os.path.exists(artifact.path):
+            os.remove(artifact.path)
+        return new_artifact
+
+    def _render(self, fmt, version, events):
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = tempfile.mkstemp(prefix=f"{fmt}-v{version}-", suffix=f".{fmt}", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter_export(fmt, events):
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                f.write(data)
+                size += len(data)
+        return ExportArtifact(fmt, version, path, f'"{digest.hexdigest()[:32]}"', size)
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match ヘッダの値が etag と一致するか (カンマ区切りの複数指定と * に対応)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def export_response(cache, fmt, version, fetch_events, if_none_match=None):
+    """条件付き GET の応答を (ステータス, ヘッダ, 本文のイテレータ) で返す (HTTP サーバから使う)"""
+    artifact = cache.get(fmt, version, fetch_events)
+    headers = {'ETag': artifact.etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(if_none_match, artifact.etag):
+        return 304, headers, iter(())
+    headers.update({
+        'Content-Type': artifact.content_type,
+        'Content-Length': str(artifact.size),
+        'Content-Disposition': f'attachment; filename="{artifact.filename}"',
+    })
+    return 200, headers, artifact.iter_chunks()
@@ -0,0 +1,118 @@
+import collections
+
+# --- 定数定義 ---
+HISTORY_LIMIT = 50 # セッションごとに元に戻せる操作の数 (古いものから捨てる)
+
+
+class HistoryConflictError(Exception):
+    """元に戻す/やり直す対象のイベントが、その後に他のセッションなどで変更されている"""
+
+    def __init__(self, label, event_id):
+        super().__init__(f"{label}: {event_id}")
+        self.label = label
+        self.event_id = event_id
+
+
+def _current(shared_store, event_id):
+    """id がちょうど一致するイベント (繰り返しの各回の id で元のイベントを返さないようにする)"""
+    event = shared_store.get(event_id)
+    return event if event is not None and event['id'] == event_id else None
+
+
+def _restore_ops(changes, to_before):
+    """(変更前, 変更後) の列から、変更前 (to_before) または変更後の状態に戻す変更の列を作る"""
+    ops = []
+    for before, after in (reversed(changes) if to_before else changes):
+        target, other = (before, after) if to_before else (after, before)
+        if target is None:
+            ops.append(('delete', other['id']))
+        elif other is None:
+            ops.append(('add', target))
+        else:
+            ops.append(('update', target))
+    return ops
+
+
+class EventHistory:
+    """セッションごとの「元に戻す」「やり直す」の履歴
+
+    一覧の全体を操作ごとに複製するのではなく、操作で変わったイベントの (変更前, 変更後) だけを持つ。
+    イベントは変更できない Event で共有の一覧と同じオブジェクトを指すので、メモリは変更した件数に比例し、
+    イベントの総数には依らない。元に戻すときも逆向きの変更を SharedEventStore.apply() で保存するので、
+    普段の変更と同じ経路でストレージと索引に反映される。
+    """
+
+    def __init__(self, limit=HISTORY_LIMIT):
+        self._undo = collections.deque(maxlen=limit) # (ラベル, ((変更前, 変更後), ...)) の列
+        self._redo = []
+
+    def __len__(self):
+        return len(self._undo)
+
+    @property
+    def undo_label(self):
+        """次に元に戻す操作のラベル (なければ None)"""
+        return self._undo[-1][0] if self._undo else None
+
+    @property
+    def redo_label(self):
+        """次にやり直す操作のラベル (なければ None)"""
+        return self._redo[-1][0] if self._redo else None
+
+    def apply(self, shared_store, ops, label):
+        """変更の列を保存して反映し、元に戻せるように履歴に残す"""
+        ids = [payload if op == 'delete' else payload['id'] for op, payload in ops]
+        with shared_store.batch(): # 変更前を読んでから保存するまでの間に他のセッションが変更しないようにする
+            befores = [_current(shared_store, event_id) for event_id in ids]
+            shared_store.apply(ops)
+            afters = [_current(shared_store, event_id) for event_id in ids]
+        changes = tuple((before, after) for before, after in zip(befores, afters) if before is not None or after is not None)
+        if changes:
+            self._undo.append((label, changes))
+            self._redo.clear() # 新しい操作をしたらやり直しの履歴は捨てる
+
+    def undo(self, shared_store):
+        """直前の操作を元に戻し、そのラベルを返す (戻す操作がなければ None)"""
+        if not self._undo:
+            return None
+        label, changes = self._undo[-1]
+        try:
+            self._restore(shared_store, label, changes, to_before=True)
+        except HistoryConflictError:
+            self._undo.pop()
+            raise
+        self._redo.append(self._undo.pop())
+        return label
+
+    def redo(self, shared_store):
+        """元に戻した操作をやり直し、そのラベルを返す (やり直す操作がなければ None)"""
+        if not self._redo:
+            return None
+        label, changes = self._redo[-1]
+        try:
+            self._restore(shared_store, label, changes, to_before=False)
+        except HistoryConflictError:
+            self._redo.pop()
+            raise
+        self._undo.append(self._redo.pop())
+        return label
+
+    def _restore(self, shared_store, label, changes, to_before):
+        """イベントが記録した状態のままなら、もう一方の状態に戻す
+
+        他のセッションなどで変わっていたイベントがあれば何も変更せず HistoryConflictError を送出する
+        (その操作は履歴から外れる)。保存に失敗したときは履歴をそのままにするので、もう一度試せる。
+        """
+        conflict = None
+        with shared_store.batch():
+            for before, after in changes:
+                expected = after if to_before else before
+                event_id = (before or after)['id']
+                if _current(shared_store, event_id) != expected:
+                    conflict = event_id
+                    break
+            else:
+                shared_store.apply(_restore_ops(changes, to_before))
+        # batch() の中で送出すると読み直しになるので、抜けてから送出する
+        if conflict is not None:
+            raise HistoryConflictError(label, conflict)
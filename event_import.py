@@ -0,0 +1,244 @@
+import argparse
+import csv
+import datetime
+import io
+import os
+import uuid
+
+from event_recurrence import RRULE_FIELD, RecurrenceRule
+from event_store import InvalidEventError, ValidationReport, deserialize_event
+
+# --- 定数定義 ---
+IMPORT_BATCH_SIZE = 1000 # 一覧に反映する単位 (索引の更新と保存は取り込みの最後に1回だけ)
+
+# CSV の見出し -> イベントの項目 (英語・日本語のどちらの見出しでも読める)
+CSV_COLUMNS = {
+    'id': 'id',
+    'title': 'title', 'イベント名': 'title',
+    'date': 'date', 'イベント日': 'date',
+    'end_date': 'end_date', '終了日': 'end_date',
+    'deadline': 'deadline', '申込締切日': 'deadline',
+    'description': 'description', '説明': 'description',
+}
+
+# iCalendar の独自プロパティ (エクスポートと共通)
+ICS_DEADLINE_PROP = "X-ENTRY-DEADLINE" # イベントの申込締切日
+ICS_KIND_PROP = "X-ENTRY-KIND"         # 'deadline' は締切日を表す VEVENT (取り込み時は読み飛ばす)
+
+_ERROR_LABELS = {
+    'title': "イベント名がありません",
+    'date': "イベント日の形式が無効です",
+    'deadline': "申込締切日の形式が無効です",
+    'end_date': "終了日の形式が無効です",
+    'period': "終了日がイベント日より前です",
+    'rrule': "繰り返しの指定 (RRULE) が無効です",
+}
+# 文字列で指定する項目 -> 文字列でなかったときのメッセージ (日付は形式が無効なときと同じ)
+_TYPE_LABELS = {
+    'id': "id が文字列ではありません",
+    'title': "イベント名が文字列ではありません",
+    'description': "説明が文字列ではありません",
+    RRULE_FIELD: _ERROR_LABELS['rrule'],
+    'date': _ERROR_LABELS['date'],
+    'deadline': _ERROR_LABELS['deadline'],
+    'end_date': _ERROR_LABELS['end_date'],
+}
+
+
+# --- CSV ---
+def iter_csv_records(text_stream):
+    """CSV を1行ずつ読み、(行番号, レコード) を返すジェネレータ"""
+    reader = csv.DictReader(text_stream)
+    for row in reader:
+        record = {}
+        for column, value in row.items():
+            field = CSV_COLUMNS.get((column or '').strip())
+            if field and value is not None:
+                record[field] = value.strip()
+        yield reader.line_num, record
+
+
+# --- iCalendar ---
+def _unfold_ics_lines(text_stream):
+    """折り返された行 (先頭が空白の継続行) をつなげながら (ファイルでの行番号, 行) を1行ずつ返す"""
+    pending = None
+    start = 0
+    for line_no, raw_line in enumerate(text_stream, start=1):
+        line = raw_line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        pending, start = line, line_no
+    if pending is not None:
+        yield start, pending
+
+
+def _ics_unescape(value):
+    return (value.replace("\\n", "\n").replace("\\N", "\n")
+            .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\"))
+
+
+def _ics_date(value):
+    """DTSTART などの値 (YYYYMMDD または YYYYMMDDTHHMMSS[Z]) を ISO 形式の日付文字列にする"""
+    value = value.strip()
+    if len(value) >= 8 and value[:8].isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:8]}"
+    return value # 不正な値はそのまま渡し、検証でエラーにする
+
+
+def iter_ics_records(text_stream):
+    """iCalendar を1行ずつ読み、VEVENT ごとに (行番号, レコード) を返すジェネレータ
+
+    DTEND は翌日 (その日を含まない) なので、2日以上にまたがる場合だけ end_date にする。
+    申込締切日は X-ENTRY-DEADLINE があればそれを、なければイベント日を使う。
+    UID があれば UID から決まる uuid を id にするので、同じファイルを取り込み直しても重複しない。
+    """
+    current = None
+    start_line = 0
+    for line_no, line in _unfold_ics_lines(text_stream):
+        if line == "BEGIN:VEVENT":
+            current, start_line = {}, line_no
+            continue
+        if current is None:
+            continue
+        if line == "END:VEVENT":
+            if current.pop('kind', None) != 'deadline':
+                yield start_line, _ics_record(current)
+            current = None
+            continue
+        name_part, sep, value = line.partition(":")
+        if not sep:
+            continue
+        name = name_part.split(";", 1)[0].upper()
+        if name == "SUMMARY":
+            current['title'] = _ics_unescape(value)
+        elif name == "DESCRIPTION":
+            current['description'] = _ics_unescape(value)
+        elif name == "DTSTART":
+            current['date'] = _ics_date(value)
+        elif name == "DTEND":
+            current['dtend'] = _ics_date(value)
+        elif name == "UID":
+            current['uid'] = value.strip()
+        elif name == ICS_DEADLINE_PROP:
+            current['deadline'] = _ics_date(value)
+        elif name == ICS_KIND_PROP:
+            current['kind'] = value.strip().lower()
+        elif name == "RRULE":
+            current[RRULE_FIELD] = value.strip()
+
+
+def _ics_record(fields):
+    record = {k: v for k, v in fields.items() if k in ('title', 'description', 'date', 'deadline', RRULE_FIELD)}
+    uid = fields.get('uid')
+    if uid:
+        record['id'] = str(uuid.uuid5(uuid.NAMESPACE_URL, uid))
+    record.setdefault('deadline', record.get('date'))
+    dtend = fields.get('dtend')
+    if dtend and record.get('date'):
+        try:
+            last_day = datetime.date.fromisoformat(dtend) - datetime.timedelta(days=1)
+            if last_day.isoformat() > record['date']:
+                record['end_date'] = last_day.isoformat()
+        except ValueError:
+            record['end_date'] = dtend
+    return record
+
+
+# --- 検証と取り込み ---
+def validate_record(record):
+    """取り込むレコードを検証してイベント辞書にする。不正な場合は (エラーの種類, メッセージ) の ValueError
+
+    JSON から来たレコードでは文字列以外の値もありうるので、各項目が文字列かどうかを先に確かめる
+    (数値の日付は序数として読まれ、文字列でないタイトルは保存後の検索を壊す)。
+    """
+    for field, message in _TYPE_LABELS.items():
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(field, message)
+    if not record.get('title'):
+        raise ValueError('title', _ERROR_LABELS['title'])
+    for field in ('date', 'deadline'):
+        if not record.get(field):
+            raise ValueError(field, _ERROR_LABELS[field])
+    record = {k: v for k, v in record.items() if v not in (None, '')}
+    try:
+        event = deserialize_event(record) # 日付の変換は load_events_from_file と同じ
+    except InvalidEventError as e:
+        raise ValueError(e.field, _ERROR_LABELS.get(e.field, str(e))) from None
+    if event.get('end_date') is not None:
+        if event['end_date'] < event['date']:
+            raise ValueError('period', _ERROR_LABELS['period'])
+        if event['end_date'] == event['date']:
+            del event['end_date']
+    if event.get(RRULE_FIELD):
+        try:
+            event[RRULE_FIELD] = str(RecurrenceRule.parse(event[RRULE_FIELD]))
+        except ValueError:
+            raise ValueError('rrule', _ERROR_LABELS['rrule']) from None
+    event.setdefault('description', '')
+    if not event.get('id'):
+        event['id'] = str(uuid.uuid4())
+    return event
+
+
+def import_records(records, shared_store, batch_size=IMPORT_BATCH_SIZE, report=None):
+    """(行番号, レコード) の列を検証しながら共有ストアに取り込み、ValidationReport を返す
+
+    レコードは1件ずつ読み進め、batch_size 件ごとに一覧へ反映する。
+    索引の更新と保存は shared_store.batch() により最後に1回だけ行われる。
+    """
+    report = report or ValidationReport()
+    ops = []
+    with shared_store.batch():
+        for location, record in records:
+            try:
+                event = validate_record(record)
+            except ValueError as e:
+                kind, message = e.args if len(e.args) == 2 else ('other', str(e))
+                report.reject(location, record.get('title') or '(無題)', kind, message)
+                continue
+            report.accept()
+            ops.append(('add', event))
+            if len(ops) >= batch_size:
+                shared_store.apply(ops)
+                ops = []
+        if ops:
+            shared_store.apply(ops)
+    return report
+
+
+def detect_format(filename):
+    """拡張子から 'ics' か 'csv' を判定する"""
+    return 'ics' if os.path.splitext(filename)[1].lower() in ('.ics', '.ical', '.ifb') else 'csv'
+
+
+def import_stream(binary_stream, filename, shared_store, batch_size=IMPORT_BATCH_SIZE):
+    """アップロードされたファイルなどのバイナリストリームを形式を判定して取り込む"""
+    text_stream = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    try:
+        if detect_format(filename) == 'ics':
+            records = iter_ics_records(text_stream)
+        else:
+            records = iter_csv_records(text_stream)
+        return import_records(records, shared_store, batch_size=batch_size)
+    finally:
+        text_stream.detach() # 呼び出し元のストリームは閉じない
+
+
+if __name__ == "__main__":
+    from event_store import open_store
+    from shared_store import SharedEventStore
+
+    parser = argparse.ArgumentParser(description="CSV / iCalendar ファイルからイベントを一括登録する")
+    parser.add_argument("path", help="取り込むファイル (.csv / .ics)")
+    parser.add_argument("--backend", help="保存先のストレージ (journal / json / sqlite)")
+    args = parser.parse_args()
+    shared = SharedEventStore(open_store(args.backend))
+    with open(args.path, "rb") as f:
+        result = import_stream(f, args.path, shared)
+    print(f"{result.accepted} 件を登録しました (不正な行: {result.error_count} 件)")
+    for location, title, message in result.examples:
+        print(f"  {location}行目 「{title}」: {message}")
@@ -0,0 +1,360 @@
+import bisect
+import datetime
+import random
+
+from event_model import day_ordinal
+
+
+class EventIndex:
+    """SharedEventStore に登録して、イベントの変更に合わせて差分更新される索引の基底クラス"""
+
+    recurring = False # True なら繰り返しのイベント (event_recurrence) も渡される。False なら渡されない
+
+    def rebuild(self, events):
+        """全イベントから作り直す (読み込み直後に呼ばれる)"""
+        raise NotImplementedError
+
+    def on_add(self, event):
+        raise NotImplementedError
+
+    def on_delete(self, event):
+        raise NotImplementedError
+
+    def on_update(self, old, new):
+        self.on_delete(old)
+        self.on_add(new)
+
+
+class SortedDateIndex(EventIndex):
+    """日付項目 (date / deadline) の順に並べたイベント id の索引
+
+    (日付の序数, 登録順, id) のソート済みリストを bisect で保守するので、
+    追加・削除のたびに全件を並べ直す必要がない。同じ日付の中では登録順に並ぶ
+    (従来の sorted() と同じ安定な順序)。日付が無効なイベントは索引に入らない。
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self._keys = []
+        self._seq_of = {}
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _key(self, event):
+        ordinal = day_ordinal(event, self.field)
+        if ordinal is None:
+            return None
+        event_id = event['id']
+        if event_id not in self._seq_of:
+            self._seq_of[event_id] = self._next_seq
+            self._next_seq += 1
+        return (ordinal, self._seq_of[event_id], event_id)
+
+    def rebuild(self, events):
+        self._keys = []
+        self._seq_of = {}
+        self._next_seq = 0
+        for event in events:
+            key = self._key(event)
+            if key is not None:
+                self._keys.append(key)
+        self._keys.sort()
+
+    def on_add(self, event):
+        key = self._key(event)
+        if key is not None:
+            bisect.insort(self._keys, key)
+
+    def on_delete(self, event):
+        key = self._key(event)
+        if key is not None:
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+        self._seq_of.pop(event['id'], None)
+
+    def on_update(self, old, new):
+        # 更新では登録順 (同じ日付の中での並び) を保つ
+        old_key = self._key(old)
+        if old_key is not None:
+            i = bisect.bisect_left(self._keys, old_key)
+            if i < len(self._keys) and self._keys[i] == old_key:
+                del self._keys[i]
+        self.on_add(new)
+
+    # --- 問い合わせ ---
+    def count_before(self, day):
+        """日付が day より前のイベント数"""
+        return bisect.bisect_left(self._keys, (day.toordinal(),))
+
+    def ids_from(self, day, offset=0, limit=None):
+        """日付が day 以降のイベント id を日付順に offset 件飛ばして最大 limit 件返す"""
+        start = self.count_before(day) + offset
+        stop = len(self._keys) if limit is None else min(len(self._keys), start + limit)
+        return [key[2] for key in self._keys[start:stop]]
+
+    def ids_between(self, start, end):
+        """日付が start 以上 end 以下のイベント id を日付順に返す"""
+        lo = bisect.bisect_left(self._keys, (start.toordinal(),))
+        hi = bisect.bisect_left(self._keys, (end.toordinal() + 1,))
+        return [key[2] for key in self._keys[lo:hi]]
+
+    def ids_before(self, day, limit=None):
+        """日付が day より前のイベント id を新しい順に最大 limit 件返す"""
+        stop = self.count_before(day)
+        start = 0 if limit is None else max(0, stop - limit)
+        return [key[2] for key in reversed(self._keys[start:stop])]
+
+
+class DateOccupancyIndex(EventIndex):
+    """イベント日ごとの件数を持ち、定員 (capacity) を超えた日付を差分更新で保守する索引
+
+    追加・削除は O(1)。イベントの id は使わないので、id を持たないイベント一覧にも使える。
+    """
+
+    def __init__(self, capacity=1, field='date'):
+        self.capacity = capacity
+        self.field = field
+        self._counts = {}
+        self._over = {}
+
+    def _adjust(self, event, delta):
+        ordinal = day_ordinal(event, self.field)
+        if ordinal is None:
+            return
+        count = self._counts.get(ordinal, 0) + delta
+        if count > 0:
+            self._counts[ordinal] = count
+        else:
+            self._counts.pop(ordinal, None)
+        if count > self.capacity:
+            self._over[ordinal] = count
+        else:
+            self._over.pop(ordinal, None)
+
+    def rebuild(self, events):
+        self._counts = {}
+        self._over = {}
+        for event in events:
+            self._adjust(event, 1)
+
+    def on_add(self, event):
+        self._adjust(event, 1)
+
+    def on_delete(self, event):
+        self._adjust(event, -1)
+
+    # --- 問い合わせ ---
+    def count_on(self, day):
+        return self._counts.get(day.toordinal(), 0)
+
+    def over_capacity(self):
+        """定員を超えている (日付, 件数) を日付順に返す"""
+        return [(datetime.date.fromordinal(ordinal), count) for ordinal, count in sorted(self._over.items())]
+
+
+class _IntervalNode:
+    __slots__ = ('key', 'start', 'end', 'max_end', 'priority', 'left', 'right')
+
+    def __init__(self, key, start, end, priority):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.max_end = end
+        self.priority = priority
+        self.left = None
+        self.right = None
+
+
+def _refresh(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _split(node, key):
+    """key 未満の木と key 以上の木に分ける"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        _refresh(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _refresh(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _refresh(left)
+        return left
+    right.left = _merge(left, right.left)
+    _refresh(right)
+    return right
+
+
+def _insert(node, new):
+    """優先度がヒープ順になる位置まで降りて new を差し込む"""
+    if node is None:
+        return new
+    if new.priority > node.priority:
+        new.left, new.right = _split(node, new.key)
+        _refresh(new)
+        return new
+    if new.key < node.key:
+        node.left = _insert(node.left, new)
+    else:
+        node.right = _insert(node.right, new)
+    if new.end > node.max_end:
+        node.max_end = new.end
+    return node
+
+
+def _delete(node, key):
+    if node is None:
+        return None
+    if node.key == key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _delete(node.left, key)
+    else:
+        node.right = _delete(node.right, key)
+    _refresh(node)
+    return node
+
+
+class IntervalIndex(EventIndex):
+    """イベント期間 (date 〜 end_date) の区間木
+
+    開始日をキーにしたトリープの各ノードに部分木の最大終了日を持たせた区間木で、
+    追加・削除は O(log n)、期間が重なるイベントの検索は O(log n + 件数)。
+    end_date の無いイベントは date 1日だけの期間として扱う。
+    """
+
+    def __init__(self, seed=0):
+        self._rng = random.Random(seed)
+        self._root = None
+        self._key_of = {}
+        self._next_seq = 0
+        self.multi_day_ids = set() # 複数日にまたがるイベントの id
+
+    def __len__(self):
+        return len(self._key_of)
+
+    @staticmethod
+    def _span(event):
+        start = day_ordinal(event, 'date')
+        if start is None:
+            return None
+        end = day_ordinal(event, 'end_date')
+        if end is None or end < start:
+            end = start
+        return start, end
+
+    def rebuild(self, events):
+        self._key_of = {}
+        self._next_seq = 0
+        self.multi_day_ids = set()
+        nodes = []
+        for event in events:
+            node = self._new_node(event)
+            if node is not None:
+                nodes.append(node)
+        nodes.sort(key=lambda n: n.key)
+        # 開始日順に並べたノードからスタックで一括構築する (O(n))
+        stack = []
+        for node in nodes:
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        self._root = stack[0] if stack else None
+        self._refresh_all(self._root)
+
+    @staticmethod
+    def _refresh_all(root):
+        # 帰りがけ順に最大終了日を計算する (再帰を使わない)
+        order = []
+        stack = [root] if root is not None else []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            if node.left is not None:
+                stack.append(node.left)
+            if node.right is not None:
+                stack.append(node.right)
+        for node in reversed(order):
+            _refresh(node)
+
+    def _new_node(self, event):
+        span = self._span(event)
+        if span is None:
+            return None
+        event_id = event['id']
+        key = (span[0], self._next_seq, event_id)
+        self._next_seq += 1
+        self._key_of[event_id] = key
+        if span[1] > span[0]:
+            self.multi_day_ids.add(event_id)
+        return _IntervalNode(key, span[0], span[1], self._rng.random())
+
+    def on_add(self, event):
+        node = self._new_node(event)
+        if node is None:
+            return
+        self._root = _insert(self._root, node)
+
+    def on_delete(self, event):
+        event_id = event['id']
+        key = self._key_of.pop(event_id, None)
+        if key is None:
+            return
+        self.multi_day_ids.discard(event_id)
+        self._root = _delete(self._root, key)
+
+    # --- 問い合わせ ---
+    def spans(self):
+        """全イベントの (開始日の序数, 終了日の序数, id) を開始日順に返す (中間順に辿るだけなので O(n))"""
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.start, node.end, node.key[2]
+            node = node.right
+
+    def overlapping(self, start, end):
+        """期間 start 〜 end (両端を含む) と重なるイベントの id を開始日順に返す"""
+        found = []
+        lo, hi = start.toordinal(), end.toordinal()
+        stack = []
+        node = self._root
+        # 中間順に辿りながら、最大終了日が lo より前の部分木と開始日が hi より後の部分は枝刈りする
+        while stack or node is not None:
+            while node is not None and node.max_end >= lo:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                break
+            node = stack.pop()
+            if node.start > hi:
+                break
+            if node.end >= lo:
+                found.append(node.key[2])
+            node = node.right
+        return found
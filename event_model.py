@@ -0,0 +1,202 @@
+import collections.abc
+import datetime
+import uuid
+
+DATE_FIELDS = ('date', 'deadline', 'end_date') # 日付として扱う項目 (end_date は複数日イベントの終了日)
+_BASE_FIELDS = ('id', 'title', 'date', 'deadline', 'description')
+_KNOWN_FIELDS = frozenset(_BASE_FIELDS + ('end_date',))
+_ORDINAL_SLOTS = {'date': '_date', 'deadline': '_deadline', 'end_date': '_end_date'}
+
+_days = {} # 序数 -> datetime.date (同じ日付のイベントで同じオブジェクトを使い回す)
+_new_object = object.__new__ # Event.__new__ を MRO (Mapping の ABC) から探さずに呼ぶ
+
+
+class InvalidEventError(ValueError):
+    """日付項目の形式が不正なイベントレコード"""
+
+    def __init__(self, field, record):
+        super().__init__(f"{field}: {record.get(field)!r}")
+        self.field = field
+        self.record = record
+
+
+def day(ordinal):
+    """序数を datetime.date にする (変換結果は使い回す)"""
+    value = _days.get(ordinal)
+    if value is None:
+        value = _days[ordinal] = datetime.date.fromordinal(ordinal)
+    return value
+
+
+def _to_ordinal(value, field, record):
+    if value.__class__ is int:
+        return value
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value).toordinal()
+        except ValueError:
+            pass
+    raise InvalidEventError(field, record)
+
+
+class Event(collections.abc.Mapping):
+    """1件のイベント
+
+    日付は序数 (int) で持ち、date / deadline / end_date を読んだときに datetime.date にする。
+    値の検証は作成時の1回だけなので、作成済みのイベントの日付は必ず有効で、使う側で
+    isinstance を確かめる必要はない。従来のイベント辞書と同じく ev['title'] や ev.get('end_date')
+    で読める読み取り専用のマッピングで、変更するときは replace() で新しいイベントを作る。
+    end_date はイベント日より後の場合だけ持ち、無いときは辞書と同じくキーが存在しない。
+    """
+
+    __slots__ = ('id', 'title', 'description', '_date', '_deadline', '_end_date', 'extra')
+
+    def __init__(self, id, title, date, deadline, description='', end_date=None, extra=None):
+        fields = {'id': id, 'title': title, 'date': date, 'deadline': deadline, 'end_date': end_date}
+        self.id = str(uuid.uuid4()) if id is None else id
+        self.title = title
+        self.description = description
+        self._date = _to_ordinal(date, 'date', fields)
+        self._deadline = _to_ordinal(deadline, 'deadline', fields)
+        self._end_date = None
+        if end_date is not None:
+            end = _to_ordinal(end_date, 'end_date', fields)
+            if end < self._date:
+                raise InvalidEventError('end_date', fields)
+            if end > self._date:
+                self._end_date = end
+        self.extra = extra or None # 基本項目以外の項目 (無ければ None)
+
+    @classmethod
+    def from_record(cls, record):
+        """イベント辞書 (日付は datetime.date でも ISO 文字列でもよい) から作る。不正な日付は InvalidEventError"""
+        if record.__class__ is cls:
+            return record
+        for field in ('date', 'deadline'):
+            if record.get(field) is None:
+                raise InvalidEventError(field, record)
+        extra = None
+        if not record.keys() <= _KNOWN_FIELDS:
+            extra = {key: value for key, value in record.items() if key not in _KNOWN_FIELDS}
+        try:
+            return cls(record.get('id'), record.get('title', ''), record['date'], record['deadline'],
+                       record.get('description', ''), record.get('end_date'), extra)
+        except InvalidEventError as e:
+            raise InvalidEventError(e.field, record) from None
+
+    @classmethod
+    def from_ordinals(cls, id, title, date, deadline, description, end_date=None, extra=None):
+        """検証済みの値 (日付は序数) から作る (コーデックなどの読み込み用)"""
+        event = _new_object(cls)
+        event.id = id
+        event.title = title
+        event.description = description
+        event._date = date
+        event._deadline = deadline
+        event._end_date = end_date
+        event.extra = extra
+        return event
+
+    def replace(self, **changes):
+        """一部の項目を変えた新しいイベントを返す"""
+        record = dict(self)
+        record.update(changes)
+        return Event.from_record({key: value for key, value in record.items() if value is not None or key == 'id'})
+
+    def to_record(self):
+        """JSON に書き出せる辞書 (日付は ISO 文字列) にする"""
+        record = {'id': self.id, 'title': self.title, 'date': day(self._date).isoformat(),
+                  'deadline': day(self._deadline).isoformat(), 'description': self.description}
+        if self._end_date is not None:
+            record['end_date'] = day(self._end_date).isoformat()
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+    # --- 日付 ---
+    @property
+    def date(self):
+        return day(self._date)
+
+    @property
+    def deadline(self):
+        return day(self._deadline)
+
+    @property
+    def end_date(self):
+        return None if self._end_date is None else day(self._end_date)
+
+    @property
+    def date_ordinal(self):
+        return self._date
+
+    @property
+    def deadline_ordinal(self):
+        return self._deadline
+
+    @property
+    def end_date_ordinal(self):
+        return self._end_date
+
+    # --- マッピングとしての読み取り ---
+    def __getitem__(self, key):
+        if key == 'title':
+            return self.title
+        if key == 'id':
+            return self.id
+        if key == 'date':
+            return day(self._date)
+        if key == 'deadline':
+            return day(self._deadline)
+        if key == 'description':
+            return self.description
+        if key == 'end_date' and self._end_date is not None:
+            return day(self._end_date)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == 'title': # 一覧の表示でよく読む項目は __getitem__ を経由せずに返す
+            return self.title
+        if key == 'id':
+            return self.id
+        if key == 'end_date': # 単日のイベントでは無いのが普通なので、例外を使わずに返す
+            return default if self._end_date is None else day(self._end_date)
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key in _KNOWN_FIELDS:
+            return key != 'end_date' or self._end_date is not None
+        return bool(self.extra) and key in self.extra
+
+    def __iter__(self):
+        yield from _BASE_FIELDS
+        if self._end_date is not None:
+            yield 'end_date'
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(_BASE_FIELDS) + (self._end_date is not None) + (len(self.extra) if self.extra else 0)
+
+    def __repr__(self):
+        return f"Event({dict(self)!r})"
+
+
+def as_event(value):
+    """イベント辞書または Event を Event にする"""
+    return value if value.__class__ is Event else Event.from_record(value)
+
+
+def day_ordinal(event, field):
+    """イベント (Event またはイベント辞書) の日付項目の序数を返す。無いか日付でなければ None"""
+    if event.__class__ is Event:
+        return getattr(event, _ORDINAL_SLOTS[field])
+    value = event.get(field)
+    return value.toordinal() if isinstance(value, datetime.date) else None
@@ -0,0 +1,207 @@
+import calendar
+import datetime
+import functools
+
+from event_index import EventIndex
+from event_model import Event, day
+
+# --- 定数定義 ---
+RRULE_FIELD = 'rrule'          # 繰り返しの規則を持つ項目 (例: "FREQ=MONTHLY;COUNT=12")
+SERIES_FIELD = 'series_id'     # 展開した各回が持つ、元のイベントの id
+OCCURRENCE_SEPARATOR = "@"     # 各回の id は「元の id @ その回の日付」
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+EXPANSION_CACHE_SIZE = 4096    # (規則, 開始日, 期間) ごとに覚えておく展開結果の数
+MAX_SKIPPED = 1000             # 存在しない日付 (31日の無い月など) を続けて読み飛ばす上限
+
+
+class RecurrenceRule:
+    """RRULE の FREQ / INTERVAL / COUNT / UNTIL に対応した繰り返しの規則
+
+    MONTHLY / YEARLY で開始日と同じ日付が無い回 (31日の無い月、平年の2月29日) は RFC 5545 と同じく飛ばす。
+    """
+
+    def __init__(self, freq, interval=1, count=None, until=None):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"FREQ は {', '.join(FREQUENCIES)} のいずれかです: {freq}")
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError("INTERVAL と COUNT は1以上です")
+        if count is not None and until is not None:
+            raise ValueError("COUNT と UNTIL は同時に指定できません")
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        """"FREQ=MONTHLY;INTERVAL=2;COUNT=10" の形式 (先頭の "RRULE:" は省略可) を読む。不正なら ValueError"""
+        text = text.strip()
+        if text.upper().startswith("RRULE:"):
+            text = text[len("RRULE:"):]
+        parts = {}
+        for part in filter(None, text.split(";")):
+            name, sep, value = part.partition("=")
+            if not sep:
+                raise ValueError(f"RRULE の形式が不正です: {part}")
+            parts[name.strip().upper()] = value.strip()
+        unknown = parts.keys() - {'FREQ', 'INTERVAL', 'COUNT', 'UNTIL'}
+        if unknown:
+            raise ValueError(f"未対応の RRULE の項目です: {', '.join(sorted(unknown))}")
+        if 'FREQ' not in parts:
+            raise ValueError("RRULE には FREQ が必要です")
+        until = parts.get('UNTIL')
+        if until is not None: # 20261231 / 20261231T000000Z / 2026-12-31
+            until = until.replace("-", "")[:8]
+            until = datetime.date(int(until[:4]), int(until[4:6]), int(until[6:8])) if len(until) == 8 and until.isdigit() else None
+            if until is None:
+                raise ValueError(f"UNTIL の日付が不正です: {parts['UNTIL']}")
+        try:
+            interval = int(parts.get('INTERVAL', 1))
+            count = int(parts['COUNT']) if 'COUNT' in parts else None
+        except ValueError:
+            raise ValueError("INTERVAL と COUNT は整数です") from None
+        return cls(parts['FREQ'].upper(), interval, count, until)
+
+    def __str__(self):
+        text = f"FREQ={self.freq}"
+        if self.interval != 1:
+            text += f";INTERVAL={self.interval}"
+        if self.count is not None:
+            text += f";COUNT={self.count}"
+        if self.until is not None:
+            text += f";UNTIL={self.until.strftime('%Y%m%d')}"
+        return text
+
+    def _nth(self, start, n):
+        """n 回目 (0 始まり、飛ばした回も数える) の (その回の月初または日付の序数, 日付の序数。存在しなければ None)"""
+        if self.freq in ('DAILY', 'WEEKLY'):
+            ordinal = start.toordinal() + n * self.interval * (7 if self.freq == 'WEEKLY' else 1)
+            return ordinal, ordinal
+        months = n * self.interval * (12 if self.freq == 'YEARLY' else 1)
+        year, month = divmod(start.month - 1 + months, 12)
+        year += start.year
+        month += 1
+        first = datetime.date(year, month, 1).toordinal()
+        if start.day > calendar.monthrange(year, month)[1]:
+            return first, None
+        return first, first + start.day - 1
+
+    def _first_index(self, start, first):
+        """first 以降の最初の回より前にならない n (COUNT が無いときだけ途中から数え始められる)"""
+        if self.count is not None or first <= start.toordinal():
+            return 0
+        if self.freq in ('DAILY', 'WEEKLY'):
+            step = self.interval * (7 if self.freq == 'WEEKLY' else 1)
+            return (first - start.toordinal()) // step
+        target = day(first)
+        months = (target.year - start.year) * 12 + target.month - start.month
+        return max(0, months // (self.interval * (12 if self.freq == 'YEARLY' else 1)) - 1)
+
+    def ordinals_between(self, start, first, last):
+        """開始日 start の繰り返しのうち、日付の序数が first 〜 last (両端を含む) の回を返す"""
+        if self.until is not None:
+            last = min(last, self.until.toordinal())
+        found = []
+        n = self._first_index(start, first)
+        produced = skipped = 0
+        while True:
+            nominal, ordinal = self._nth(start, n)
+            n += 1
+            if nominal > last:
+                break
+            if ordinal is None:
+                skipped += 1
+                if skipped > MAX_SKIPPED:
+                    break
+                continue
+            skipped = 0
+            if ordinal > last:
+                break
+            produced += 1
+            if self.count is not None and produced > self.count:
+                break
+            if ordinal >= first:
+                found.append(ordinal)
+        return found
+
+
+@functools.lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def occurrence_ordinals(rule_text, start_ordinal, first, last):
+    """(規則, 開始日, 期間) ごとに展開結果を覚えておく。規則が不正なら空"""
+    try:
+        rule = RecurrenceRule.parse(rule_text)
+    except ValueError:
+        return ()
+    return tuple(rule.ordinals_between(day(start_ordinal), first, last))
+
+
+def is_recurring(event):
+    if event.__class__ is Event:
+        return event.extra is not None and bool(event.extra.get(RRULE_FIELD))
+    return bool(event.get(RRULE_FIELD))
+
+
+def occurrence_id(series_id, ordinal):
+    return f"{series_id}{OCCURRENCE_SEPARATOR}{day(ordinal).isoformat()}"
+
+
+def series_id_of(event_id):
+    """各回の id から元のイベントの id を返す (各回の id でなければそのまま)"""
+    return event_id.rsplit(OCCURRENCE_SEPARATOR, 1)[0] if OCCURRENCE_SEPARATOR in event_id else event_id
+
+
+def expand(event, start, end, field='date'):
+    """繰り返しのイベントのうち、field の日付が start 〜 end (両端を含む) に入る回を Event で返す
+
+    field='date' のときは複数日イベントの期間が重なる回も含める。各回の申込締切日・終了日は、
+    元のイベントの日付との差を保ってずらす。
+    """
+    date = event.date_ordinal
+    lead = date - event.deadline_ordinal # 締切日からイベント日までの日数
+    length = 0 if event.end_date_ordinal is None else event.end_date_ordinal - date
+    first, last = start.toordinal(), end.toordinal()
+    if field == 'date':
+        first -= length
+    elif field == 'deadline':
+        first += lead
+        last += lead
+    else:
+        raise ValueError(f"unknown date field: {field}")
+    return [
+        Event.from_ordinals(occurrence_id(event.id, ordinal), event.title, ordinal, ordinal - lead,
+                            event.description, ordinal + length if length else None, {SERIES_FIELD: event.id})
+        for ordinal in occurrence_ordinals(event.extra[RRULE_FIELD], date, first, last)
+    ]
+
+
+class RecurrenceIndex(EventIndex):
+    """繰り返しのイベント (rrule を持つもの) の一覧
+
+    繰り返しのイベントは日付の索引には入れず、ここから表示や確認をする期間の分だけ展開する。
+    """
+
+    recurring = True
+
+    def __init__(self):
+        self.series = {} # id -> 繰り返しのイベント
+
+    def __len__(self):
+        return len(self.series)
+
+    def rebuild(self, events):
+        self.series = {event['id']: event for event in events if is_recurring(event)}
+
+    def on_add(self, event):
+        if is_recurring(event):
+            self.series[event['id']] = event
+
+    def on_delete(self, event):
+        self.series.pop(event['id'], None)
+
+    def occurrences(self, field, start, end):
+        """全ての繰り返しのイベントについて、field の日付が start 〜 end に入る回を日付順に返す"""
+        found = []
+        for event in self.series.values():
+            found.extend(expand(event, start, end, field))
+        found.sort(key=lambda occurrence: occurrence[field])
+        return found
@@ -0,0 +1,188 @@
+import array
+import collections
+import heapq
+import unicodedata
+
+from event_index import EventIndex
+
+# --- 定数定義 ---
+SEARCH_PAGE_SIZE = 20 # 検索結果を一度に返す件数
+GRAM_SIZE = 2         # 日本語は単語の区切りが無いので、2文字ずつの n-gram で索引する
+TITLE_WEIGHT = 3      # タイトルでの一致は説明での一致より重く数える
+SUBSTRING_BONUS = 10  # タイトルに検索語がそのまま含まれる (n-gram が離れた位置で一致しただけではない) ときの加点
+WORD_CACHE_SIZE = 100_000 # n-gram を覚えておく語の数
+COMPACT_MIN_DEAD = 1000 # 死んだスロットがこれと生きているイベント数の両方より多くなったら索引を作り直す
+
+
+def normalize(text):
+    """検索用に正規化する (全角英数字・半角カナを揃え、大文字小文字を区別しない)"""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+
+_word_grams = {} # 語 -> 索引する n-gram の tuple (説明文などでは同じ語が何度も出てくる)
+
+
+def _query_grams_of(word):
+    if len(word) <= GRAM_SIZE:
+        return {word}
+    return {word[i:i + GRAM_SIZE] for i in range(len(word) - GRAM_SIZE + 1)}
+
+
+def _grams_of(word):
+    grams = _word_grams.get(word)
+    if grams is None:
+        if len(_word_grams) >= WORD_CACHE_SIZE:
+            _word_grams.clear()
+        # n 文字より短い検索語 (「検」など) が長い語の一部にも一致するように、1文字ずつも索引する
+        grams = tuple(_query_grams_of(word).union(word))
+        _word_grams[word] = grams
+    return grams
+
+
+def ngrams(text):
+    """正規化済みの文字列の索引する n-gram の集合 (空白で区切った語ごとの n-gram と各文字。n 文字未満の語はそのまま)"""
+    grams = set()
+    for word in text.split():
+        grams.update(_grams_of(word))
+    return grams
+
+
+def query_ngrams(text):
+    """正規化済みの検索語の n-gram の集合 (語ごとに作る。n 文字以下の語はそのまま)"""
+    grams = set()
+    for word in text.split():
+        grams.update(_query_grams_of(word))
+    return grams
+
+
+class SearchIndex(EventIndex):
+    """タイトルと説明の n-gram (と1文字) の転置索引
+
+    イベントごとに通し番号 (スロット) を割り当て、n-gram -> スロットの int 配列をタイトルと説明で
+    別に持つ。追加は配列の末尾に足すだけで、削除・更新前のスロットは死んだスロットとして
+    検索結果から除き、死んだスロットが増えたら次の検索のときに作り直す。
+    検索語の全ての n-gram を含むイベントを候補にし、タイトルでの一致の多さと、タイトルに
+    検索語がそのまま含まれるかで点数を付けて上位を返す。索引は最初の検索のときに作るので、
+    検索しないうちは読み込みの時間もメモリも増えない。
+    """
+
+    recurring = True # 繰り返しのイベントも1件として検索できるようにする
+
+    def __init__(self):
+        self._source = () # 共有ストアのイベント一覧 (作り直すときに使う)
+        self._built = False
+        self._title_postings = {}
+        self._description_postings = {}
+        self._ids = []       # スロット -> id
+        self._titles = []    # スロット -> 正規化したタイトル
+        self._slot_of = {}   # id -> 今のスロット
+        self._dead_slots = set()
+        self._order_of = {}  # id -> 登録順 (同点のときの並び。更新しても変わらない)
+        self._next_order = 0
+
+    def __len__(self):
+        self._ensure_built()
+        return len(self._slot_of)
+
+    def rebuild(self, events):
+        # events は共有ストアが持つ一覧そのものなので、作るまでの変更はそこに反映される
+        self._source = events
+        self._built = False
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        self._title_postings = {}
+        self._description_postings = {}
+        self._ids = []
+        self._titles = []
+        self._slot_of = {}
+        self._dead_slots = set()
+        self._order_of = {}
+        self._next_order = 0
+        for event in self._source:
+            self._add(event)
+        self._built = True
+
+    def _add(self, event):
+        event_id = event['id']
+        slot = len(self._ids)
+        title = normalize(event.get('title'))
+        self._ids.append(event_id)
+        self._titles.append(title)
+        self._slot_of[event_id] = slot
+        if event_id not in self._order_of:
+            self._order_of[event_id] = self._next_order
+            self._next_order += 1
+        for postings, text in ((self._title_postings, title),
+                               (self._description_postings, normalize(event.get('description')))):
+            for gram in ngrams(text):
+                slots = postings.get(gram)
+                if slots is None:
+                    slots = postings[gram] = array.array('i')
+                slots.append(slot)
+
+    def _remove(self, event_id):
+        slot = self._slot_of.pop(event_id, None)
+        if slot is None:
+            return
+        self._dead_slots.add(slot)
+        self._titles[slot] = ''
+        if len(self._dead_slots) > max(COMPACT_MIN_DEAD, len(self._slot_of)):
+            self._built = False # 次の検索のときに作り直す
+
+    def on_add(self, event):
+        if self._built:
+            self._add(event)
+
+    def on_delete(self, event):
+        if self._built:
+            self._remove(event['id'])
+            self._order_of.pop(event['id'], None)
+
+    def on_update(self, old, new):
+        if self._built:
+            self._remove(old['id'])
+            if self._built:
+                self._add(new)
+
+    # --- 問い合わせ ---
+    def search(self, query, limit=SEARCH_PAGE_SIZE, offset=0):
+        """query に一致するイベントの (一致した件数, 点数の高い順に offset から limit 件の id) を返す"""
+        self._ensure_built()
+        query = normalize(query)
+        grams = query_ngrams(query)
+        if not grams:
+            return 0, []
+        # 含むイベントの少ない n-gram から候補を作り、残りの n-gram で絞り込む
+        grams = sorted(grams, key=self._posting_size)
+        candidates = set(self._title_postings.get(grams[0], ()))
+        candidates.update(self._description_postings.get(grams[0], ()))
+        candidates -= self._dead_slots
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            matched = candidates.intersection(self._title_postings.get(gram, ()))
+            matched.update(candidates.intersection(self._description_postings.get(gram, ())))
+            candidates = matched
+        if not candidates:
+            return 0, []
+
+        title_hits = collections.Counter()
+        for gram in grams:
+            title_hits.update(candidates.intersection(self._title_postings.get(gram, ())))
+        phrase = " ".join(query.split())
+        ids, titles, order_of = self._ids, self._titles, self._order_of
+
+        def score(slot):
+            hits = title_hits[slot]
+            points = hits * TITLE_WEIGHT + (len(grams) - hits)
+            if hits == len(grams) and phrase in titles[slot]:
+                points += SUBSTRING_BONUS
+            return points, -order_of[ids[slot]]
+
+        top = heapq.nlargest(offset + limit, candidates, key=score)
+        return len(candidates), [ids[slot] for slot in top[offset:]]
+
+    def _posting_size(self, gram):
+        return len(self._title_postings.get(gram, ())) + len(self._description_postings.get(gram, ()))
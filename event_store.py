@@ -0,0 +1,629 @@
+import datetime
+import json
+import os
+import tempfile
+import threading
+import uuid
+
+from event_codec import (BINARY_MAGIC, SNAPSHOT_CODEC_ENV, SnapshotDecodeError, decode_snapshot, detect_codec,
+                         gc_paused, get_codec, iter_json_batches, record_converter)
+from event_model import DATE_FIELDS, Event, InvalidEventError
+from event_recurrence import RRULE_FIELD
+
+# --- 定数定義 ---
+DATA_FILE = "events_data.json" # イベントデータ(スナップショット)を保存するファイル名
+JOURNAL_SUFFIX = ".journal"          # 追記ジャーナルのファイル名サフィックス
+COMPACTING_SUFFIX = ".compacting"    # コンパクション中のジャーナルのサフィックス
+COMPACT_THRESHOLD_BYTES = 256 * 1024 # ジャーナルがこのサイズを超えたらコンパクションする
+STORE_BACKEND_ENV = "EVENT_STORE_BACKEND" # 使用するストレージを選ぶ環境変数
+
+
+class ValidationReport:
+    """不正なレコードの集計 (件数と先頭 max_examples 件の例) を持つレポート
+
+    1件ごとに警告を出す代わりに、読み込みや取り込みの最後にまとめて表示する。
+    """
+
+    def __init__(self, max_examples=20):
+        self.max_examples = max_examples
+        self.total = 0        # 処理したレコード数
+        self.accepted = 0     # 取り込めたレコード数
+        self.error_count = 0  # 不正だったレコード数
+        self.error_counts = {}  # エラーの種類 -> 件数
+        self.examples = []    # (行番号など, タイトル, メッセージ)
+
+    def accept(self, count=1):
+        self.total += count
+        self.accepted += count
+
+    def reject(self, location, title, kind, message):
+        self.total += 1
+        self.error_count += 1
+        self.error_counts[kind] = self.error_counts.get(kind, 0) + 1
+        if len(self.examples) < self.max_examples:
+            self.examples.append((location, title, message))
+
+    def reject_invalid(self, location, record, error):
+        """日付が不正なレコード (InvalidEventError) を集計する"""
+        self.reject(location, record.get('title') or '(無題)', error.field, str(error))
+
+    def __bool__(self):
+        return self.error_count > 0
+
+
+# --- シリアライズ ---
+def serialize_event(event):
+    """イベント辞書をJSONに書き出せる形式 (日付はISO文字列) に変換する"""
+    if event.__class__ is Event:
+        return event.to_record()
+    record = dict(event)
+    if record.get('id') is None:
+        record['id'] = str(uuid.uuid4())
+    for field in DATE_FIELDS:
+        if isinstance(record.get(field), datetime.date):
+            record[field] = record[field].isoformat()
+    return record
+
+
+def deserialize_event(record):
+    """JSONレコードをイベント辞書 (日付は datetime.date) に変換する。不正な日付は InvalidEventError"""
+    event = dict(record)
+    for field in DATE_FIELDS:
+        if isinstance(event.get(field), str):
+            try:
+                event[field] = datetime.date.fromisoformat(event[field])
+            except ValueError:
+                raise InvalidEventError(field, record) from None
+    return event
+
+
+def atomic_write_json(path, data):
+    """一時ファイルに書き出してから rename することで、途中でクラッシュしても元ファイルを壊さない"""
+    atomic_write_bytes(path, json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8"))
+
+
+def atomic_write_bytes(path, data):
+    """atomic_write_json と同じ手順で bytes を書き出す"""
+    tmp_path = write_temp_bytes(path, data)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_temp_bytes(path, data):
+    """path と同じディレクトリの一時ファイルに bytes を書き出して fsync し、一時ファイルのパスを返す"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+# --- スナップショットの読み書き ---
+def snapshot_codec(name=None):
+    """スナップショットを書き出すコーデック (省略時は環境変数 EVENT_SNAPSHOT_CODEC、既定は compact)"""
+    return get_codec(name or os.environ.get(SNAPSHOT_CODEC_ENV))
+
+
+def read_snapshot(path, report=None):
+    """スナップショットを形式を判定して読み、(レコードのリスト, 変換が必要なレコードの位置のリスト) を返す
+
+    レコードの日付はコーデックが datetime.date に変換済み。日付が変換できなかったレコードと
+    id の無い (旧形式の) レコードだけが、2つめのリストに入る。途中で切れたり壊れたりしたファイルは
+    読める分だけを返し、読めなかった部分を report (ValidationReport) に集計する。
+    """
+    if not os.path.exists(path):
+        return [], []
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return decode_snapshot(data)
+    except (json.JSONDecodeError, UnicodeDecodeError, SnapshotDecodeError):
+        # 読める分だけを使う (形式が違うなど読めない理由が途中で切れたことでなければ、ここで改めて送出される)
+        return stream_snapshot(path, report)[0], []
+
+
+def index_records(records, raw_positions):
+    """(id -> レコード, 変換が必要なレコードの id の集合, id を付与したか) を返す"""
+    raw_ids = set()
+    missing_id = False
+    for position in raw_positions:
+        record = records[position]
+        if record.get('id') is None:
+            # 旧形式のデータには id が無いことがあるので、ここで付与する
+            records[position] = record = serialize_event(record)
+            missing_id = True
+        raw_ids.add(record['id'])
+    return {record['id']: record for record in records}, raw_ids, missing_id
+
+
+def write_snapshot(path, records, codec=None):
+    """レコード (日付は datetime.date でも ISO 文字列でもよい) を codec の形式でアトミックに書き出す"""
+    atomic_write_bytes(path, (codec or snapshot_codec()).encode(records))
+
+
+def with_ids(events):
+    """id の無いイベントにだけ id を付与したリストを返す (それ以外はコピーしない)"""
+    return [event if event.get('id') is not None else serialize_event(event) for event in events]
+
+
+def deserialize_records(records, raw_ids=None, report=None):
+    """レコードを Event に変換する。raw_ids が与えられたら、その id のレコードだけを変換する
+    (それ以外はコーデックが Event にしたもの)
+
+    日付が不正なレコードは除外し、report (ValidationReport) があれば集計する。
+    """
+    if raw_ids is not None and not raw_ids:
+        return list(records)
+    events = []
+    for record in records:
+        if raw_ids is not None and record.get('id') not in raw_ids:
+            events.append(record)
+            continue
+        try:
+            events.append(Event.from_record(record))
+        except InvalidEventError as e:
+            if report is not None:
+                report.reject_invalid(None, record, e)
+    return events
+
+
+def stream_snapshot(path, report=None):
+    """スナップショットを Event にしながら読み、(Event のリスト, 書き戻す必要があるか) を返す
+
+    JSON はファイル全体を読み込まずに少しずつ解析するので、デコードしたレコードのリストと Event のリストを
+    同時に持つことはなく、読み込み中のメモリは Event と読みかけのチャンクの分だけになる。
+    日付が不正なレコードや壊れたレコードは除外して report (ValidationReport) に件数と先頭の例を集計し、
+    ファイルが途中で切れていてもそこまでのイベントを返す。
+    id の無い (旧形式の) レコードには id を付与し、書き戻す必要があるかを返すが、読めなかったレコードが
+    あるときは書き戻すとそのレコードが失われるので False にする。
+    """
+    if not os.path.exists(path):
+        return [], False
+    if report is None:
+        report = ValidationReport()
+    errors_before = report.error_count
+    missing_id = dropped = False
+    convert, convert_all = record_converter()
+
+    def on_error(position, kind, message):
+        report.reject(position, '(読めないレコード)', kind, message)
+
+    def salvage(position, record):
+        """まとめて変換できなかったレコードを1件ずつ確かめて Event にする (できなければ None)"""
+        nonlocal missing_id, dropped
+        if record.__class__ is Event:
+            return record
+        try:
+            return convert(record)
+        except (ValueError, TypeError, AttributeError):
+            pass
+        if not isinstance(record, dict):
+            report.reject(position, '(読めないレコード)', 'record', "イベントのレコードではありません")
+            dropped = True
+            return None
+        if record.get('id') is None:
+            record = serialize_event(record) # 旧形式のデータには id が無いことがあるので、ここで付与する
+            missing_id = True
+        try:
+            return Event.from_record(record)
+        except InvalidEventError as e:
+            report.reject_invalid(position, record, e)
+            dropped = True
+            return None
+
+    events = []
+    with open(path, "rb") as f, gc_paused():
+        codec = detect_codec(f.read(len(BINARY_MAGIC)))
+        f.seek(0)
+        if codec.name == 'json':
+            for position, batch in iter_json_batches(f, on_error):
+                try:
+                    converted = convert_all(batch) # ほとんどのチャンクは1件ずつ確かめずにまとめて変換できる
+                except (LookupError, ValueError, TypeError, AttributeError):
+                    converted = [salvage(position + offset, record) for offset, record in enumerate(batch)]
+                events += converted
+        else:
+            # バイナリと msgpack はもともと小さいのでまとめてデコードする (Event にできたレコードは Event で返る)
+            events, invalid = codec.decode(f.read(), on_error)
+            for position in invalid:
+                events[position] = salvage(position + 1, events[position])
+    if dropped:
+        events = [event for event in events if event is not None]
+    report.accept(len(events))
+    return events, missing_id and report.error_count == errors_before
+
+
+# --- ストレージの共通インターフェース ---
+class EventStore:
+    """イベントストレージの基底クラス
+
+    レコードは日付を ISO 文字列 (または変換済みの datetime.date) で持つ辞書で、id をキーに扱う。
+    書き込みは (op, payload) の列として apply() に渡され、op は 'add' / 'update' / 'delete'。
+    問い合わせ系のメソッドは全件走査による既定実装で、インデックスを持つ実装は上書きする。
+    """
+
+    def load_records(self):
+        """全レコードを登録順のリストで返す"""
+        raise NotImplementedError
+
+    def load_events(self, report=None):
+        """Event のリストを返す (日付が不正なレコードは除外して report (ValidationReport) に集計する)"""
+        return deserialize_records(self.load_records(), report=report)
+
+    def apply(self, ops):
+        """変更の列をまとめて永続化する"""
+        raise NotImplementedError
+
+    def save_all(self, events):
+        """イベントリスト全体で保存内容を置き換える"""
+        raise NotImplementedError
+
+    def stamp(self):
+        """保存内容が外部から変更されたかを判定するための値 (ファイルの mtime やサイズ) を返す"""
+        return None
+
+    def add(self, event):
+        self.apply([('add', event)])
+
+    def update(self, event):
+        self.apply([('update', event)])
+
+    def delete(self, event_id):
+        self.apply([('delete', event_id)])
+
+    # --- 問い合わせ ---
+    # 繰り返しのイベント (rrule を持つもの) は各回を SharedEventStore が展開するので、どの問い合わせにも含めない。
+    indexed_queries = False # True なら問い合わせが全件走査にならない (SharedEventStore はストレージに問い合わせる)
+
+    def _plain_records(self):
+        return [r for r in self.load_records() if not r.get(RRULE_FIELD)]
+
+    def upcoming_deadlines(self, today, limit=None, offset=0):
+        """締切日が today 以降のレコードを締切日順に offset 件飛ばして最大 limit 件返す"""
+        today_str = today.isoformat()
+        records = sorted((r for r in self._plain_records() if _iso(r.get('deadline')) >= today_str),
+                         key=lambda r: _iso(r.get('deadline')))
+        return records[offset:] if limit is None else records[offset:offset + limit]
+
+    def expired_deadlines(self, today, limit=None):
+        """締切日が today より前のレコードを締切日の新しい順に最大 limit 件返す"""
+        today_str = today.isoformat()
+        records = sorted((r for r in self._plain_records() if '' < _iso(r.get('deadline')) < today_str),
+                         key=lambda r: _iso(r.get('deadline')), reverse=True)
+        return records if limit is None else records[:limit]
+
+    def deadline_counts(self, today):
+        """(締切日が today より前の件数, today 以降の件数) を返す"""
+        today_str = today.isoformat()
+        deadlines = [_iso(r.get('deadline')) for r in self._plain_records()]
+        expired = sum(1 for deadline in deadlines if '' < deadline < today_str)
+        return expired, sum(1 for deadline in deadlines if deadline >= today_str)
+
+    def events_in_range(self, start, end, field='date'):
+        """field (date/deadline) が start 以上 end 以下のレコードを日付順に返す"""
+        start_str, end_str = start.isoformat(), end.isoformat()
+        return sorted((r for r in self._plain_records() if start_str <= _iso(r.get(field)) <= end_str),
+                      key=lambda r: _iso(r.get(field)))
+
+    def duplicate_dates(self, min_count=2):
+        """イベント日ごとの件数のうち min_count 件以上のものを {日付文字列: 件数} で返す"""
+        counts = {}
+        for record in self._plain_records():
+            date_str = _iso(record.get('date'))
+            if date_str:
+                counts[date_str] = counts.get(date_str, 0) + 1
+        return {d: c for d, c in sorted(counts.items()) if c >= min_count}
+
+
+def _iso(value):
+    """比較用に日付を ISO 文字列にそろえる (未設定は空文字)"""
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value if isinstance(value, str) else ''
+
+
+def file_stamp(*paths):
+    """ファイルの (mtime_ns, size) の組を返す (存在しないファイルは None)"""
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def truncate_torn_tail(path, block_size=4096):
+    """書き込み途中でクラッシュして改行で終わっていない末尾行を切り詰める
+
+    そのまま追記すると次のレコードが壊れた行の続きになり、再生のときに行ごと捨てられてしまう。
+    """
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        position = end
+        while position > 0: # 最後の改行を後ろから探す
+            start = max(0, position - block_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        f.truncate(position)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def apply_ops_to_records(records, ops):
+    """id をキーにした辞書 records に変更の列を適用する (ジャーナル再生と同じ意味論)"""
+    for op, payload in ops:
+        if op in ('add', 'update'):
+            record = serialize_event(payload)
+            records[record['id']] = record
+        elif op == 'delete':
+            records.pop(payload, None)
+        else:
+            raise ValueError(f"unknown op: {op}")
+
+
+# --- JSONファイル1つに全件を書き出すストレージ (従来の方式) ---
+class JsonFileStore(EventStore):
+    """変更のたびに events_data.json 全体を書き直すストレージ"""
+
+    def __init__(self, path=DATA_FILE, codec=None):
+        self.path = path
+        self.codec = snapshot_codec(codec)
+        self._lock = threading.RLock()
+
+    def load_records(self):
+        with self._lock:
+            return list(self._read()[0].values())
+
+    def load_events(self, report=None):
+        with self._lock:
+            events, rewrite = stream_snapshot(self.path, report)
+            if rewrite:
+                write_snapshot(self.path, events, self.codec)
+        return events
+
+    def _read(self):
+        return self._index_snapshot(*read_snapshot(self.path))
+
+    def _index_snapshot(self, decoded, raw_positions):
+        records, raw_ids, missing_id = index_records(decoded, raw_positions)
+        if missing_id:
+            write_snapshot(self.path, list(records.values()), self.codec)
+        return records, raw_ids
+
+    def apply(self, ops):
+        with self._lock:
+            records = self._read()[0]
+            apply_ops_to_records(records, ops)
+            write_snapshot(self.path, list(records.values()), self.codec)
+
+    def save_all(self, events):
+        with self._lock:
+            write_snapshot(self.path, with_ids(events), self.codec)
+
+    def stamp(self):
+        return file_stamp(self.path)
+
+
+# --- ジャーナル方式のストレージ ---
+class JournalStore(EventStore):
+    """スナップショット (events_data.json) + 追記ジャーナルによるイベントストレージ
+
+    追加・更新・削除は id をキーにした小さなレコードとしてジャーナルに追記され、
+    ジャーナルが閾値を超えるとバックグラウンドでスナップショットに畳み込まれる。
+    読み込み時はスナップショットにジャーナルを順に再生する。
+    """
+
+    def __init__(self, path=DATA_FILE, compact_threshold=COMPACT_THRESHOLD_BYTES, codec=None):
+        self.path = path
+        self.codec = snapshot_codec(codec)
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.compacting_path = path + COMPACTING_SUFFIX
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()          # ジャーナルの追記・切り替え用
+        self._compact_lock = threading.Lock()   # スナップショットの書き換え用
+        self._compactor = None
+        self._damaged_stamp = None # 読めない部分があったスナップショットの stamp (変わるまで畳み込まない)
+        self._compacted_stamps = {} # 畳み込みで変わったファイルの stamp -> 畳み込む前の stamp
+
+    # --- 読み込み ---
+    def load_records(self):
+        """スナップショットとジャーナルを再生した結果のレコードのリストを返す"""
+        with self._lock:
+            return list(self._read_all()[0].values())
+
+    def load_events(self, report=None):
+        """スナップショットは Event にしながら読み、ジャーナルで変わったレコードだけを改めて変換する"""
+        with self._lock:
+            events, rewrite = stream_snapshot(self.path, report)
+            if rewrite:
+                # 旧形式のデータには id が無いことがあるので、付与したものを書き戻す
+                write_snapshot(self.path, events, self.codec)
+            journal_paths = [path for path in (self.compacting_path, self.journal_path) if os.path.exists(path)]
+            if not journal_paths:
+                return events # 再生するジャーナルが無ければ、id の索引を作らずにそのまま返す
+            records = {event.id: event for event in events}
+            raw_ids = set()
+            for journal_path in journal_paths:
+                raw_ids |= self._replay(journal_path, records)
+        return deserialize_records(records.values(), raw_ids, report)
+
+    def _read_all(self):
+        records, raw_ids = self._read_snapshot()
+        for journal_path in (self.compacting_path, self.journal_path):
+            raw_ids |= self._replay(journal_path, records)
+        return records, raw_ids
+
+    def _read_snapshot(self, report=None):
+        return self._index_snapshot(*read_snapshot(self.path, report))
+
+    def _index_snapshot(self, decoded, raw_positions):
+        records, raw_ids, missing_id = index_records(decoded, raw_positions)
+        if missing_id:
+            # 旧形式のデータには id が無いことがあるので、付与したものを書き戻す
+            write_snapshot(self.path, list(records.values()), self.codec)
+        return records, raw_ids
+
+    @staticmethod
+    def _replay(journal_path, records):
+        """ジャーナルを records に再生し、追加・更新されたレコードの id の集合を返す"""
+        touched = set()
+        if not os.path.exists(journal_path):
+            return touched
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # 書き込み途中でクラッシュした末尾行は無視する
+                op = entry.get('op')
+                if op in ('add', 'update'):
+                    apply_ops_to_records(records, [(op, entry['event'])])
+                    touched.add(entry['event'].get('id'))
+                elif op == 'delete':
+                    apply_ops_to_records(records, [(op, entry.get('id'))])
+        return touched
+
+    # --- 書き込み ---
+    def apply(self, ops):
+        entries = []
+        for op, payload in ops:
+            if op in ('add', 'update'):
+                entries.append({'op': op, 'event': serialize_event(payload)})
+            elif op == 'delete':
+                entries.append({'op': 'delete', 'id': payload})
+            else:
+                raise ValueError(f"unknown op: {op}")
+        if entries:
+            self._append(entries)
+
+    def save_all(self, events):
+        """イベントリスト全体をスナップショットとして書き出し、ジャーナルを空にする"""
+        records = with_ids(events)
+        with self._compact_lock, self._lock:
+            write_snapshot(self.path, records, self.codec)
+            for journal_path in (self.journal_path, self.compacting_path):
+                if os.path.exists(journal_path):
+                    os.remove(journal_path)
+
+    def _append(self, entries):
+        with self._lock:
+            truncate_torn_tail(self.journal_path)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            journal_size = os.path.getsize(self.journal_path)
+        if journal_size >= self.compact_threshold:
+            self.compact_in_background()
+
+    def stamp(self):
+        """畳み込みは内容を変えないので、畳み込んだ後にファイルが変わっていなければ畳み込む前の stamp を返す"""
+        with self._lock:
+            stamp = self._file_stamp()
+            return self._compacted_stamps.get(stamp, stamp)
+
+    def _file_stamp(self):
+        return file_stamp(self.path, self.compacting_path, self.journal_path)
+
+    # --- コンパクション ---
+    def compact_in_background(self):
+        """コンパクションをバックグラウンドスレッドで開始する (実行中なら何もしない)"""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, name="journal-compactor", daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        """ジャーナルをスナップショットに畳み込む
+
+        実行中の追記は新しいジャーナルに向かうので、書き込みをブロックしない。
+        途中でクラッシュしても、再生は id 単位の上書き/削除なので二重適用しても結果は変わらない。
+        ファイルの stamp は変わるが内容は変わらないので、stamp() は畳み込む前の値を返し続ける
+        (共有ストアが自分の畳み込みを外部の変更と見なして読み直さないように)。
+        スナップショットに読めない部分 (途中で切れているなど) があれば、書き直すとその部分が失われたまま
+        保存されるので畳み込まない (ジャーナルは残り、読み込みのときに再生される)。
+        """
+        with self._compact_lock:
+            with self._lock:
+                stamp = file_stamp(self.path)
+                if stamp == self._damaged_stamp:
+                    return
+                if os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+                    before = self.stamp()
+                    os.replace(self.journal_path, self.compacting_path)
+                    self._compacted_stamps = {self._file_stamp(): before}
+                if not os.path.exists(self.compacting_path):
+                    return
+                report = ValidationReport()
+                records = self._read_snapshot(report)[0]
+                if report:
+                    self._damaged_stamp = stamp
+                    return
+            self._replay(self.compacting_path, records)
+            # 書き出しは追記をブロックしないようにロックの外で行い、置き換えと stamp の記録だけをロックの中で行う
+            tmp_path = write_temp_bytes(self.path, self.codec.encode(list(records.values())))
+            try:
+                with self._lock:
+                    before = self.stamp()
+                    os.replace(tmp_path, self.path)
+                    os.remove(self.compacting_path)
+                    self._compacted_stamps = {self._file_stamp(): before}
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(backend=None, path=None):
+    """バックエンドとパスごとに1つのストアを返す (Streamlit の再実行をまたいで共有される)
+
+    backend は 'journal' (既定) / 'json' / 'sqlite'。省略時は環境変数 EVENT_STORE_BACKEND を見る。
+    """
+    backend = backend or os.environ.get(STORE_BACKEND_ENV, 'journal')
+    if backend == 'sqlite':
+        from sqlite_store import SQLITE_FILE, open_sqlite_store
+        path = path or SQLITE_FILE
+    else:
+        path = path or DATA_FILE
+    key = (backend, os.path.abspath(path))
+    with _stores_lock:
+        if key not in _stores:
+            if backend == 'journal':
+                _stores[key] = JournalStore(path)
+            elif backend == 'json':
+                _stores[key] = JsonFileStore(path)
+            elif backend == 'sqlite':
+                _stores[key] = open_sqlite_store(path)
+            else:
+                raise ValueError(f"unknown store backend: {backend}")
+        return _stores[key]
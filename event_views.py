@@ -0,0 +1,189 @@
+# 画面に表示する内容 (お知らせ・イベント選択・重複の警告) を作る関数。
+# Streamlit に依存しないので、ベンチマークなどから UI を動かさずに呼び出せる。
+
+import datetime
+
+from event_recurrence import SERIES_FIELD
+from event_search import SEARCH_PAGE_SIZE, normalize
+
+NOTICE_PAGE_SIZE = 20 # お知らせに一度に表示する締切の件数
+SELECT_PLACEHOLDER = ("イベントを選択...", None)
+CLASH_TITLES_SHOWN = 5 # 日程の重なりの警告に表示するイベント名の数 (1件の警告あたり)
+BULK_TABLE_LIMIT = 1000 # まとめて編集する表に一度に表示する行数
+BULK_SELECT_COLUMN = "選択"
+STATUS_LABELS = (('today', "本日締切"), ('week', "7日以内"), ('month', "30日以内"), ('expired', "締切済"))
+
+
+def _format_date(day):
+    return day.strftime('%Y年%m月%d日')
+
+
+# --- お知らせ ---
+def has_notice_events(shared_store):
+    """お知らせの対象になる (締切日が有効な) イベントがあるか"""
+    return len(shared_store.indexes['deadline']) > 0
+
+
+def deadline_counts(shared_store, today, page_size=NOTICE_PAGE_SIZE):
+    """(締切済の件数, これからの締切の件数, ページ数) を返す"""
+    expired_count, upcoming_count, _ = shared_store.deadline_overview(today, limit=0)
+    return expired_count, upcoming_count, max(1, -(-upcoming_count // page_size))
+
+
+def upcoming_deadline_lines(shared_store, today, page=1, page_size=NOTICE_PAGE_SIZE):
+    """締切の近い順に page ページ目の申込締切情報を Markdown の行で返す"""
+    _, _, upcoming_events = shared_store.deadline_overview(today, offset=(page - 1) * page_size, limit=page_size)
+    lines = []
+    for ev in upcoming_events:
+        delta = ev['deadline'] - today
+        deadline_str = _format_date(ev['deadline'])
+        if delta.days == 0:
+            lines.append(f"- **【{ev['title']}】: 本日締切！** ({deadline_str}) 🏃")
+        else:
+            lines.append(f"- 【{ev['title']}】: 申込締切まであと **{delta.days}日** ({deadline_str})")
+    return lines
+
+
+def expired_deadline_lines(shared_store, today, expired_count, limit=NOTICE_PAGE_SIZE):
+    """締切済のイベントを新しい順に最大 limit 件、Markdown の行で返す"""
+    lines = [f"- 【{ev['title']}】: 申込締切済 ({_format_date(ev['deadline'])})"
+             for ev in shared_store.recently_expired(today, limit=limit)]
+    if expired_count > limit:
+        lines.append(f"- ほか {expired_count - limit}件")
+    return lines
+
+
+def deadline_status_line(shared_store, today):
+    """締切までの日数の区分ごとの件数を1行にまとめて返す (件数は列から一括で数える)"""
+    counts = shared_store.columns(today, 'deadline').status_counts(today)
+    return " ・ ".join(f"{label} {counts[name]}件" for name, label in STATUS_LABELS)
+
+
+def month_counts(shared_store, today, field='date'):
+    """月ごとのイベント数をグラフに渡せる {'月': [...], '件数': [...]} で返す (繰り返しのイベントは今日の前後の各回を数える)"""
+    histogram = shared_store.columns(today, field).month_histogram(field)
+    return {'月': [month.strftime('%Y-%m') for month, _ in histogram], '件数': [count for _, count in histogram]}
+
+
+def duplicate_warnings(shared_store, limit=NOTICE_PAGE_SIZE):
+    """イベント日の重複 (定員超えの日付と、期間が重なる複数日イベント) の警告文を最大 limit 件返す
+
+    超えた分は「ほか N件」の1行にまとめる。警告文はデータの version ごとに作り置きする。
+    """
+    return shared_store.cached(('duplicate_warnings', limit), lambda: _duplicate_warnings(shared_store, limit))
+
+
+def _duplicate_warnings(shared_store, limit):
+    over_capacity = shared_store.over_capacity_dates()
+    warnings = [f"⚠️ **重複注意:** {_format_date(date_val)} には {count}件のイベントが予定されています。"
+                for date_val, count in over_capacity[:limit]]
+    # 期間の重なりは件数だけを全体で数え、表示する分だけ重なるイベントを取り出す
+    clash_count = len(shared_store.multi_day_clash_counts())
+    for ev, overlapping_events in shared_store.multi_day_clashes(limit - len(warnings)):
+        period_str = f"{_format_date(ev['date'])}〜{ev['end_date'].strftime('%m月%d日')}"
+        warnings.append(f"⚠️ **期間の重複:** 【{ev['title']}】({period_str}) は {_titles(overlapping_events)} と重なっています。")
+    hidden = len(over_capacity) + clash_count - len(warnings)
+    if hidden:
+        warnings.append(f"⚠️ ほか {hidden}件の重複があります。")
+    return warnings
+
+
+def _titles(events):
+    """先頭の CLASH_TITLES_SHOWN 件のイベント名 (残りは「ほか N件」)"""
+    titles = "、".join(f"【{ev['title']}】" for ev in events[:CLASH_TITLES_SHOWN])
+    if len(events) > CLASH_TITLES_SHOWN:
+        titles += f" ほか{len(events) - CLASH_TITLES_SHOWN}件"
+    return titles
+
+
+# --- アーカイブ ---
+def archive_status_line(archive):
+    """アーカイブに移したイベントの範囲と件数の説明 (アーカイブが空なら None)。アーカイブは読み込まない"""
+    if archive.before is None:
+        return None
+    last_day = archive.before - datetime.timedelta(days=1)
+    return f"{_format_date(last_day)}以前に終わった {archive.count}件のイベントはアーカイブに移しています。"
+
+
+def archive_search_lines(archive, query, limit=SEARCH_PAGE_SIZE):
+    """アーカイブを検索し、一致したイベントを点数の高い順に最大 limit 件、Markdown の行で返す"""
+    total, events = archive.search(query, limit=limit)
+    lines = []
+    for ev in events:
+        period = _format_date(ev['date'])
+        if ev.get('end_date'):
+            period += f"〜{ev['end_date'].strftime('%m月%d日')}"
+        lines.append(f"- 【{ev['title']}】: {period} (申込締切 {_format_date(ev['deadline'])})")
+    if total > limit:
+        lines.append(f"- ほか {total - limit}件")
+    return lines
+
+
+# --- イベント選択 ---
+def selectbox_options(events):
+    """イベント選択の selectbox に渡す (タイトル, id) の一覧 (先頭は「イベントを選択...」)"""
+    return [SELECT_PLACEHOLDER] + [
+        (ev.get('title', f"無題 (ID:{ev.get('id', '')[:6]})"), ev.get('id'))
+        for ev in events # 共有ストアのイベントは必ず id を持つ
+    ]
+
+
+def selector_page(shared_store, query='', page=1, page_size=SEARCH_PAGE_SIZE, editing_id=None):
+    """イベント選択の1ページ分の選択肢を作り、(選択肢, 一致した件数, ページ数) を返す
+
+    検索語 query があれば一致したイベントを点数の高い順に、無ければ全イベントを登録順に並べ、
+    page ページ目の page_size 件だけを選択肢にする (全件を selectbox に渡さない)。
+    編集中のイベントがそのページに無ければ、選択が外れないように先頭に加える。
+    """
+    offset = (page - 1) * page_size
+    if query.strip():
+        total, events = shared_store.search(query, limit=page_size, offset=offset)
+    else:
+        events = shared_store.events()
+        total = len(events)
+        events = list(events[offset:offset + page_size])
+    if editing_id and all(ev['id'] != editing_id for ev in events):
+        editing_event = shared_store.get(editing_id)
+        if editing_event is not None:
+            events.insert(0, editing_event)
+    return selectbox_options(events), total, max(1, -(-total // page_size))
+
+
+def selectbox_index(options, editing_id):
+    """編集中のイベントの選択肢での位置 (編集中でないか選択肢に無ければ先頭の 0)"""
+    if editing_id:
+        for position, (_, event_id) in enumerate(options):
+            if event_id == editing_id:
+                return position
+    return 0
+
+
+# --- まとめて編集 ---
+def bulk_table_rows(shared_store, start, end, query='', limit=BULK_TABLE_LIMIT):
+    """イベント日が start 〜 end のイベント (query があればタイトル・説明で絞る) を、(表の行, 該当件数) で返す
+
+    繰り返しのイベントは、期間に入る回があれば元のイベントを1行にする。行はイベント日順で、最大 limit 行。
+    """
+    events = {}
+    for ev in shared_store.events_in_window('date', start, end):
+        if SERIES_FIELD in ev:
+            ev = shared_store.get(ev[SERIES_FIELD])
+        if ev is not None:
+            events.setdefault(ev['id'], ev)
+    phrase = " ".join(normalize(query).split())
+    if phrase:
+        events = {event_id: ev for event_id, ev in events.items()
+                  if phrase in normalize(ev['title']) or phrase in normalize(ev.get('description'))}
+    matched = sorted(events.values(), key=lambda ev: (ev['date'], ev['title']))
+    rows = [{BULK_SELECT_COLUMN: False, 'イベント名': ev['title'], 'イベント日': ev['date'], '終了日': ev.get('end_date'),
+             '申込締切日': ev['deadline'], 'id': ev['id']} for ev in matched[:limit]]
+    return rows, len(matched)
+
+
+# --- 入力フォーム ---
+def clash_warning(shared_store, start, end=None, exclude_id=None):
+    """入力中の日程が既存のイベントと重なっていれば警告文を、重なっていなければ None を返す"""
+    clashing = shared_store.clashing_events(start, end, exclude_id=exclude_id)
+    if not clashing:
+        return None
+    return f"⚠️ この日程は {len(clashing)}件のイベントと重なっています: {_titles(clashing)}"
@@ -0,0 +1,463 @@
+import concurrent.futures
+import contextlib
+import datetime
+import hashlib
+import http.client
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+
+from event_recurrence import RRULE_FIELD
+from event_store import atomic_write_json, serialize_event
+
+# --- 定数定義 ---
+GOOGLE_API_BASE_URL = "https://www.googleapis.com"
+BATCH_PATH = "/batch/calendar/v3"
+MAX_BATCH_SIZE = 50          # Google Calendar API のバッチ1回あたりの上限
+SYNC_STATE_FILE = "gcal_sync_state.json" # イベントごとの送信済みフィンガープリント
+SYNC_WORKERS = 4             # 並行して送るバッチの数 (= コネクションプールの大きさ)
+MAX_RETRIES = 5
+RETRY_BASE_SECONDS = 1.0
+
+# 設定は環境変数から読む (base URL はテスト用のローカルサーバに差し替えられる)
+CALENDAR_ID_ENV = "GOOGLE_CALENDAR_ID"
+ACCESS_TOKEN_ENV = "GOOGLE_OAUTH_TOKEN"
+API_BASE_URL_ENV = "GOOGLE_API_BASE_URL"
+
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SyncError(Exception):
+    """同期に失敗した (再試行しても成功しない) エラー"""
+
+
+class TransientSyncError(SyncError):
+    """時間をおいて再試行すれば成功する可能性があるエラー"""
+
+
+class ApiRequest:
+    """バッチに入れる1件分の API リクエスト"""
+
+    def __init__(self, method, path, body=None):
+        self.method = method
+        self.path = path
+        self.body = body
+
+
+class ApiResponse:
+    def __init__(self, status, body=None):
+        self.status = status
+        self.body = body
+
+
+# --- クライアント ---
+class CalendarClient:
+    """カレンダー API クライアントの基底クラス。テストではローカルのフェイクに差し替える"""
+
+    def execute_batch(self, requests):
+        """リクエストの列をまとめて送り、同じ順序の ApiResponse の列を返す"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HttpConnectionPool:
+    """同じホストへの HTTP(S) コネクションを使い回すプール"""
+
+    def __init__(self, base_url, size=SYNC_WORKERS, timeout=30):
+        parsed = urllib.parse.urlsplit(base_url)
+        self._connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        self._host = parsed.hostname
+        self._port = parsed.port
+        self._timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connection_class(self._host, self._port, timeout=self._timeout)
+        try:
+            yield conn
+        except BaseException:
+            conn.close() # 状態が分からないコネクションは捨てる
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, body=None, headers=None):
+        with self.connection() as conn:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class GoogleCalendarClient(CalendarClient):
+    """Google Calendar API のバッチエンドポイント (multipart/mixed) を使うクライアント"""
+
+    def __init__(self, access_token, base_url=GOOGLE_API_BASE_URL, pool_size=SYNC_WORKERS, timeout=30):
+        self._access_token = access_token
+        self._pool = HttpConnectionPool(base_url, size=pool_size, timeout=timeout)
+
+    def execute_batch(self, requests):
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for i, request in enumerate(requests):
+            payload = "" if request.body is None else json.dumps(request.body, ensure_ascii=False)
+            inner = f"{request.method} {request.path} HTTP/1.1\r\n"
+            if request.body is not None:
+                inner += "Content-Type: application/json; charset=UTF-8\r\n"
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <item-{i}>\r\n\r\n"
+                         f"{inner}\r\n{payload}\r\n")
+        body = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+        headers = {
+            'Authorization': f"Bearer {self._access_token}",
+            'Content-Type': f"multipart/mixed; boundary={boundary}",
+        }
+        try:
+            status, response_headers, data = self._pool.request("POST", BATCH_PATH, body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            raise TransientSyncError(f"バッチの送信に失敗しました: {e}") from e
+        if status in _RETRYABLE_STATUSES:
+            raise TransientSyncError(f"バッチの送信に失敗しました (HTTP {status})")
+        if status != 200:
+            raise SyncError(f"バッチの送信に失敗しました (HTTP {status}): {data[:200]!r}")
+        return _parse_batch_response(response_headers, data, len(requests))
+
+    def close(self):
+        self._pool.close()
+
+
+def _parse_batch_response(headers, data, count):
+    content_type = next((v for k, v in headers.items() if k.lower() == "content-type"), "")
+    boundary = next((p.split("=", 1)[1].strip('"') for p in content_type.split(";")
+                     if p.strip().startswith("boundary=")), None)
+    if boundary is None:
+        raise SyncError("バッチの応答に boundary がありません")
+    responses = [ApiResponse(500)] * count # 応答の無い項目は再試行の対象にする
+    for part in data.split(f"--{boundary}".encode()):
+        part = part.strip(b"\r\n")
+        if not part or part == b"--":
+            continue
+        part_headers, _, http_response = part.partition(b"\r\n\r\n")
+        index = None
+        for line in part_headers.decode("utf-8", "replace").split("\r\n"):
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-id":
+                digits = value.strip().strip("<>").rsplit("-", 1)[-1]
+                index = int(digits) if digits.isdigit() else None
+        if index is None or not 0 <= index < count:
+            continue
+        head, _, body = http_response.partition(b"\r\n\r\n")
+        status_line = head.split(b"\r\n", 1)[0].decode("ascii", "replace").split()
+        status = int(status_line[1]) if len(status_line) > 1 and status_line[1].isdigit() else 500
+        try:
+            parsed_body = json.loads(body) if body.strip() else None
+        except ValueError:
+            parsed_body = None
+        responses[index] = ApiResponse(status, parsed_body)
+    return responses
+
+
+class InMemoryCalendarClient(CalendarClient):
+    """Google の代わりにメモリ上にイベントを持つフェイクのクライアント (開発・テスト用)"""
+
+    def __init__(self, fail_every=0):
+        self.events = {}
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._fail_every = fail_every # n 回に1回 503 を返して再試行の動作を確かめる
+
+    def execute_batch(self, requests):
+        with self._lock:
+            self.batches += 1
+            if self._fail_every and self.batches % self._fail_every == 0:
+                raise TransientSyncError("fake 503")
+            responses = []
+            for request in requests:
+                google_id = request.body['id'] if request.method == "POST" else request.path.rsplit("/", 1)[-1]
+                exists = google_id in self.events
+                if request.method == "POST" and exists:
+                    responses.append(ApiResponse(409))
+                elif request.method in ("PUT", "DELETE") and not exists:
+                    responses.append(ApiResponse(404))
+                elif request.method == "DELETE":
+                    del self.events[google_id]
+                    responses.append(ApiResponse(204))
+                else:
+                    self.events[google_id] = request.body
+                    responses.append(ApiResponse(200, request.body))
+            return responses
+
+
+# --- 差分の計算 ---
+KINDS = ('date', 'deadline') # 1件のイベントを、イベント日と申込締切日の2件の Google イベントにする
+
+
+def event_fingerprint(event):
+    """イベントの内容から計算する版 (内容が変わると変わる)"""
+    record = serialize_event(event)
+    return hashlib.sha256(json.dumps(record, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def google_event_id(event_id, kind):
+    """Google 側のイベント id (base32hex の文字だけからなる決まった値) を返す"""
+    return hashlib.sha1(f"{event_id}:{kind}".encode("utf-8")).hexdigest()
+
+
+def google_event_body(event, kind):
+    if kind == 'date':
+        summary = event.get('title', '')
+        start = event['date']
+        last_day = event.get('end_date') or start
+    else:
+        summary = f"締切: {event.get('title', '')}"
+        start = last_day = event['deadline']
+    body = {
+        'id': google_event_id(event['id'], kind),
+        'summary': summary,
+        'description': event.get('description', ''),
+        'start': {'date': start.isoformat()},
+        'end': {'date': (last_day + datetime.timedelta(days=1)).isoformat()}, # 終日イベントの end は翌日
+    }
+    if event.get(RRULE_FIELD): # 繰り返しのイベントは1件のまま Google 側で繰り返す
+        body['recurrence'] = [f"RRULE:{event[RRULE_FIELD]}"]
+    return body
+
+
+class SyncOp:
+    """Google 側の1件への操作 (insert / update / delete)"""
+
+    def __init__(self, event_id, kind, action, body=None):
+        self.event_id = event_id
+        self.kind = kind
+        self.action = action
+        self.body = body
+
+    def request(self, calendar_id):
+        base = f"/calendar/v3/calendars/{urllib.parse.quote(calendar_id, safe='')}/events"
+        google_id = google_event_id(self.event_id, self.kind)
+        if self.action == 'insert':
+            return ApiRequest("POST", base, self.body)
+        if self.action == 'update':
+            return ApiRequest("PUT", f"{base}/{google_id}", self.body)
+        return ApiRequest("DELETE", f"{base}/{google_id}")
+
+
+class SyncState:
+    """イベント id -> 送信済みのフィンガープリント を JSON ファイルに保存する"""
+
+    def __init__(self, path=SYNC_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.synced = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.synced = json.load(f)
+
+    def mark_synced(self, event_id, fingerprint):
+        with self._lock:
+            self.synced[event_id] = fingerprint
+
+    def mark_deleted(self, event_id):
+        with self._lock:
+            self.synced.pop(event_id, None)
+
+    def save(self):
+        with self._lock:
+            atomic_write_json(self.path, self.synced)
+
+
+def plan_sync(events, state, retained_ids=()):
+    """前回の同期から追加・変更・削除されたイベントだけの操作の列と、イベントごとのフィンガープリントを返す
+
+    events に無くても retained_ids に入っているイベント (アーカイブに移したもの) は削除しない。
+    """
+    ops = []
+    fingerprints = {}
+    current_ids = set()
+    for event in events:
+        if not isinstance(event.get('date'), datetime.date) or not isinstance(event.get('deadline'), datetime.date):
+            continue
+        current_ids.add(event['id'])
+        fingerprint = event_fingerprint(event)
+        previous = state.synced.get(event['id'])
+        if previous == fingerprint:
+            continue
+        fingerprints[event['id']] = fingerprint
+        action = 'insert' if previous is None else 'update'
+        ops.extend(SyncOp(event['id'], kind, action, google_event_body(event, kind)) for kind in KINDS)
+    for event_id in state.synced:
+        if event_id not in current_ids and event_id not in retained_ids:
+            ops.extend(SyncOp(event_id, kind, 'delete') for kind in KINDS)
+    return ops, fingerprints
+
+
+# --- 同期の実行 ---
+class CalendarSync:
+    """差分を最大50件ずつのバッチにして、複数のワーカーから並行して送る
+
+    失敗した項目は指数バックオフ (ジッタ付き) で再試行する。insert が 409 (既にある) なら update に、
+    update が 404 (無い) なら insert に切り替え、delete の 404 は成功扱いにする。
+    """
+
+    def __init__(self, client, calendar_id, state, workers=SYNC_WORKERS, max_retries=MAX_RETRIES,
+                 retry_base_seconds=RETRY_BASE_SECONDS, sleep=time.sleep):
+        self.client = client
+        self.calendar_id = calendar_id
+        self.state = state
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self._sleep = sleep
+
+    def run(self, events, progress=None, cancelled=None, retained_ids=()):
+        """同期を実行して (成功したイベント数, 失敗したイベント数, エラーメッセージの例) を返す
+
+        progress(完了した操作数, 全操作数) が進捗のたびに呼ばれる。
+        """
+        ops, fingerprints = plan_sync(events, self.state, retained_ids)
+        total = len(ops)
+        done = [0]
+        progress_lock = threading.Lock()
+        failed_ops = []
+        errors = []
+
+        def report(count):
+            with progress_lock:
+                done[0] += count
+                if progress:
+                    progress(done[0], total)
+
+        chunks = [ops[i:i + MAX_BATCH_SIZE] for i in range(0, total, MAX_BATCH_SIZE)]
+        if progress:
+            progress(0, total)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gcal-sync") as pool:
+            futures = [pool.submit(self._send_chunk, chunk, report, cancelled) for chunk in chunks]
+            for future in concurrent.futures.as_completed(futures):
+                chunk_failed, chunk_errors = future.result()
+                failed_ops.extend(chunk_failed)
+                errors.extend(chunk_errors)
+
+        # イベント日と締切日の両方が成功したイベントだけを送信済みにする
+        failed_ids = {op.event_id for op in failed_ops}
+        synced_ids = {op.event_id for op in ops} - failed_ids
+        for event_id in synced_ids:
+            if event_id in fingerprints:
+                self.state.mark_synced(event_id, fingerprints[event_id])
+            else:
+                self.state.mark_deleted(event_id)
+        self.state.save()
+        return len(synced_ids), len(failed_ids), errors[:20]
+
+    def _send_chunk(self, chunk, report, cancelled):
+        """1つのバッチを送り、(失敗した操作の列, エラーメッセージの列) を返す"""
+        pending = list(chunk)
+        failed = []
+        errors = []
+        for attempt in range(self.max_retries + 1):
+            if cancelled is not None and cancelled.is_set():
+                return failed + pending, errors + ["キャンセルされました"]
+            if attempt:
+                self._sleep(self.retry_base_seconds * (2 ** (attempt - 1)) * (1 + random.random()))
+            try:
+                responses = self.client.execute_batch([op.request(self.calendar_id) for op in pending])
+            except TransientSyncError as e:
+                errors.append(str(e))
+                continue
+            except SyncError as e:
+                return failed + pending, errors + [str(e)]
+            retry = []
+            for op, response in zip(pending, responses):
+                status = response.status
+                if 200 <= status < 300 or (op.action == 'delete' and status in (404, 410)):
+                    report(1)
+                elif op.action == 'insert' and status == 409:
+                    op.action = 'update'
+                    retry.append(op)
+                elif op.action == 'update' and status == 404:
+                    op.action = 'insert'
+                    retry.append(op)
+                elif status in _RETRYABLE_STATUSES or status == 403: # 403 はレート制限 (rateLimitExceeded) のことがある
+                    retry.append(op)
+                else:
+                    errors.append(f"{op.event_id} ({op.kind}): HTTP {status}")
+                    failed.append(op)
+                    report(1)
+            pending = retry
+            if not pending:
+                return failed, errors
+        errors.append(f"{len(pending)} 件は再試行の上限に達しました")
+        return failed + pending, errors
+
+
+def client_from_env():
+    """環境変数の設定から (クライアント, カレンダー id) を返す。設定が無ければ None"""
+    calendar_id = os.environ.get(CALENDAR_ID_ENV)
+    access_token = os.environ.get(ACCESS_TOKEN_ENV)
+    if not calendar_id or not access_token:
+        return None
+    base_url = os.environ.get(API_BASE_URL_ENV, GOOGLE_API_BASE_URL)
+    return GoogleCalendarClient(access_token, base_url=base_url), calendar_id
+
+
+class SyncJob:
+    """同期を Streamlit のスクリプトとは別のスレッドで実行し、進捗を読めるようにする"""
+
+    def __init__(self, sync, events, retained_ids=()):
+        self._sync = sync
+        self._events = events
+        self._retained_ids = retained_ids
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.done = 0
+        self.total = 0
+        self.result = None  # (成功したイベント数, 失敗したイベント数, エラーメッセージの例)
+        self.error = None
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, name="gcal-sync-job", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def _progress(self, done, total):
+        with self._lock:
+            self.done, self.total = done, total
+
+    def _run(self):
+        try:
+            self.result = self._sync.run(self._events, progress=self._progress, cancelled=self._cancelled,
+                                        retained_ids=self._retained_ids)
+        except Exception as e: # スレッドの中の例外は画面に表示するために保持する
+            self.error = e
+        finally:
+            self._sync.client.close() # ジョブが終わったらコネクションを閉じる
+            self.finished = True
+
+    def fraction(self):
+        with self._lock:
+            return 1.0 if self.total == 0 else self.done / self.total
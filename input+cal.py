@@ -1,7 +1,7 @@
 import datetime
 import streamlit as st
 import streamlit_calendar as st_calendar
-from collections import Counter
+from event_index import DateOccupancyIndex
 
 # ❶ ウィジェット用のキーはそのまま使うけど、クリア用のフラグだけ別キーにする
 if 'should_clear' not in st.session_state:
@@ -11,6 +11,9 @@ if 'should_clear' not in st.session_state:
 #     終わったらまた should_clear を False に戻す
 if 'event_list' not in st.session_state:
     st.session_state.event_list = []
+# 日付ごとのイベント数 (登録のたびに差分更新し、再実行のたびには数え直さない)
+if 'date_occupancy' not in st.session_state:
+    st.session_state.date_occupancy = DateOccupancyIndex(capacity=1)
 
 
 if 'clicked_event_original_title' not in st.session_state:
@@ -52,14 +55,10 @@ with st.container(border=True):
 
         # 同じ日付のイベント重複警告 
         st.markdown("##### イベント日の重複チェック")
-        event_dates_only = [ev['date'] for ev in st.session_state.event_list]
-        date_counts = Counter(event_dates_only)
-
         duplicate_found = False
-        for date_val, count in date_counts.items():
-            if count >= 2:
-                st.warning(f"⚠️ **重複注意:** {date_val.strftime('%Y年%m月%d日')} には {count}件のイベントが予定されています。")
-                duplicate_found = True
+        for date_val, count in st.session_state.date_occupancy.over_capacity():
+            st.warning(f"⚠️ **重複注意:** {date_val.strftime('%Y年%m月%d日')} には {count}件のイベントが予定されています。")
+            duplicate_found = True
         
         if not duplicate_found:
             st.success("✅ 現在、日付が重複しているイベントはありません。")
@@ -108,6 +107,7 @@ if st.button('イベントを登録する'):
         'description': event_description
     }
     st.session_state.event_list.append(new_event_data)
+    st.session_state.date_occupancy.on_add(new_event_data)
     st.session_state.submitted = True
     st.session_state.should_clear = True
     st.rerun() # フォームクリアとカレンダー更新を即時反映
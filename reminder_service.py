@@ -0,0 +1,417 @@
+"""申込締切のリマインダーを送る常駐サービス
+
+    python reminder_service.py [--once] [--state reminder_state.json]
+
+Streamlit アプリの中でスレッドとして動かす (環境変数 REMINDER_NOTIFIER を設定する) か、
+このファイルを別プロセスとして実行する。同じデータに対して両方を動かすと二重に送られる。
+"""
+import argparse
+import datetime
+import email.message
+import heapq
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from event_index import EventIndex
+from event_recurrence import expand, is_recurring
+from event_store import atomic_write_json, open_store
+
+# --- 定数定義 ---
+REMINDER_DAYS_BEFORE = (7, 1, 0)   # 締切の何日前に知らせるか
+REMINDER_HOUR = 9                  # 知らせる時刻 (ローカル時刻の時)
+REMINDER_STATE_FILE = "reminder_state.json"
+BATCH_WINDOW_SECONDS = 60          # この秒数以内に続けて来るリマインダーは1通のダイジェストにまとめる
+SERIES_LOOKAHEAD_DAYS = 31         # 繰り返しのイベントを先の何日分まで展開しておくか
+STORE_CHECK_SECONDS = 60           # 別プロセスで動かすとき、データファイルの変更を確かめる間隔
+HEAP_COMPACT_MIN = 1000            # 無効になった予定がこれより多く溜まったらヒープを作り直す
+RETRY_SECONDS = 60                 # 送信に失敗したリマインダーを送り直すまでの秒数 (失敗するたびに倍にする)
+RETRY_MAX_SECONDS = 3600           # 送り直すまでの秒数の上限
+
+NOTIFIER_ENV = "REMINDER_NOTIFIER" # 送り方: log / smtp / webhook
+SMTP_HOST_ENV = "REMINDER_SMTP_HOST"
+SMTP_PORT_ENV = "REMINDER_SMTP_PORT"
+MAIL_FROM_ENV = "REMINDER_MAIL_FROM"
+MAIL_TO_ENV = "REMINDER_MAIL_TO"   # カンマ区切り
+WEBHOOK_URL_ENV = "REMINDER_WEBHOOK_URL"
+DEFAULT_SMTP_HOST = "localhost"
+DEFAULT_SMTP_PORT = 1025           # 開発用のローカル SMTP (python -m aiosmtpd -n など) の既定ポート
+
+logger = logging.getLogger("entry_cal.reminder")
+
+
+class Reminder:
+    """1件のリマインダー (締切の days_before 日前のお知らせ)"""
+
+    def __init__(self, event_id, title, deadline, days_before):
+        self.event_id = event_id
+        self.title = title
+        self.deadline = deadline
+        self.days_before = days_before
+        self.failures = 0 # 送信に失敗した回数
+
+    @property
+    def key(self):
+        """送信済みかどうかを記録するキー (締切日が変われば別のリマインダーになる)"""
+        return f"{self.event_id}|{self.deadline.isoformat()}|{self.days_before}"
+
+    def line(self, today):
+        days = (self.deadline - today).days
+        remaining = "本日締切！" if days <= 0 else f"あと{days}日"
+        return f"- 【{self.title}】: {remaining} ({self.deadline.strftime('%Y年%m月%d日')})"
+
+
+class Digest:
+    """まとめて送るリマインダー"""
+
+    def __init__(self, reminders, today):
+        self.reminders = sorted(reminders, key=lambda reminder: (reminder.deadline, reminder.title))
+        self.today = today
+
+    @property
+    def subject(self):
+        return f"【エントリー忘れナイン】申込締切のお知らせ ({len(self.reminders)}件)"
+
+    @property
+    def text(self):
+        return "\n".join(reminder.line(self.today) for reminder in self.reminders)
+
+    def to_json(self):
+        return {
+            'subject': self.subject,
+            'text': self.text,
+            'reminders': [{'id': reminder.event_id, 'title': reminder.title, 'deadline': reminder.deadline.isoformat(),
+                           'days_before': reminder.days_before} for reminder in self.reminders],
+        }
+
+
+# --- 送信 ---
+class Notifier:
+    """ダイジェストの送り先の基底クラス (送れなければ例外を投げる)"""
+
+    def send(self, digest):
+        raise NotImplementedError
+
+
+class LogNotifier(Notifier):
+    """ログに出すだけ (送り先を設定していないときや動作確認用)"""
+
+    def send(self, digest):
+        logger.info("%s\n%s", digest.subject, digest.text)
+
+
+class SmtpNotifier(Notifier):
+    """SMTP でメールを送る"""
+
+    def __init__(self, host, port, sender, recipients, timeout=30):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.timeout = timeout
+
+    def send(self, digest):
+        message = email.message.EmailMessage()
+        message['Subject'] = digest.subject
+        message['From'] = self.sender
+        message['To'] = ", ".join(self.recipients)
+        message.set_content(digest.text)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+
+class WebhookNotifier(Notifier):
+    """Webhook に JSON を POST する"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, digest):
+        request = urllib.request.Request(self.url, data=json.dumps(digest.to_json(), ensure_ascii=False).encode("utf-8"),
+                                         headers={'Content-Type': "application/json; charset=utf-8"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def notifier_from_env():
+    """環境変数の設定から Notifier を返す。設定が無ければ None"""
+    kind = os.environ.get(NOTIFIER_ENV, "").lower()
+    if kind == 'log':
+        return LogNotifier()
+    if kind == 'smtp':
+        recipients = [address.strip() for address in os.environ.get(MAIL_TO_ENV, "").split(",") if address.strip()]
+        if not recipients:
+            raise ValueError(f"{MAIL_TO_ENV} に送り先のメールアドレスを設定してください")
+        return SmtpNotifier(os.environ.get(SMTP_HOST_ENV, DEFAULT_SMTP_HOST),
+                            int(os.environ.get(SMTP_PORT_ENV, DEFAULT_SMTP_PORT)),
+                            os.environ.get(MAIL_FROM_ENV, "entry-wasurenine@localhost"), recipients)
+    if kind == 'webhook':
+        url = os.environ.get(WEBHOOK_URL_ENV)
+        if not url:
+            raise ValueError(f"{WEBHOOK_URL_ENV} に Webhook の URL を設定してください")
+        return WebhookNotifier(url)
+    if kind:
+        raise ValueError(f"unknown notifier: {kind}")
+    return None
+
+
+class ReminderState:
+    """送信済みのリマインダーのキーを JSON ファイルに保存する (再起動しても二重に送らない)"""
+
+    def __init__(self, path=REMINDER_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.sent = set()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.sent = set(json.load(f))
+
+    def is_sent(self, key):
+        with self._lock:
+            return key in self.sent
+
+    def mark_sent(self, keys, today):
+        """keys を送信済みにして保存する。締切を過ぎたものは記録から消す"""
+        with self._lock:
+            self.sent.update(keys)
+            self.sent = {key for key in self.sent if key.split("|")[1] >= today.isoformat()}
+            if self.path:
+                atomic_write_json(self.path, sorted(self.sent))
+
+
+# --- スケジューラ ---
+class ReminderScheduler(EventIndex):
+    """締切のリマインダーを時刻順のヒープに持ち、次の時刻まで眠って送る
+
+    SharedEventStore.add_index() で登録すると、イベントの追加・更新・削除のたびにそのイベントの
+    予定だけを入れ直す。古い予定はヒープから消さずに世代番号で無効にし、取り出したときに捨てる。
+    同じ時刻 (BATCH_WINDOW_SECONDS 以内) の予定は1通のダイジェストにまとめて送る。
+    起動時に送り損ねた予定は、締切を過ぎていなければ最も近いもの1件だけをすぐに送る。
+    送信に失敗した予定は送信済みにせず、失敗した回数に応じて間を空けてヒープに戻す。
+    """
+
+    recurring = True
+
+    def __init__(self, notifier, state=None, days_before=REMINDER_DAYS_BEFORE, hour=REMINDER_HOUR, clock=time.time):
+        self.notifier = notifier
+        self.state = state or ReminderState(None)
+        self.days_before = tuple(sorted(set(days_before), reverse=True))
+        self.hour = hour
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._heap = []        # (時刻, 通し番号, 世代, イベント id, リマインダー。None なら繰り返しの展開し直し)
+        self._generation = {}  # イベント id -> 今の世代
+        self._events = {}      # イベント id -> イベント
+        self._entries = {}     # イベント id -> ヒープにある今の世代の予定の数
+        self._stale = 0        # ヒープに残っている無効な予定の数
+        self._seq = 0
+        self._stopped = False
+        self._thread = None
+        self.sent_digests = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap) - self._stale
+
+    # --- 予定の作成 ---
+    def _fire_time(self, day):
+        return datetime.datetime.combine(day, datetime.time(self.hour)).timestamp()
+
+    def _reminders(self, event_id, title, deadline, now):
+        """締切 deadline の (時刻, リマインダー) の列。時刻を過ぎたものは、締切前なら最も近い1件だけ今すぐに"""
+        scheduled = []
+        missed = None
+        for days in self.days_before:
+            reminder = Reminder(event_id, title, deadline, days)
+            fire_at = self._fire_time(deadline - datetime.timedelta(days=days))
+            if fire_at > now:
+                scheduled.append((fire_at, reminder))
+            else:
+                missed = reminder
+        if missed is not None and deadline >= datetime.date.fromtimestamp(now):
+            scheduled.append((now, missed))
+        return [(fire_at, reminder) for fire_at, reminder in scheduled if not self.state.is_sent(reminder.key)]
+
+    def _schedule(self, event):
+        event_id = event['id']
+        generation = self._generation.get(event_id, 0) + 1
+        self._generation[event_id] = generation
+        self._invalidate(event_id)
+        self._events[event_id] = event
+        now = self._clock()
+        today = datetime.date.fromtimestamp(now)
+        entries = []
+        if is_recurring(event):
+            # 繰り返しのイベントは先の SERIES_LOOKAHEAD_DAYS 日分だけ展開し、その先は後で展開し直す
+            until = today + datetime.timedelta(days=SERIES_LOOKAHEAD_DAYS)
+            for occurrence in expand(event, today, until + datetime.timedelta(days=max(self.days_before)), 'deadline'):
+                entries += self._reminders(occurrence['id'], occurrence['title'], occurrence['deadline'], now)
+            entries.append((self._fire_time(until), None))
+        elif event.get('deadline') is not None:
+            entries = self._reminders(event_id, event.get('title', ''), event['deadline'], now)
+        for fire_at, reminder in entries:
+            self._seq += 1
+            heapq.heappush(self._heap, (fire_at, self._seq, generation, event_id, reminder))
+        self._entries[event_id] = len(entries)
+
+    def _invalidate(self, event_id):
+        # 世代を進めた後に呼ぶ (それまでの予定が無効になる)
+        self._stale += self._entries.pop(event_id, 0)
+        if self._stale > max(HEAP_COMPACT_MIN, len(self._heap) // 2):
+            self._heap = [entry for entry in self._heap if entry[2] == self._generation.get(entry[3])]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    # --- EventIndex ---
+    def rebuild(self, events):
+        with self._cond:
+            self._heap = []
+            for event_id in self._events: # 送信中の予定も無効にする (世代を消すと作り直した予定と取り違える)
+                self._generation[event_id] += 1
+            self._events = {}
+            self._entries = {}
+            self._stale = 0
+            for event in events:
+                self._schedule(event)
+            self._cond.notify_all()
+
+    def on_add(self, event):
+        with self._cond:
+            self._schedule(event)
+            self._cond.notify_all() # 新しい予定が今眠っている時刻より早いかもしれない
+
+    def on_delete(self, event):
+        with self._cond:
+            self._generation[event['id']] = self._generation.get(event['id'], 0) + 1
+            self._invalidate(event['id'])
+            self._events.pop(event['id'], None)
+
+    def on_update(self, old, new):
+        self.on_add(new)
+
+    # --- 送信 ---
+    def _seconds_until_next(self):
+        while self._heap and self._heap[0][2] != self._generation.get(self._heap[0][3]):
+            heapq.heappop(self._heap)
+            self._stale -= 1
+        if not self._heap:
+            return None
+        return self._heap[0][0] - self._clock()
+
+    def _pop_due(self):
+        """時刻になった予定を (BATCH_WINDOW_SECONDS 先までまとめて) 取り出し、送る (世代, イベント id, リマインダー) を返す"""
+        limit = self._clock() + BATCH_WINDOW_SECONDS
+        due = []
+        while self._heap and self._heap[0][0] <= limit:
+            _, _, generation, event_id, reminder = heapq.heappop(self._heap)
+            if generation != self._generation.get(event_id):
+                self._stale -= 1
+                continue
+            self._entries[event_id] -= 1
+            if reminder is None: # 繰り返しのイベントの先の分を展開し直す
+                self._schedule(self._events[event_id])
+            else:
+                due.append((generation, event_id, reminder))
+        return due
+
+    def _retry(self, due):
+        """送れなかった予定を、失敗した回数に応じて RETRY_SECONDS から倍々に間を空けてヒープに戻す"""
+        with self._cond:
+            now = self._clock()
+            today = datetime.date.fromtimestamp(now)
+            for generation, event_id, reminder in due:
+                # 送信中に変更・削除されたイベントは予定が作り直されている。締切を過ぎたものは送らない
+                if generation != self._generation.get(event_id) or reminder.deadline < today:
+                    continue
+                reminder.failures += 1
+                delay = min(RETRY_SECONDS * 2 ** (reminder.failures - 1), RETRY_MAX_SECONDS)
+                self._seq += 1
+                heapq.heappush(self._heap, (now + delay, self._seq, generation, event_id, reminder))
+                self._entries[event_id] += 1
+            self._cond.notify_all()
+
+    def _deliver(self, due):
+        if not due:
+            return
+        reminders = [reminder for _, _, reminder in due]
+        today = datetime.date.fromtimestamp(self._clock())
+        digest = Digest(reminders, today)
+        try:
+            self.notifier.send(digest)
+        except (OSError, smtplib.SMTPException, urllib.error.URLError):
+            logger.exception("リマインダーの送信に失敗しました (%d件)。後で送り直します", len(reminders))
+            self._retry(due)
+            return
+        self.sent_digests += 1
+        self.state.mark_sent([reminder.key for reminder in reminders], today)
+
+    def run_pending(self):
+        """時刻になっているリマインダーを今すぐ送る"""
+        with self._cond:
+            wait = self._seconds_until_next()
+            due = self._pop_due() if wait is not None and wait <= 0 else []
+        self._deliver(due)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    wait = self._seconds_until_next()
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait) # 次の予定の時刻まで (予定が無ければ変更があるまで) 眠る
+                if self._stopped:
+                    return
+                due = self._pop_due()
+            self._deliver(due)
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    from shared_store import SharedEventStore
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--once", action="store_true", help="時刻になっているリマインダーだけを送って終わる")
+    parser.add_argument("--state", default=REMINDER_STATE_FILE, help="送信済みのリマインダーを記録するファイル")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    shared = SharedEventStore(open_store())
+    scheduler = ReminderScheduler(notifier_from_env() or LogNotifier(), ReminderState(args.state))
+    shared.add_index('reminders', scheduler)
+    if args.once:
+        scheduler.run_pending()
+        return
+    scheduler.start()
+    logger.info("リマインダーを開始しました (予定 %d件)", len(scheduler))
+    try:
+        while True:
+            # 別プロセス (Streamlit アプリ) の変更はファイルの stamp で見る。変わっていれば読み直して予定を作り直す
+            time.sleep(STORE_CHECK_SECONDS)
+            shared.refresh_if_stale()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import cProfile
+import collections
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+
+# --- 定数定義 ---
+PROFILE_ENV = "ENTRY_CAL_PROFILE"     # 1 なら毎回の再実行を cProfile で記録する
+DEBUG_ENV = "ENTRY_CAL_DEBUG"         # 1 ならデバッグ欄 (段階ごとの所要時間) を表示する
+PROFILE_QUERY_PARAM = "profile"       # ?profile=1 でそのセッションだけ cProfile を有効にする
+DEBUG_QUERY_PARAM = "debug"           # ?debug=1 でそのセッションだけデバッグ欄を表示する
+ROLLING_WINDOW = 200                  # パーセンタイルの計算に使う直近の再実行の回数
+PROFILE_LINES = 30                    # デバッグ欄に表示する cProfile の関数の数
+
+logger = logging.getLogger("entry_cal.rerun")
+
+_active = threading.local() # スレッドごとに有効な cProfile (Streamlit はセッションごとに別スレッドで実行する)
+
+
+def flag_enabled(query_params, name, env):
+    """クエリパラメータ name か環境変数 env が有効 (1/true/yes/on) か"""
+    value = query_params.get(name) or os.environ.get(env, "")
+    if isinstance(value, list): # 古い Streamlit の experimental_get_query_params はリストを返す
+        value = value[0] if value else ""
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def percentile(sorted_values, q):
+    """ソート済みの値の q パーセンタイル (最近傍順位法)"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class RerunStats:
+    """プロセス内の全セッションの再実行について、段階ごとの所要時間を直近 window 回分保持する"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self.reruns = 0
+        self._lock = threading.Lock()
+        self._samples = {} # 段階 -> deque (秒)
+
+    def record(self, durations):
+        with self._lock:
+            self.reruns += 1
+            for phase, seconds in durations.items():
+                self._samples.setdefault(phase, collections.deque(maxlen=self.window)).append(seconds)
+
+    def record_phase(self, phase, seconds):
+        """再実行の回数に数えずに、段階 phase の所要時間を1回分記録する (フラグメントだけの再実行など)"""
+        with self._lock:
+            self._samples.setdefault(phase, collections.deque(maxlen=self.window)).append(seconds)
+
+    def summary(self):
+        """段階ごとの (段階, 件数, p50, p95, 最大) を記録された順に返す (単位は秒)"""
+        with self._lock:
+            samples = {phase: sorted(values) for phase, values in self._samples.items()}
+        return [(phase, len(values), percentile(values, 50), percentile(values, 95), values[-1])
+                for phase, values in samples.items()]
+
+
+def timed_fragment(stats, name, clock=time.perf_counter):
+    """関数 (st.fragment の本体) の実行時間を、段階 "fragment:名前" として stats に記録するデコレータ
+
+    フラグメントだけの再実行では RerunProfiler の計測が動かないので、その所要時間はここで記録する。
+    ページ全体の再実行の中でフラグメントが実行された分も同じ段階に記録される。
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.record_phase(f"fragment:{name}", clock() - started)
+        return wrapper
+    return decorate
+
+
+class RerunProfiler:
+    """1回の再実行の段階ごとの所要時間を計る
+
+    phase(名前) を呼ぶたびに直前の段階を締めて次の段階を始め、finish() で全体を RerunStats に記録して
+    構造化ログ (JSON) を出す。st.rerun() などでスクリプトが途中で終わった再実行は記録されない。
+    profile=True なら再実行全体を cProfile で記録する。
+    """
+
+    def __init__(self, stats, profile=False, clock=time.perf_counter):
+        self.stats = stats
+        self.durations = {}
+        self._clock = clock
+        self._started = clock()
+        self._phase = None
+        self._phase_started = self._started
+        self._profile_text = None
+        self._profiler = None
+        previous = getattr(_active, 'profiler', None)
+        if previous is not None: # 前回の再実行が途中で終わって止め損ねたもの
+            previous.disable()
+            _active.profiler = None
+        if profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            _active.profiler = self._profiler
+
+    def phase(self, name):
+        """直前の段階を締めて、段階 name を始める"""
+        now = self._clock()
+        if self._phase is not None:
+            self.durations[self._phase] = self.durations.get(self._phase, 0.0) + (now - self._phase_started)
+        self._phase = name
+        self._phase_started = now
+
+    def finish(self):
+        """計測を終えて記録し、{段階: 秒} (total を含む) を返す"""
+        self.phase(None)
+        self.durations['total'] = self._clock() - self._started
+        if self._profiler is not None:
+            self._profiler.disable()
+            _active.profiler = None
+            buffer = io.StringIO()
+            pstats.Stats(self._profiler, stream=buffer).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            self._profile_text = buffer.getvalue()
+        self.stats.record(self.durations)
+        logger.info(json.dumps({
+            'event': 'rerun',
+            'total_ms': round(self.durations['total'] * 1e3, 2),
+            'phases_ms': {phase: round(seconds * 1e3, 2) for phase, seconds in self.durations.items() if phase != 'total'},
+            'profiled': self._profiler is not None,
+        }, ensure_ascii=False))
+        return self.durations
+
+    @property
+    def profile_text(self):
+        """cProfile の結果 (累積時間の多い順)。記録していなければ None"""
+        return self._profile_text
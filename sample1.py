@@ -1,7 +1,7 @@
 import datetime
 import streamlit as st
 import streamlit_calendar as st_calendar
-from collections import Counter
+from event_index import DateOccupancyIndex
 
 # ---------------- セッション初期化 ----------------
 DEFAULT_NAME = "イベント1"
@@ -11,10 +11,13 @@ for key, default in {
     'submitted': False,
     'edit_mode': False,
     'edit_idx': None,
-    'cal_ver': 0,
+    'cal_ver': 0,             # イベント一覧の version (登録・更新のたびに進める)
     'selected_title': None,  # ← 直近クリックした元タイトル
 }.items():
     st.session_state.setdefault(key, default)
+# 日付ごとのイベント数 (登録・更新のたびに差分更新する)
+if 'date_occupancy' not in st.session_state:
+    st.session_state.date_occupancy = DateOccupancyIndex(capacity=1)
 
 # ---------------- お知らせ ----------------
 st.subheader("🔔 お知らせ")
@@ -36,10 +39,9 @@ with st.container(border=True):
         st.divider()
         st.markdown("##### イベント日の重複チェック")
         dup_flag = False
-        for d, c in Counter(e['date'] for e in st.session_state.event_list).items():
-            if c >= 2:
-                st.warning(f"⚠️ **重複注意:** {d.strftime('%Y年%m月%d日')} に {c}件のイベント")
-                dup_flag = True
+        for d, c in st.session_state.date_occupancy.over_capacity():
+            st.warning(f"⚠️ **重複注意:** {d.strftime('%Y年%m月%d日')} に {c}件のイベント")
+            dup_flag = True
         if not dup_flag:
             st.success("✅ 日付が重複しているイベントはありません。")
 
@@ -98,12 +100,14 @@ with st.form("event_form"):
 
 # ---------------- ボタン処理 ----------------
 if register_btn:
-    st.session_state.event_list.append({
+    new_ev = {
         'title': event_name,
         'date': event_date,
         'deadline': event_deadline,
         'description': event_description
-    })
+    }
+    st.session_state.event_list.append(new_ev)
+    st.session_state.date_occupancy.on_add(new_ev)
     st.success(f"'{event_name}' を登録しました！")
     st.session_state.should_clear = True
     st.session_state.cal_ver += 1
@@ -111,12 +115,14 @@ if register_btn:
 
 if update_btn and st.session_state.edit_mode and st.session_state.edit_idx is not None:
     idx = st.session_state.edit_idx
-    st.session_state.event_list[idx] = {
+    new_ev = {
         'title': event_name,
         'date': event_date,
         'deadline': event_deadline,
         'description': event_description
     }
+    st.session_state.date_occupancy.on_update(st.session_state.event_list[idx], new_ev)
+    st.session_state.event_list[idx] = new_ev
     st.success(f"'{event_name}' を更新しました！")
     st.session_state.edit_mode = False
     st.session_state.edit_idx = None
@@ -146,16 +152,23 @@ def make_event(ev, idx, for_deadline=False):
     }
     return data
 
-deadline_events = [make_event(e, i, True) for i, e in enumerate(st.session_state.event_list)]
+# カレンダー用のイベント辞書は version が変わったときだけ作り直す
+if st.session_state.get('cal_payload_ver') != st.session_state.cal_ver:
+    st.session_state.cal_payloads = (
+        [make_event(e, i, True) for i, e in enumerate(st.session_state.event_list)],
+        [make_event(e, i, False) for i, e in enumerate(st.session_state.event_list)],
+    )
+    st.session_state.cal_payload_ver = st.session_state.cal_ver
+deadline_events, date_events = st.session_state.cal_payloads
+
 with col1:
     st.subheader('申込締切')
     click_deadline = st_calendar.calendar(deadline_events, {
         'headerToolbar': {'left':'prev,next today','center':'title','right':'dayGridMonth,timeGridWeek,listWeek'},
         'initialView':'dayGridMonth',
         'height':'auto'
-    }, key=f'dl_cal_{st.session_state.cal_ver}')
+    }, key='dl_cal')
 
-date_events = [make_event(e, i, False) for i, e in enumerate(st.session_state.event_list)]
 with col2:
     st.subheader('イベント日')
     click_date = st_calendar.calendar(date_events, {
@@ -163,7 +176,7 @@ with col2:
         'initialView':'dayGridMonth',
         'selectable': True,
         'height':'auto'
-    }, key=f'dt_cal_{st.session_state.cal_ver}')
+    }, key='dt_cal')
 
 # ---------------- クリック処理 ----------------
 
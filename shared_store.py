@@ -0,0 +1,401 @@
+import bisect
+import contextlib
+import datetime
+import heapq
+import threading
+
+from event_collection import EventCollection
+from event_columns import EventColumns
+from event_index import DateOccupancyIndex, IntervalIndex, SortedDateIndex
+from event_model import as_event, day
+from event_recurrence import SERIES_FIELD, RecurrenceIndex, is_recurring, series_id_of
+from event_search import SEARCH_PAGE_SIZE, SearchIndex
+
+INDEX_REBUILD_MIN_CHANGES = 1000 # これより多い変更をまとめて反映するときは索引を作り直すことがある
+RECURRENCE_HORIZON_DAYS = 366    # お知らせで繰り返しのイベントを展開する、今日から前後の日数
+
+
+def load_events(backend):
+    """ストレージから読み込んだレコードを Event のリストにする (不正なレコードは除外)"""
+    return backend.load_events()
+
+
+class SharedEventStore:
+    """プロセス内の全セッションで共有するイベント一覧
+
+    ストレージからの読み込みはプロセスで1回だけ行い、各セッションは events() で
+    同じスナップショットを参照する。変更はストレージに保存してから共有の一覧に反映され、
+    version が進むので、他のセッションは次の再実行で読み直しなしに変更を見られる。
+    別プロセスがファイルを書き換えた場合は refresh_if_stale() が stamp の変化を見て読み直す。
+
+    イベントは変更できない Event で、更新は差し替えになる (コピーオンライト) ので、セッションが手元に
+    持っている古いスナップショットやイベントが途中で変わることはない。
+    """
+
+    def __init__(self, backend, loader=None, daily_capacity=1):
+        self.backend = backend
+        self._queries = backend if getattr(backend, 'indexed_queries', False) else None
+        self._loader = loader or (lambda: load_events(backend))
+        self._lock = threading.RLock()
+        self._events = EventCollection()
+        self._snapshot = ()
+        self._snapshot_version = -1
+        self._columns = (None, {}) # ((version, 今日), 項目 -> EventColumns)
+        self._cache = (None, {})   # (version, キー -> cached() で作り置きした値)
+        self._stamp = None
+        self._pending_ops = None # batch() の中で保存を待っている変更
+        self._pending_index_changes = None # batch() の中で索引への反映を待っている変更
+        self.version = 0
+        # イベントの変更に合わせて差分更新する索引
+        self.indexes = {
+            'deadline': SortedDateIndex('deadline'),
+            'occupancy': DateOccupancyIndex(capacity=daily_capacity), # 1日あたりのイベント数
+            'interval': IntervalIndex(),                              # 複数日イベントの期間
+            'search': SearchIndex(),                                  # タイトルと説明の全文検索
+            'recurrence': RecurrenceIndex(),                          # 繰り返しのイベント (期間ごとに展開する)
+        }
+        self.reload()
+
+    # --- 読み込み ---
+    def reload(self):
+        """ストレージから読み直す"""
+        with self._lock:
+            stamp = self.backend.stamp()
+            self._events = EventCollection(map(as_event, self._loader()))
+            self._rebuild_indexes()
+            self._stamp = stamp
+            self.version += 1
+
+    def add_index(self, name, index):
+        """索引 (EventIndex) を後から登録する。今の一覧から作り、以後は変更のたびに差分更新される"""
+        with self._lock:
+            self._rebuild_indexes([index])
+            self.indexes[name] = index
+
+    def refresh_if_stale(self):
+        """ストレージが外部から変更されていれば読み直し、読み直したかどうかを返す"""
+        with self._lock:
+            stamp = self.backend.stamp()
+            if stamp is None or stamp == self._stamp:
+                return False
+            self.reload()
+            return True
+
+    def events(self):
+        """現在のイベント一覧 (変更されない tuple) を返す。同じ version の間は全セッションで同じオブジェクト"""
+        with self._lock:
+            if self._snapshot_version != self.version:
+                self._snapshot = tuple(self._events)
+                self._snapshot_version = self.version
+            return self._snapshot
+
+    def columns(self, today, field='deadline'):
+        """現在のイベント一覧の列 (EventColumns) を返す。同じ version・今日・項目の間は作り直さない
+
+        繰り返しのイベントは元のイベントの代わりに、field の日付が今日から前後 RECURRENCE_HORIZON_DAYS 日以内の
+        回を入れる (deadline_overview と同じ数え方)。
+        """
+        with self._lock:
+            if self._columns[0] != (self.version, today):
+                self._columns = ((self.version, today), {})
+            cache = self._columns[1]
+            columns = cache.get(field)
+            if columns is None:
+                events = self.events()
+                series = self.indexes['recurrence'].series
+                if series:
+                    horizon = datetime.timedelta(days=RECURRENCE_HORIZON_DAYS)
+                    occurrences = self.indexes['recurrence'].occurrences(field, today - horizon, today + horizon)
+                    events = [event for event in events if event.id not in series] + occurrences
+                columns = cache[field] = EventColumns(events)
+            return columns
+
+    def cached(self, key, build):
+        """key ごとに build() の結果を version が変わるまで使い回す (全イベントから作る表示内容の作り置き用)"""
+        with self._lock:
+            if self._cache[0] != self.version:
+                self._cache = (self.version, {})
+            cache = self._cache[1]
+            if key not in cache:
+                cache[key] = build()
+            return cache[key]
+
+    def get(self, event_id):
+        """id でイベントを取得する (O(1))。繰り返しの各回の id なら元のイベントを返す"""
+        with self._lock:
+            event = self._events.get(event_id)
+            if event is None and event_id:
+                event = self._events.get(series_id_of(event_id))
+            return event
+
+    def position(self, event_id):
+        """events() の並びでの位置を返す (O(log n))。存在しなければ None"""
+        with self._lock:
+            return self._events.position(event_id)
+
+    def deadline_overview(self, today, offset=0, limit=None):
+        """締切情報をまとめて返す: (締切済の件数, 締切前の件数, 締切前のイベントを締切順に offset から limit 件)
+
+        繰り返しのイベントは、締切日が今日から前後 RECURRENCE_HORIZON_DAYS 日以内の回を数える。
+        """
+        with self._lock:
+            horizon = datetime.timedelta(days=RECURRENCE_HORIZON_DAYS)
+            past = self.indexes['recurrence'].occurrences('deadline', today - horizon, today - datetime.timedelta(days=1))
+            future = self.indexes['recurrence'].occurrences('deadline', today, today + horizon)
+            expired, upcoming_count = self._deadline_counts(today)
+            upcoming_count += len(future)
+            if not future:
+                return expired + len(past), upcoming_count, self._upcoming(today, offset, limit)
+            # 索引から offset + limit 件を取り出して、繰り返しの各回と締切順に合わせる
+            head = self._upcoming(today, 0, None if limit is None else offset + limit)
+            merged = heapq.merge(head, future, key=lambda event: event['deadline'])
+            upcoming = list(merged)[offset:None if limit is None else offset + limit]
+            return expired + len(past), upcoming_count, upcoming
+
+    def recently_expired(self, today, limit=None):
+        """締切済のイベントを締切の新しい順に最大 limit 件返す"""
+        with self._lock:
+            expired = self._expired(today, limit)
+            horizon = datetime.timedelta(days=RECURRENCE_HORIZON_DAYS)
+            past = self.indexes['recurrence'].occurrences('deadline', today - horizon, today - datetime.timedelta(days=1))
+            if not past:
+                return expired
+            merged = heapq.merge(expired, reversed(past), key=lambda event: event['deadline'], reverse=True)
+            return list(merged)[:limit]
+
+    def events_in_window(self, field, start, end):
+        """カレンダーの表示期間 start 〜 end (両端を含む) に入るイベントを返す
+
+        field='date' は複数日イベントも期間が重なれば含める (区間木)、field='deadline' は締切日の索引を使う。
+        ストレージが索引を持っていれば、期間内の日付のイベントはストレージに問い合わせ、区間木からは
+        期間より前に始まって期間に掛かる複数日イベントだけを取る。
+        """
+        if field not in ('date', 'deadline'):
+            raise ValueError(f"unknown date field: {field}")
+        with self._lock:
+            if self._queries is not None:
+                events = []
+                if field == 'date':
+                    before = start.toordinal()
+                    events = [event for event in map(self._events.get, self.indexes['interval'].overlapping(start, start))
+                              if event.date_ordinal < before]
+                events += self._resolve(self._queries.events_in_range(start, end, field))
+            elif field == 'date':
+                events = [self._events.get(event_id) for event_id in self.indexes['interval'].overlapping(start, end)]
+            else:
+                events = [self._events.get(event_id) for event_id in self.indexes['deadline'].ids_between(start, end)]
+            # 繰り返しのイベントは表示期間の分だけ展開する
+            return events + self.indexes['recurrence'].occurrences(field, start, end)
+
+    # ストレージが索引を持っていれば (SqliteStore) 締切順・日付の問い合わせはストレージで行い、
+    # 無ければ共有の一覧の索引で行う。どちらも繰り返しのイベントは含まない
+    def _deadline_counts(self, today):
+        """(締切日が today より前の件数, today 以降の件数)"""
+        if self._queries is not None:
+            return self._queries.deadline_counts(today)
+        index = self.indexes['deadline']
+        expired = index.count_before(today)
+        return expired, len(index) - expired
+
+    def _upcoming(self, today, offset, limit):
+        if self._queries is not None:
+            return self._resolve(self._queries.upcoming_deadlines(today, limit, offset))
+        return [self._events.get(event_id) for event_id in self.indexes['deadline'].ids_from(today, offset, limit)]
+
+    def _expired(self, today, limit):
+        if self._queries is not None:
+            return self._resolve(self._queries.expired_deadlines(today, limit))
+        return [self._events.get(event_id) for event_id in self.indexes['deadline'].ids_before(today, limit)]
+
+    def _resolve(self, records):
+        """ストレージが返したレコードを共有の一覧の Event にする (まだ読み直していない外部の変更の分は除く)"""
+        return [event for event in map(self._events.get, (record['id'] for record in records)) if event is not None]
+
+    def search(self, query, limit=SEARCH_PAGE_SIZE, offset=0):
+        """タイトルと説明で検索し、(一致した件数, 点数の高い順に offset から limit 件のイベント) を返す"""
+        with self._lock:
+            total, ids = self.indexes['search'].search(query, limit, offset)
+            return total, [self._events.get(event_id) for event_id in ids]
+
+    def over_capacity_dates(self):
+        """イベント数が1日の定員を超えている (日付, 件数) を日付順に返す"""
+        with self._lock:
+            occupancy = self.indexes['occupancy']
+            if self._queries is not None:
+                return [(datetime.date.fromisoformat(date_str), count)
+                        for date_str, count in self._queries.duplicate_dates(occupancy.capacity + 1).items()]
+            return occupancy.over_capacity()
+
+    def clashing_events(self, start, end=None, exclude_id=None):
+        """期間 start 〜 end と重なるイベントを返す (exclude_id のイベントは除く)"""
+        with self._lock:
+            ids = self.indexes['interval'].overlapping(start, end or start)
+            clashing = [self._events.get(event_id) for event_id in ids if event_id != exclude_id]
+            clashing += [occurrence for occurrence in self.indexes['recurrence'].occurrences('date', start, end or start)
+                         if occurrence[SERIES_FIELD] != exclude_id]
+            return clashing
+
+    def multi_day_clash_counts(self):
+        """期間が重なる他のイベントがある複数日イベントと、その件数の [(イベント, 件数)] を開始日順に返す
+
+        version ごとに作り置きするので、返したリストは変更しないこと。
+        """
+        return self.cached('multi_day_clash_counts', self._multi_day_clash_counts)
+
+    def _multi_day_clash_counts(self):
+        """区間木を開始日順に1回辿り、開始日と終了日のソート済みの列から重なりの数を二分探索で数える
+
+        期間 s 〜 e と重なるのは「開始日が e 以前」の項目から「終了日が s より前」の項目を除いたもの
+        (後者は必ず前者に含まれる) なので、重なりの組を列挙せずに O(n log n) で数えられる。
+        繰り返しのイベントは、複数日イベントの期間全体に入る回を1回だけ展開して加える。
+        """
+        with self._lock:
+            interval = self.indexes['interval']
+            if not interval.multi_day_ids:
+                return []
+            spans = list(interval.spans())
+            starts = [start for start, _, _ in spans]
+            ends = [end for _, end, _ in spans]
+            multi_day = [span for span in spans if span[1] > span[0]]
+            if self.indexes['recurrence'].series:
+                first = multi_day[0][0]
+                last = max(end for _, end, _ in multi_day)
+                for occurrence in self.indexes['recurrence'].occurrences('date', day(first), day(last)):
+                    starts.append(occurrence.date_ordinal)
+                    ends.append(occurrence.end_date_ordinal or occurrence.date_ordinal)
+                starts.sort()
+            ends.sort()
+            counts = []
+            for start, end, event_id in multi_day:
+                count = bisect.bisect_right(starts, end) - bisect.bisect_left(ends, start) - 1 # 自分自身を除く
+                if count:
+                    counts.append((self._events.get(event_id), count))
+            return counts
+
+    def multi_day_clashes(self, limit=None):
+        """期間が重なる他のイベントがある複数日イベントを開始日順に最大 limit 件、(イベント, [重なるイベント]) で返す
+
+        重なるイベントの一覧は返す分だけ clashing_events で作る。version ごとに作り置きする。
+        """
+        def build():
+            return [(event, self.clashing_events(event['date'], event['end_date'], exclude_id=event['id']))
+                    for event, _ in self.multi_day_clash_counts()[:limit]]
+        return self.cached(('multi_day_clashes', limit), build)
+
+    # --- 書き込み ---
+    def apply(self, ops):
+        """変更の列をストレージに保存し、共有の一覧に反映する
+
+        batch() の中では保存は行わず、batch() を抜けるときにまとめて1回で保存する。
+        追加・更新のイベントは辞書でもよく、Event にしてから保存する (不正な日付は InvalidEventError)。
+        """
+        ops = [(op, as_event(payload) if op in ('add', 'update') else payload) for op, payload in ops]
+        with self._lock:
+            changes, applied = self._apply_in_memory(ops)
+            if self._pending_ops is not None:
+                self._pending_index_changes.extend(changes)
+                self._pending_ops.extend(applied)
+                return
+            if not applied:
+                return
+            try:
+                self.backend.apply(applied)
+            except BaseException:
+                self.reload() # 保存できなかった変更を一覧から取り消す
+                raise
+            self._update_indexes(changes)
+            # 自分の書き込みで読み直しが起きないように stamp を取り直す
+            self._stamp = self.backend.stamp()
+            self.version += 1
+
+    @contextlib.contextmanager
+    def batch(self):
+        """まとめて変更するためのコンテキストマネージャ
+
+        中で行った変更はすぐに一覧に反映され、抜けるときに索引の更新と1回の保存 (backend.apply) が行われる。
+        索引は batch() を抜けるまで更新されないので、中で索引を使う問い合わせをしてはいけない。
+        保存に失敗した場合や中で例外が起きた場合はストレージから読み直して、一覧を保存済みの内容に戻す
+        (まだ何も変更していなければ読み直さないので、中で確認をして例外で抜けてもよい)。
+        """
+        with self._lock:
+            if self._pending_ops is not None: # 入れ子の batch は外側にまとめる
+                yield self
+                return
+            self._pending_ops = []
+            self._pending_index_changes = []
+            try:
+                yield self
+                ops, self._pending_ops = self._pending_ops, None
+                changes, self._pending_index_changes = self._pending_index_changes, None
+                if ops:
+                    self.backend.apply(ops)
+                    self._update_indexes(changes)
+                    self._stamp = self.backend.stamp()
+                    self.version += 1
+            except BaseException:
+                pending, self._pending_ops = self._pending_ops, None
+                self._pending_index_changes = None
+                if pending is None or pending: # 一覧に反映済みの変更があるときだけ読み直して取り消す
+                    self.reload()
+                raise
+
+    def _apply_in_memory(self, ops):
+        """一覧に変更を反映し、(索引に渡す (変更前, 変更後) の列, 実際に反映した変更の列) を返す
+
+        (変更前, 変更後) は追加なら変更前が、削除なら変更後が None。存在しない id の更新と削除は反映しないので、
+        実際に反映した変更の列だけを保存する (削除済みのイベントが更新でストレージに戻らないようにする)。
+        """
+        changes = []
+        applied = []
+        for op, payload in ops:
+            if op in ('add', 'update'):
+                old = self._events.get(payload['id'])
+                if old is None and op == 'update':
+                    continue
+                self._events.add(payload) # 既存の id なら位置を保って置き換わる
+                changes.append((old, payload))
+            elif op == 'delete':
+                old = self._events.delete(payload)
+                if old is None:
+                    continue
+                changes.append((old, None))
+            else:
+                raise ValueError(f"unknown op: {op}")
+            applied.append((op, payload))
+        return changes, applied
+
+    def _rebuild_indexes(self, indexes=None):
+        # 繰り返しのイベントは、それを扱う索引 (recurring = True) にだけ渡す
+        plain = self._events
+        if any(map(is_recurring, self._events)):
+            plain = [event for event in self._events if not is_recurring(event)]
+        for index in indexes or self.indexes.values():
+            index.rebuild(self._events if index.recurring else plain)
+
+    def _update_indexes(self, changes):
+        # 一括登録などで変更が全体に比べて多いときは、1件ずつ更新するより作り直す方が速い
+        if len(changes) > INDEX_REBUILD_MIN_CHANGES and len(changes) * 4 > len(self._events):
+            self._rebuild_indexes()
+            return
+        for old, new in changes:
+            plain_old = None if old is None or is_recurring(old) else old
+            plain_new = None if new is None or is_recurring(new) else new
+            for index in self.indexes.values():
+                before, after = (old, new) if index.recurring else (plain_old, plain_new)
+                if before is None and after is None:
+                    continue
+                if before is None:
+                    index.on_add(after)
+                elif after is None:
+                    index.on_delete(before)
+                else:
+                    index.on_update(before, after)
+
+    def add(self, event):
+        self.apply([('add', event)])
+
+    def update(self, event):
+        self.apply([('update', event)])
+
+    def delete(self, event_id):
+        self.apply([('delete', event_id)])
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+from event_recurrence import RRULE_FIELD
+from event_store import DATA_FILE, EventStore, JournalStore, serialize_event
+
+# --- 定数定義 ---
+SQLITE_FILE = "events_data.db" # SQLite バックエンドのデータベースファイル名
+
+# イベントの基本項目。それ以外の項目は extra 列に JSON でまとめて保存する
+_COLUMNS = ('id', 'title', 'date', 'deadline', 'description')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT, -- 登録順を保つための連番
+    id          TEXT NOT NULL UNIQUE,
+    title       TEXT,
+    date        TEXT,
+    deadline    TEXT,
+    description TEXT,
+    extra       TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_date ON events (date);
+CREATE INDEX IF NOT EXISTS idx_events_deadline ON events (deadline);
+"""
+
+
+def _to_row(event):
+    record = serialize_event(event)
+    extra = {k: v for k, v in record.items() if k not in _COLUMNS}
+    return (record['id'], record.get('title'), record.get('date'), record.get('deadline'),
+            record.get('description'), json.dumps(extra, ensure_ascii=False) if extra else None)
+
+
+def _from_row(row):
+    record = {'id': row[0], 'title': row[1], 'date': row[2], 'deadline': row[3], 'description': row[4]}
+    if row[5]:
+        record.update(json.loads(row[5]))
+    return record
+
+
+_SELECT = "SELECT id, title, date, deadline, description, extra FROM events"
+# 繰り返しのイベント (extra に rrule を持つ行) を除く条件。各回は SharedEventStore が展開する
+_PLAIN = f"COALESCE(json_extract(extra, '$.{RRULE_FIELD}'), '') = ''"
+
+
+class SqliteStore(EventStore):
+    """SQLite によるイベントストレージ
+
+    date / deadline にインデックスを張っているので、締切順・期間指定・日付の重複の
+    問い合わせは全件走査にならない (indexed_queries)。更新・削除は1行単位の UPDATE / DELETE になる。
+    """
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        # Streamlit はセッションごとに別スレッドでスクリプトを実行するので、接続はロックで守って共有する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def load_records(self):
+        with self._lock:
+            return [_from_row(row) for row in self._conn.execute(_SELECT + " ORDER BY seq")]
+
+    def apply(self, ops):
+        with self._lock, self._conn:
+            for op, payload in ops:
+                if op == 'add':
+                    self._conn.execute(
+                        "INSERT INTO events (id, title, date, deadline, description, extra) VALUES (?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT(id) DO UPDATE SET title=excluded.title, date=excluded.date,"
+                        " deadline=excluded.deadline, description=excluded.description, extra=excluded.extra",
+                        _to_row(payload))
+                elif op == 'update':
+                    row = _to_row(payload)
+                    self._conn.execute(
+                        "UPDATE events SET title=?, date=?, deadline=?, description=?, extra=? WHERE id=?",
+                        row[1:] + row[:1])
+                elif op == 'delete':
+                    self._conn.execute("DELETE FROM events WHERE id=?", (payload,))
+                else:
+                    raise ValueError(f"unknown op: {op}")
+
+    def save_all(self, events):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM events")
+            self._conn.executemany(
+                "INSERT INTO events (id, title, date, deadline, description, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                (_to_row(event) for event in events))
+
+    def stamp(self):
+        # data_version は他の接続 (別プロセス) がコミットするたびに変わる
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    # --- 問い合わせ (インデックスを使う) ---
+    indexed_queries = True
+
+    def _select(self, where, order, params, limit=None, offset=0):
+        sql = f"{_SELECT} WHERE {where} AND {_PLAIN} ORDER BY {order} LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, -1 if limit is None else limit, offset)).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def upcoming_deadlines(self, today, limit=None, offset=0):
+        return self._select("deadline >= ?", "deadline, seq", (today.isoformat(),), limit, offset)
+
+    def expired_deadlines(self, today, limit=None):
+        return self._select("deadline < ?", "deadline DESC, seq DESC", (today.isoformat(),), limit)
+
+    def deadline_counts(self, today):
+        sql = (f"SELECT COUNT(*) FROM events WHERE deadline < ? AND {_PLAIN}"
+               f" UNION ALL SELECT COUNT(*) FROM events WHERE deadline >= ? AND {_PLAIN}")
+        with self._lock:
+            (expired,), (upcoming,) = self._conn.execute(sql, (today.isoformat(),) * 2).fetchall()
+        return expired, upcoming
+
+    def events_in_range(self, start, end, field='date'):
+        if field not in ('date', 'deadline'):
+            raise ValueError(f"unknown date field: {field}")
+        return self._select(f"{field} BETWEEN ? AND ?", f"{field}, seq", (start.isoformat(), end.isoformat()))
+
+    def duplicate_dates(self, min_count=2):
+        sql = (f"SELECT date, COUNT(*) FROM events WHERE date IS NOT NULL AND {_PLAIN}"
+               " GROUP BY date HAVING COUNT(*) >= ? ORDER BY date")
+        with self._lock:
+            return dict(self._conn.execute(sql, (min_count,)).fetchall())
+
+
+def migrate_json_to_sqlite(json_path=DATA_FILE, db_path=SQLITE_FILE, force=False):
+    """既存の events_data.json (とジャーナル) の内容を SQLite に移行し、移行した件数を返す
+
+    移行先にすでにデータがある場合は force=True でない限り何もしない。
+    """
+    store = SqliteStore(db_path)
+    if store.count() and not force:
+        return 0
+    records = JournalStore(json_path).load_records()
+    store.save_all(records)
+    return len(records)
+
+
+def open_sqlite_store(path=SQLITE_FILE, json_path=DATA_FILE):
+    """SQLite ストアを開く。データベースがまだ無く JSON ファイルがあれば初回に移行する"""
+    if not os.path.exists(path) and os.path.exists(json_path):
+        migrate_json_to_sqlite(json_path, path)
+    return SqliteStore(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="events_data.json を SQLite データベースに移行する")
+    parser.add_argument("json_path", nargs="?", default=DATA_FILE)
+    parser.add_argument("db_path", nargs="?", default=SQLITE_FILE)
+    parser.add_argument("--force", action="store_true", help="移行先のデータを置き換える")
+    args = parser.parse_args()
+    migrated = migrate_json_to_sqlite(args.json_path, args.db_path, force=args.force)
+    print(f"{migrated} 件のイベントを {args.db_path} に移行しました。")
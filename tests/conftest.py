@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import JournalStore  # noqa: E402
+from shared_store import SharedEventStore  # noqa: E402
+
+
+def make_record(index, **fields):
+    """テスト用のイベントレコード (id は event-<番号>)"""
+    return {'id': f"event-{index:03d}", 'title': f"イベント {index}", 'date': f"2026-04-{index % 28 + 1:02d}",
+            'deadline': f"2026-04-{index % 28 + 1:02d}", 'description': "", **fields}
+
+
+@pytest.fixture
+def journal_store(tmp_path):
+    """一時ディレクトリに置いたジャーナル方式のストレージ (コンパクションは自動では走らない)"""
+    return JournalStore(str(tmp_path / "events_data.json"), compact_threshold=float('inf'))
+
+
+@pytest.fixture
+def shared_store(journal_store):
+    return SharedEventStore(journal_store)
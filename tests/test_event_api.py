@@ -0,0 +1,163 @@
+import json
+import os
+
+import pytest
+
+from conftest import make_record
+from event_api import EventApi
+
+
+@pytest.fixture
+def api(shared_store):
+    shared_store.apply([('add', make_record(i)) for i in range(5)])
+    return EventApi(shared_store)
+
+
+def call(api, method, path, query=None, headers=None, body=None):
+    """(ステータス, ヘッダ, JSON の本文 (無ければ None)) を返す"""
+    status, response_headers, chunks = api.handle(method, path, query, headers,
+                                                  json.dumps(body).encode("utf-8") if body is not None else b"")
+    data = b"".join(chunks)
+    return status, response_headers, json.loads(data) if data else None
+
+
+# --- 一覧のページ送り ---
+def test_list_pages_follow_cursor_in_insertion_order(api):
+    ids, cursor = [], None
+    while True:
+        status, _, data = call(api, "GET", "/events", {'limit': "2", **({'cursor': cursor} if cursor else {})})
+        assert status == 200
+        assert data['total'] == 5
+        ids += [record['id'] for record in data['events']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert ids == [make_record(i)['id'] for i in range(5)]
+
+
+def test_list_cursor_continues_after_deleted_event(api):
+    _, _, first = call(api, "GET", "/events", {'limit': "2"})
+    assert call(api, "DELETE", "/events/event-001")[0] == 204
+    _, _, second = call(api, "GET", "/events", {'limit': "2", 'cursor': first['next_cursor']})
+    assert [record['id'] for record in second['events']] == ["event-002", "event-003"]
+
+
+@pytest.mark.parametrize('cursor', ["!!!", "WzEsMl0", "WyJhIiwtMV0"]) # 不正な base64, [1, 2], ["a", -1]
+def test_list_rejects_malformed_cursor(api, cursor):
+    status, _, data = call(api, "GET", "/events", {'cursor': cursor})
+    assert status == 400
+    assert 'error' in data
+
+
+def test_range_pages_follow_cursor_in_date_order(api):
+    ids, cursor = [], None
+    query = {'field': "date", 'start': "2026-04-02", 'end': "2026-04-05", 'limit': "3"}
+    while True:
+        _, _, data = call(api, "GET", "/events", {**query, **({'cursor': cursor} if cursor else {})})
+        ids += [record['id'] for record in data['events']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert ids == ["event-001", "event-002", "event-003", "event-004"]
+
+
+# --- ETag / If-None-Match ---
+def test_list_returns_304_until_data_changes(api):
+    status, headers, _ = call(api, "GET", "/events")
+    assert status == 200
+    etag = headers['ETag']
+    status, _, data = call(api, "GET", "/events", headers={'If-None-Match': etag})
+    assert (status, data) == (304, None)
+
+    call(api, "POST", "/events", body=make_record(10))
+    status, headers, data = call(api, "GET", "/events", headers={'If-None-Match': etag})
+    assert status == 200
+    assert headers['ETag'] != etag
+    assert data['total'] == 6
+
+
+def test_get_returns_304_for_matching_etag(api):
+    _, headers, data = call(api, "GET", "/events/event-000")
+    assert data['event']['title'] == "イベント 0"
+    assert call(api, "GET", "/events/event-000", headers={'If-None-Match': headers['ETag']})[0] == 304
+
+
+# --- If-Match ---
+def test_update_with_stale_if_match_is_rejected(api, shared_store):
+    _, headers, _ = call(api, "GET", "/events/event-000")
+    etag = headers['ETag']
+    assert call(api, "PUT", "/events/event-000", body=make_record(0, title="他のセッション"))[0] == 200
+
+    status, _, _ = call(api, "PUT", "/events/event-000", headers={'If-Match': etag}, body=make_record(0, title="古い"))
+    assert status == 412
+    assert shared_store.get("event-000")['title'] == "他のセッション"
+    assert call(api, "DELETE", "/events/event-000", headers={'If-Match': etag})[0] == 412
+    assert shared_store.get("event-000") is not None
+
+
+def test_update_with_current_if_match_is_saved(api, shared_store):
+    _, headers, _ = call(api, "GET", "/events/event-000")
+    status, response_headers, data = call(api, "PUT", "/events/event-000", headers={'If-Match': headers['ETag']},
+                                          body=make_record(0, title="変更後"))
+    assert status == 200
+    assert data['event']['title'] == "変更後"
+    assert shared_store.get("event-000")['title'] == "変更後"
+    # 返された ETag は次の GET と同じなので、続けて条件付きで更新できる
+    assert call(api, "GET", "/events/event-000")[1]['ETag'] == response_headers['ETag']
+
+
+# --- 一括変更 ---
+def test_bulk_applies_all_ops_in_order(api, shared_store):
+    status, _, data = call(api, "POST", "/events/bulk", body={'ops': [
+        {'op': 'add', 'event': make_record(10)},
+        {'op': 'update', 'event': make_record(10, title="追加してから変更")},
+        {'op': 'delete', 'id': "event-000"},
+    ]})
+    assert status == 200
+    assert data['applied'] == 3
+    assert shared_store.get("event-010")['title'] == "追加してから変更"
+    assert shared_store.get("event-000") is None
+
+
+def test_bulk_with_invalid_op_changes_nothing(api, shared_store, journal_store):
+    version = shared_store.version
+    journal_size = os.path.getsize(journal_store.journal_path)
+    status, _, data = call(api, "POST", "/events/bulk", body={'ops': [
+        {'op': 'add', 'event': make_record(10)},
+        {'op': 'delete', 'id': "event-000"},
+        {'op': 'update', 'event': make_record(99)},          # 無い id
+        {'op': 'add', 'event': make_record(11, date="4月1日")}, # 不正な日付
+        {'op': 'delete', 'id': "event-000"},                # 同じ列の中で削除済み
+    ]})
+    assert status == 400
+    assert [(error['index'], error['status']) for error in data['errors']] == [(2, 404), (3, 400), (4, 404)]
+    assert shared_store.version == version
+    assert shared_store.get("event-010") is None
+    assert shared_store.get("event-000") is not None
+    assert os.path.getsize(journal_store.journal_path) == journal_size
+
+
+# --- 値の型の検証 ---
+@pytest.mark.parametrize('fields', [
+    {'title': {'ja': "タイトル"}}, {'title': ["タイトル"]}, {'description': 5},
+    {'date': 5}, {'date': 99999999}, {'deadline': 1.5}, {'end_date': 7}, {'rrule': 5},
+])
+def test_create_rejects_values_of_wrong_type(api, shared_store, journal_store, fields):
+    journal_size = os.path.getsize(journal_store.journal_path)
+    status, _, data = call(api, "POST", "/events", body=make_record(10, **fields))
+    assert status == 400
+    assert data['errors'][0]['field'] == next(iter(fields))
+    assert shared_store.get("event-010") is None
+    assert os.path.getsize(journal_store.journal_path) == journal_size
+
+
+def test_update_and_bulk_reject_values_of_wrong_type(api, shared_store):
+    assert call(api, "POST", "/events", body=make_record(10, id=5))[0] == 400
+    assert call(api, "PUT", "/events/event-000", body=make_record(0, title=["変更後"]))[0] == 400
+    status, _, data = call(api, "POST", "/events/bulk", body={'ops': [{'op': 'add', 'event': make_record(10)},
+                                                                      {'op': 'add', 'event': make_record(11, rrule=5)}]})
+    assert status == 400
+    assert [(error['index'], error['errors'][0]['field']) for error in data['errors']] == [(1, 'rrule')]
+    assert shared_store.get("event-000")['title'] == "イベント 0"
+    assert shared_store.get("event-010") is None
+    assert shared_store.search("イベント")[0] == 5
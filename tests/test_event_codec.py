@@ -0,0 +1,131 @@
+import datetime
+import io
+import json
+
+import pytest
+
+from event_codec import CODECS, SnapshotDecodeError, decode_snapshot, get_codec, iter_json_batches, msgpack
+from event_model import Event
+from event_store import ValidationReport, stream_snapshot
+
+START = datetime.date(2026, 1, 1)
+
+
+def sample_events(n=40):
+    """複数日・繰り返し・NUL を含むタイトル (その他の項目に入る) のイベント"""
+    return [Event(f"event-{i:03d}", f"タイトル\0{i}" if i % 6 == 1 else f"タイトル {i}",
+                  START + datetime.timedelta(days=i), START, f"説明 {i}" if i % 2 else "",
+                  START + datetime.timedelta(days=i + 2) if i % 5 == 0 else None,
+                  {'rrule': "FREQ=WEEKLY;COUNT=3"} if i % 7 == 3 else None)
+            for i in range(n)]
+
+
+def load(path, data):
+    path.write_bytes(data)
+    report = ValidationReport()
+    return stream_snapshot(str(path), report)[0], report
+
+
+CODEC_NAMES = [name for name in CODECS if name != 'msgpack' or msgpack is not None]
+
+
+# --- 書いて読み直す ---
+@pytest.mark.parametrize('name', CODEC_NAMES)
+def test_round_trip(tmp_path, name):
+    events = sample_events()
+    data = get_codec(name).encode(events)
+    decoded, invalid = decode_snapshot(data)
+    assert (decoded, invalid) == (events, [])
+    loaded, report = load(tmp_path / "events_data.json", data)
+    assert loaded == events
+    assert (report.accepted, report.error_count) == (len(events), 0)
+
+
+@pytest.mark.parametrize('name', CODEC_NAMES)
+def test_round_trip_of_records_and_empty_snapshot(name):
+    codec = get_codec(name)
+    records = [{'id': "a", 'title': "日付が date", 'date': START, 'deadline': START, 'description': ""},
+               {'id': "b", 'title': "日付が文字列", 'date': "2026-01-02", 'deadline': "2026-01-01", 'description': "",
+                'place': "会場"}]
+    decoded, invalid = decode_snapshot(codec.encode(records))
+    assert invalid == []
+    assert [event.to_record() for event in decoded] == [
+        {**records[0], 'date': "2026-01-01", 'deadline': "2026-01-01"}, records[1]]
+    assert decode_snapshot(codec.encode([])) == ([], [])
+
+
+@pytest.mark.parametrize('name', CODEC_NAMES)
+def test_invalid_records_are_left_as_dicts(name):
+    records = [{'id': "a", 'title': "正しい", 'date': "2026-01-02", 'deadline': "2026-01-01", 'description': ""},
+               {'id': "b", 'title': "不正な日付", 'date': "2026-02-30", 'deadline': "2026-01-01", 'description': ""}]
+    decoded, invalid = get_codec(name).decode(get_codec(name).encode(records))
+    assert invalid == [1]
+    assert decoded[0].id == "a"
+    assert not isinstance(decoded[1], Event) and (decoded[1]['id'], decoded[1]['date']) == ("b", "2026-02-30")
+
+
+# --- JSON を少しずつ読む ---
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 16])
+@pytest.mark.parametrize('name', ['json', 'compact'])
+def test_json_batches_match_whole_file_decode(name, chunk_size):
+    data = get_codec(name).encode(sample_events())
+    batches = list(iter_json_batches(io.BytesIO(data), chunk_size=chunk_size))
+    records = [record for _, batch in batches for record in batch]
+    assert records == json.loads(data)
+    # 各まとまりの先頭が何件目か (1 始まり) は、それまでの件数と合う
+    assert [position for position, _ in batches] == [1 + sum(len(batch) for _, batch in batches[:i])
+                                                     for i in range(len(batches))]
+
+
+def test_json_malformed_element_is_skipped_and_reported(tmp_path):
+    records = json.loads(get_codec('compact').encode(sample_events(5)))
+    text = ",".join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) for record in records)
+    broken = text.replace('"id":"event-002"', '"id":"event-002",,', 1)
+    loaded, report = load(tmp_path / "events_data.json", f"[{broken}]".encode("utf-8"))
+    assert [event.id for event in loaded] == ["event-000", "event-001", "event-003", "event-004"]
+    assert report.error_counts == {'syntax': 1}
+
+
+@pytest.mark.parametrize('name', ['json', 'compact'])
+def test_truncated_json_returns_the_complete_events(tmp_path, name):
+    events = sample_events(8)
+    data = get_codec(name).encode(events)
+    for cut in range(len(data)):
+        loaded, report = load(tmp_path / "events_data.json", data[:cut])
+        assert loaded == events[:len(loaded)], cut
+        assert report.error_counts.get('truncated') == 1, cut
+        assert report.accepted == len(loaded)
+    assert load(tmp_path / "events_data.json", data[:data.rindex(b"}") + 1])[0] == events
+
+
+def test_truncated_binary_never_returns_incomplete_events(tmp_path):
+    events = sample_events()
+    original = {event.id: event.to_record() for event in events}
+    data = get_codec('binary').encode(events)
+    extras_start = data.index(b"{\"") # その他の項目 (JSON) の先頭
+    for cut in range(9, len(data)):
+        loaded, report = load(tmp_path / "events_data.json", data[:cut])
+        for event in loaded:
+            assert event.to_record() == original[event.id], cut
+        # 切れたことを報告し、読めたイベントだけを取り込んだ件数に数える
+        assert report.error_counts['truncated'] >= 1
+        assert report.accepted == len(loaded)
+        if cut < extras_start:
+            assert loaded == [] # その他の項目が全く読めなければ、どのイベントも完全とは言えない
+
+
+def test_truncated_extras_drop_and_count_the_unreadable_events(tmp_path):
+    events = sample_events()
+    data = get_codec('binary').encode(events)
+    # 4件目 (event-003) の rrule の途中で切る
+    cut = data.index(b'"3":') + 8
+    loaded, report = load(tmp_path / "events_data.json", data[:cut])
+    assert [event.id for event in loaded] == ["event-000", "event-001", "event-002"]
+    assert report.error_counts == {'truncated': 1 + len(events) - 3}
+
+
+@pytest.mark.parametrize('cut', [4, 9, 20])
+def test_truncated_binary_without_report_raises(cut):
+    data = get_codec('binary').encode(sample_events())
+    with pytest.raises(SnapshotDecodeError):
+        get_codec('binary').decode(data[:cut])
@@ -0,0 +1,92 @@
+import pytest
+
+from conftest import make_record
+from event_history import EventHistory, HistoryConflictError
+from shared_store import SharedEventStore
+
+
+@pytest.fixture
+def history(shared_store):
+    shared_store.apply([('add', make_record(i)) for i in range(3)])
+    return EventHistory()
+
+
+def titles(shared_store):
+    return {event['id']: event['title'] for event in shared_store.events()}
+
+
+def test_undo_and_redo_round_trip(history, shared_store):
+    original = titles(shared_store)
+    history.apply(shared_store, [('add', make_record(10)), ('update', make_record(0, title="変更後")),
+                                 ('delete', "event-001")], "まとめて変更")
+    changed = titles(shared_store)
+
+    assert history.undo(shared_store) == "まとめて変更"
+    assert titles(shared_store) == original
+    assert (history.undo_label, history.redo_label) == (None, "まとめて変更")
+
+    assert history.redo(shared_store) == "まとめて変更"
+    assert titles(shared_store) == changed
+    assert (history.undo_label, history.redo_label) == ("まとめて変更", None)
+
+    assert history.undo(shared_store) == "まとめて変更"
+    assert titles(shared_store) == original
+
+
+def test_undo_is_saved_to_storage(history, shared_store, journal_store):
+    history.apply(shared_store, [('update', make_record(0, title="変更後"))], "変更")
+    history.undo(shared_store)
+    assert titles(SharedEventStore(journal_store)) == titles(shared_store)
+    assert shared_store.get("event-000")['title'] == "イベント 0"
+
+
+def test_nothing_to_undo_or_redo(history, shared_store):
+    assert history.undo(shared_store) is None
+    assert history.redo(shared_store) is None
+    history.apply(shared_store, [('delete', "event-999")], "無いイベントの削除")
+    assert len(history) == 0
+
+
+def test_new_operation_clears_redo(history, shared_store):
+    history.apply(shared_store, [('update', make_record(0, title="1回目"))], "1回目")
+    history.undo(shared_store)
+    history.apply(shared_store, [('update', make_record(1, title="2回目"))], "2回目")
+    assert history.redo_label is None
+    assert history.redo(shared_store) is None
+
+
+def test_limit_drops_oldest_operations(shared_store):
+    history = EventHistory(limit=2)
+    for i in range(3):
+        history.apply(shared_store, [('add', make_record(i))], f"追加 {i}")
+    assert len(history) == 2
+    assert [history.undo(shared_store), history.undo(shared_store), history.undo(shared_store)] == ["追加 2", "追加 1", None]
+    assert titles(shared_store) == {"event-000": "イベント 0"}
+
+
+def test_undo_conflict_leaves_other_change_and_drops_entry(history, shared_store):
+    history.apply(shared_store, [('update', make_record(1, title="前の操作"))], "前の操作")
+    history.apply(shared_store, [('update', make_record(0, title="自分の変更"))], "自分の変更")
+    shared_store.apply([('update', make_record(0, title="他のセッションの変更"))])
+    before = titles(shared_store)
+
+    with pytest.raises(HistoryConflictError) as excinfo:
+        history.undo(shared_store)
+    assert (excinfo.value.label, excinfo.value.event_id) == ("自分の変更", "event-000")
+    assert titles(shared_store) == before
+    assert (len(history), history.undo_label, history.redo_label) == (1, "前の操作", None)
+    # 競合しなかった古い操作は続けて元に戻せる
+    assert history.undo(shared_store) == "前の操作"
+    assert shared_store.get("event-001")['title'] == "イベント 1"
+
+
+def test_redo_conflict_after_added_elsewhere(history, shared_store):
+    history.apply(shared_store, [('add', make_record(10))], "追加")
+    history.undo(shared_store)
+    shared_store.apply([('add', make_record(10, title="他のセッションで追加"))])
+
+    with pytest.raises(HistoryConflictError) as excinfo:
+        history.redo(shared_store)
+    assert excinfo.value.event_id == "event-010"
+    assert shared_store.get("event-010")['title'] == "他のセッションで追加"
+    assert history.redo_label is None
@@ -0,0 +1,140 @@
+import datetime
+import io
+import uuid
+
+import pytest
+
+from conftest import make_record
+from event_export import iter_export
+from event_import import import_records, import_stream, iter_csv_records, iter_ics_records, validate_record
+from event_store import JournalStore
+from shared_store import SharedEventStore
+
+D = datetime.date
+
+
+def fields(shared_store):
+    """取り込んだイベントの (タイトル, イベント日, 終了日, 申込締切日, 説明) をタイトル順に返す"""
+    return sorted((event['title'], event['date'], event.get('end_date'), event['deadline'], event['description'])
+                  for event in shared_store.events())
+
+
+# --- validate_record ---
+def test_validate_record_converts_and_fills_defaults():
+    event = validate_record({'title': "大会", 'date': "2026-05-03", 'deadline': "2026-04-20", 'end_date': "2026-05-04",
+                             'rrule': "freq=monthly;count=3", 'description': ""})
+    assert (event['date'], event['deadline'], event['end_date']) == (D(2026, 5, 3), D(2026, 4, 20), D(2026, 5, 4))
+    assert event['rrule'] == "FREQ=MONTHLY;COUNT=3"
+    assert event['description'] == ""
+    assert uuid.UUID(event['id'])
+    # 終了日がイベント日と同じなら1日だけのイベントにする
+    assert 'end_date' not in validate_record({**make_record(0), 'end_date': "2026-04-01"})
+    assert validate_record(make_record(0))['id'] == "event-000"
+
+
+@pytest.mark.parametrize('changes, kind', [
+    ({'title': ""}, 'title'), ({'title': None}, 'title'),
+    ({'date': ""}, 'date'), ({'date': "2026-02-30"}, 'date'), ({'date': "4月1日"}, 'date'),
+    ({'deadline': None}, 'deadline'), ({'deadline': "2026/04/01"}, 'deadline'),
+    ({'end_date': "2026-13-01"}, 'end_date'), ({'end_date': "2026-03-31"}, 'period'),
+    ({'rrule': "FREQ=HOURLY"}, 'rrule'), ({'rrule': "COUNT=3"}, 'rrule'),
+    # 文字列でない値
+    ({'id': 5}, 'id'), ({'title': 5}, 'title'), ({'title': ["大会"]}, 'title'), ({'description': {'a': 1}}, 'description'),
+    ({'date': 739000}, 'date'), ({'deadline': 1.5}, 'deadline'), ({'end_date': True}, 'end_date'), ({'rrule': 3}, 'rrule'),
+])
+def test_validate_record_rejects(changes, kind):
+    with pytest.raises(ValueError) as excinfo:
+        validate_record({**make_record(0), **changes})
+    assert excinfo.value.args[0] == kind
+    assert isinstance(excinfo.value.args[1], str)
+
+
+# --- CSV ---
+def test_csv_with_japanese_headers_and_bom(shared_store):
+    text = ("﻿イベント名,イベント日,終了日,申込締切日,説明,備考\r\n"
+            " 市民マラソン ,2026-05-03,,2026-04-20,\"会場: 市民体育館\n持ち物: 参加費\",無視される列\r\n"
+            "トレイル,2026-06-01,2026-06-02,2026-05-01,,\r\n")
+    report = import_stream(io.BytesIO(text.encode("utf-8")), "events.csv", shared_store)
+    assert (report.accepted, report.error_count) == (2, 0)
+    assert fields(shared_store) == [
+        ("トレイル", D(2026, 6, 1), D(2026, 6, 2), D(2026, 5, 1), ""),
+        ("市民マラソン", D(2026, 5, 3), None, D(2026, 4, 20), "会場: 市民体育館\n持ち物: 参加費"),
+    ]
+
+
+def test_invalid_rows_are_reported_with_line_numbers(shared_store):
+    text = ("title,date,deadline\n"
+            "正しい,2026-05-03,2026-04-20\n"
+            ",2026-05-03,2026-04-20\n"
+            "日付が不正,2026-05-32,2026-04-20\n"
+            "締切が無い,2026-05-03,\n")
+    report = import_records(iter_csv_records(io.StringIO(text)), shared_store)
+    assert (report.accepted, report.error_count) == (1, 3)
+    assert report.error_counts == {'title': 1, 'date': 1, 'deadline': 1}
+    assert [(location, title) for location, title, _ in report.examples] == [(3, "(無題)"), (4, "日付が不正"),
+                                                                             (5, "締切が無い")]
+    assert [event['title'] for event in shared_store.events()] == ["正しい"]
+
+
+def test_small_batches_import_every_record(shared_store):
+    records = [(i + 2, make_record(i)) for i in range(7)]
+    report = import_records(records, shared_store, batch_size=3)
+    assert report.accepted == 7
+    assert [event['id'] for event in shared_store.events()] == [record['id'] for _, record in records]
+
+
+# --- iCalendar ---
+ICS = "\r\n".join([
+    "BEGIN:VCALENDAR",
+    "BEGIN:VEVENT",
+    "UID:race-1@example.com",
+    "DTSTART;VALUE=DATE:20260503",
+    "DTEND;VALUE=DATE:20260505",
+    "SUMMARY:市民マラソン\\, 春",
+    "DESCRIPTION:会場: 市民体育館\\n持ち物: 参",
+    " 加費",
+    "X-ENTRY-DEADLINE;VALUE=DATE:20260420",
+    "RRULE:FREQ=YEARLY",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "UID:race-1-deadline@example.com",
+    "DTSTART;VALUE=DATE:20260420",
+    "SUMMARY:締切: 市民マラソン",
+    "X-ENTRY-KIND:deadline",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "DTSTART:20260601T090000Z",
+    "DTEND:20260602T000000Z",
+    "SUMMARY:締切の無い大会",
+    "END:VEVENT",
+    "END:VCALENDAR",
+    "",
+])
+
+
+def test_ics_records():
+    records = [record for _, record in iter_ics_records(io.StringIO(ICS))]
+    assert records == [
+        {'title': "市民マラソン, 春", 'description': "会場: 市民体育館\n持ち物: 参加費", 'date': "2026-05-03",
+         'deadline': "2026-04-20", 'rrule': "FREQ=YEARLY", 'id': str(uuid.uuid5(uuid.NAMESPACE_URL, "race-1@example.com")),
+         'end_date': "2026-05-04"},
+        {'date': "2026-06-01", 'title': "締切の無い大会", 'deadline': "2026-06-01"},
+    ]
+    assert [line for line, _ in iter_ics_records(io.StringIO(ICS))] == [2, 18]
+
+
+def test_ics_import_uses_ids_derived_from_uid(shared_store):
+    import_stream(io.BytesIO(ICS.encode("utf-8")), "calendar.ics", shared_store)
+    ids = sorted(event['id'] for event in shared_store.events())
+    assert str(uuid.uuid5(uuid.NAMESPACE_URL, "race-1@example.com")) in ids
+
+
+@pytest.mark.parametrize('fmt, filename', [('csv', "events.csv"), ('ics', "events.ics")])
+def test_export_can_be_imported_again(shared_store, tmp_path, fmt, filename):
+    shared_store.apply([('add', make_record(0, title="複数日, \"引用符\"", end_date="2026-04-03", description="1行目\n2行目")),
+                        ('add', make_record(1, deadline="2026-03-20"))])
+    data = "".join(iter_export(fmt, shared_store.events())).encode("utf-8")
+    imported = SharedEventStore(JournalStore(str(tmp_path / "imported.json")))
+    report = import_stream(io.BytesIO(data), filename, imported)
+    assert (report.accepted, report.error_count) == (2, 0)
+    assert fields(imported) == fields(shared_store)
@@ -0,0 +1,108 @@
+import datetime
+import random
+
+import pytest
+
+from event_index import IntervalIndex
+
+BASE = datetime.date(2026, 4, 1)
+
+
+def random_event(rng, event_id):
+    date = BASE + datetime.timedelta(days=rng.randint(0, 60))
+    event = {'id': event_id, 'date': date}
+    if rng.random() < 0.4:
+        event['end_date'] = date + datetime.timedelta(days=rng.randint(0, 10))
+    elif rng.random() < 0.05:
+        event['date'] = None # 日付の無いイベントは索引に入らない
+    return event
+
+
+def span(event):
+    start = event['date'].toordinal()
+    end = event['end_date'].toordinal() if event.get('end_date') else start
+    return start, end
+
+
+def check_tree(node, lo=None, hi=None):
+    """二分探索木の順序・優先度のヒープ順・部分木の最大終了日を確かめ、部分木の最大終了日を返す"""
+    if node is None:
+        return None
+    assert lo is None or node.key > lo
+    assert hi is None or node.key < hi
+    max_end = node.end
+    for child, child_lo, child_hi in ((node.left, lo, node.key), (node.right, node.key, hi)):
+        if child is not None:
+            assert child.priority <= node.priority
+            max_end = max(max_end, check_tree(child, child_lo, child_hi))
+    assert node.max_end == max_end
+    return max_end
+
+
+def expected_spans(events, order):
+    """索引に入るイベントの (開始日, 終了日, id) を開始日順 (同じ日は後から追加・更新した方が後) に返す"""
+    spans = [(*span(event), event['id']) for event in events.values() if event['date'] is not None]
+    return sorted(spans, key=lambda item: (item[0], order[item[2]]))
+
+
+def brute_overlapping(spans, lo, hi):
+    return [event_id for start, end, event_id in spans if start <= hi and end >= lo]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_interval_index_matches_brute_force(seed):
+    rng = random.Random(seed)
+    events = {f"event-{i:03d}": random_event(rng, f"event-{i:03d}") for i in range(50)}
+    order = {event_id: i for i, event_id in enumerate(events)}
+    index = IntervalIndex(seed)
+    index.rebuild(list(events.values()))
+    next_id, next_order = 50, 50
+    for step in range(400):
+        kind = rng.choice(['add', 'update', 'delete'])
+        if kind == 'add' or not events:
+            event = random_event(rng, f"event-{next_id:03d}")
+            next_id += 1
+            events[event['id']] = event
+            index.on_add(event)
+        elif kind == 'update':
+            old = events[rng.choice(sorted(events))]
+            event = random_event(rng, old['id'])
+            events[event['id']] = event
+            index.on_update(old, event)
+        else:
+            event = events.pop(rng.choice(sorted(events)))
+            index.on_delete(event)
+            continue
+        order[event['id']] = next_order # 追加・更新したイベントは同じ開始日の中で最後に並ぶ
+        next_order += 1
+
+        spans = expected_spans(events, order)
+        check_tree(index._root)
+        assert len(index) == len(spans)
+        assert list(index.spans()) == spans
+        assert index.multi_day_ids == {event_id for start, end, event_id in spans if end > start}
+        for _ in range(3):
+            lo = BASE + datetime.timedelta(days=rng.randint(-5, 75))
+            hi = lo + datetime.timedelta(days=rng.randint(0, 10))
+            assert index.overlapping(lo, hi) == brute_overlapping(spans, lo.toordinal(), hi.toordinal())
+
+    # 差分更新した木と、同じイベントから一括構築した木は同じ結果を返す
+    rebuilt = IntervalIndex(seed + 1)
+    rebuilt.rebuild(sorted(events.values(), key=lambda event: order[event['id']]))
+    check_tree(rebuilt._root)
+    assert list(rebuilt.spans()) == list(index.spans())
+
+
+def test_end_date_before_start_is_treated_as_one_day():
+    index = IntervalIndex()
+    index.rebuild([{'id': "a", 'date': BASE, 'end_date': BASE - datetime.timedelta(days=3)}])
+    assert list(index.spans()) == [(BASE.toordinal(), BASE.toordinal(), "a")]
+    assert index.multi_day_ids == set()
+    assert index.overlapping(BASE - datetime.timedelta(days=2), BASE - datetime.timedelta(days=1)) == []
+
+
+def test_delete_of_unknown_event_is_ignored():
+    index = IntervalIndex()
+    index.rebuild([{'id': "a", 'date': BASE}])
+    index.on_delete({'id': "b", 'date': BASE})
+    assert index.overlapping(BASE, BASE) == ["a"]
@@ -0,0 +1,143 @@
+import datetime
+import random
+
+import pytest
+
+from conftest import make_record
+from event_model import Event
+from event_recurrence import SERIES_FIELD, RecurrenceRule, expand
+
+D = datetime.date
+
+
+def naive_dates(rule, start, last):
+    """規則どおりに開始日から1回ずつ日付を作る (存在しない日付は飛ばし、COUNT には数えない)"""
+    found = []
+    n = 0
+    while len(found) < (rule.count or float('inf')):
+        if rule.freq in ('DAILY', 'WEEKLY'):
+            date = start + datetime.timedelta(days=n * rule.interval * (7 if rule.freq == 'WEEKLY' else 1))
+        else:
+            months = start.month - 1 + n * rule.interval * (12 if rule.freq == 'YEARLY' else 1)
+            year, month = start.year + months // 12, months % 12 + 1
+            if D(year, month, 1) > last:
+                break
+            try:
+                date = D(year, month, start.day)
+            except ValueError:
+                n += 1
+                continue
+        if date > last or (rule.until is not None and date > rule.until):
+            break
+        found.append(date)
+        n += 1
+    return found
+
+
+def dates(rule, start, first, last):
+    return [D.fromordinal(ordinal) for ordinal in rule.ordinals_between(start, first.toordinal(), last.toordinal())]
+
+
+# --- 規則の読み書き ---
+@pytest.mark.parametrize('text, expected', [
+    ("FREQ=MONTHLY", "FREQ=MONTHLY"),
+    ("RRULE:freq=weekly;INTERVAL=2;COUNT=5", "FREQ=WEEKLY;INTERVAL=2;COUNT=5"),
+    ("FREQ=YEARLY;UNTIL=20301231T000000Z", "FREQ=YEARLY;UNTIL=20301231"),
+    ("FREQ=DAILY;UNTIL=2026-05-01", "FREQ=DAILY;UNTIL=20260501"),
+])
+def test_rule_parse_and_str(text, expected):
+    assert str(RecurrenceRule.parse(text)) == expected
+
+
+@pytest.mark.parametrize('text', ["", "COUNT=3", "FREQ=HOURLY", "FREQ=DAILY;BYDAY=MO", "FREQ=DAILY;COUNT=0",
+                                  "FREQ=DAILY;INTERVAL=x", "FREQ=DAILY;COUNT=2;UNTIL=20260501",
+                                  "FREQ=DAILY;UNTIL=2026", "FREQ"])
+def test_invalid_rules_are_rejected(text):
+    with pytest.raises(ValueError):
+        RecurrenceRule.parse(text)
+
+
+# --- 展開 ---
+def test_count_is_counted_from_the_start_date():
+    rule = RecurrenceRule.parse("FREQ=WEEKLY;COUNT=3")
+    assert dates(rule, D(2026, 4, 1), D(2026, 1, 1), D(2027, 1, 1)) == [D(2026, 4, 1), D(2026, 4, 8), D(2026, 4, 15)]
+    # 期間の途中から見ても、開始日から数えて COUNT 回目までしか出さない
+    assert dates(rule, D(2026, 4, 1), D(2026, 4, 10), D(2027, 1, 1)) == [D(2026, 4, 15)]
+
+
+def test_until_is_inclusive():
+    rule = RecurrenceRule.parse("FREQ=DAILY;INTERVAL=3;UNTIL=20260410")
+    assert dates(rule, D(2026, 4, 1), D(2026, 1, 1), D(2027, 1, 1)) == [D(2026, 4, 1), D(2026, 4, 4), D(2026, 4, 7),
+                                                                         D(2026, 4, 10)]
+
+
+def test_month_end_days_are_skipped_not_clamped():
+    monthly = RecurrenceRule.parse("FREQ=MONTHLY;COUNT=4")
+    assert dates(monthly, D(2026, 1, 31), D(2026, 1, 1), D(2027, 12, 31)) == [D(2026, 1, 31), D(2026, 3, 31),
+                                                                               D(2026, 5, 31), D(2026, 7, 31)]
+    leap_day = RecurrenceRule.parse("FREQ=YEARLY")
+    assert dates(leap_day, D(2024, 2, 29), D(2024, 1, 1), D(2032, 12, 31)) == [D(2024, 2, 29), D(2028, 2, 29),
+                                                                                D(2032, 2, 29)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_windows_match_naive_expansion(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        freq = rng.choice(['DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'])
+        start = D(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 800))
+        limit = rng.choice(["", f";COUNT={rng.randint(1, 20)}",
+                            f";UNTIL={(start + datetime.timedelta(days=rng.randint(0, 900))).strftime('%Y%m%d')}"])
+        rule = RecurrenceRule.parse(f"FREQ={freq};INTERVAL={rng.randint(1, 4)}{limit}")
+        first = start + datetime.timedelta(days=rng.randint(-100, 1500))
+        last = first + datetime.timedelta(days=rng.randint(0, 400))
+        expected = [date for date in naive_dates(rule, start, last) if date >= first]
+        assert dates(rule, start, first, last) == expected, (str(rule), start, first, last)
+
+
+def test_expand_shifts_deadline_and_end_date():
+    series = Event.from_record(make_record(0, date="2026-04-10", deadline="2026-04-03", end_date="2026-04-11",
+                                           rrule="FREQ=WEEKLY;COUNT=3"))
+    occurrences = expand(series, D(2026, 4, 18), D(2026, 4, 30))
+    # 4/17 〜 4/18 の回は期間の初日と重なるので含める
+    assert [(o['id'], o['date'], o['deadline'], o['end_date']) for o in occurrences] == [
+        ("event-000@2026-04-17", D(2026, 4, 17), D(2026, 4, 10), D(2026, 4, 18)),
+        ("event-000@2026-04-24", D(2026, 4, 24), D(2026, 4, 17), D(2026, 4, 25)),
+    ]
+    assert all(o[SERIES_FIELD] == "event-000" and o['title'] == "イベント 0" for o in occurrences)
+    assert [o['id'] for o in expand(series, D(2026, 4, 10), D(2026, 4, 10), 'deadline')] == ["event-000@2026-04-17"]
+
+
+# --- 共有ストアでの扱い ---
+@pytest.fixture
+def weekly(shared_store):
+    shared_store.apply([('add', make_record(0, date="2026-04-06", deadline="2026-04-01", rrule="FREQ=WEEKLY;COUNT=4")),
+                        ('add', make_record(1, date="2026-04-13", deadline="2026-04-01", end_date="2026-04-14")),
+                        ('add', make_record(2, date="2026-04-21", deadline="2026-04-01"))])
+    return shared_store
+
+
+def ids(events):
+    return sorted(event['id'] for event in events)
+
+
+def test_clashing_events_include_occurrences(weekly):
+    assert ids(weekly.clashing_events(D(2026, 4, 13))) == ["event-000@2026-04-13", "event-001"]
+    assert ids(weekly.clashing_events(D(2026, 4, 19), D(2026, 4, 21))) == ["event-000@2026-04-20", "event-002"]
+    assert ids(weekly.clashing_events(D(2026, 4, 13), D(2026, 4, 20), exclude_id="event-000")) == ["event-001"]
+    assert weekly.clashing_events(D(2026, 5, 4)) == [] # COUNT=4 で 4/27 が最後
+
+
+def test_editing_through_an_occurrence_edits_the_series(weekly):
+    series = weekly.get("event-000@2026-04-20")
+    assert series['id'] == "event-000"
+    weekly.apply([('update', make_record(0, title="変更後", date=series['date'].isoformat(), deadline="2026-04-01",
+                                         rrule="FREQ=WEEKLY;COUNT=2"))])
+    occurrences = weekly.events_in_window('date', D(2026, 4, 1), D(2026, 4, 30))
+    assert [(o['id'], o['title']) for o in occurrences if SERIES_FIELD in o] == [
+        ("event-000@2026-04-06", "変更後"), ("event-000@2026-04-13", "変更後")]
+    assert ids(weekly.clashing_events(D(2026, 4, 20))) == []
+
+    weekly.apply([('delete', "event-000")])
+    assert weekly.get("event-000@2026-04-06") is None
+    assert ids(weekly.clashing_events(D(2026, 4, 13))) == ["event-001"]
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from conftest import make_record
+from event_search import ngrams, normalize, query_ngrams
+
+WORDS = ["東京", "マラソン", "大会", "市民", "ハーフ", "トレイル", "春季", "Ｒｕｎ", "run", "ｶﾞｲﾄﾞ", "ガイド", "検定"]
+QUERIES = ["マラソン", "東京マラソン", "ﾏﾗｿﾝ", "RUN", "ガイド", "大", "市", "検定 大会", "ハーフマラソン", "存在しない"]
+
+
+def matches(events, query):
+    """索引を使わずに、検索語の全ての n-gram がタイトルか説明に含まれるイベントの id を返す"""
+    grams = query_ngrams(normalize(query))
+    return {event['id'] for event in events
+            if grams <= ngrams(normalize(event['title'])) | ngrams(normalize(event['description']))}
+
+
+def search_ids(shared_store, query):
+    total, events = shared_store.search(query, limit=1000)
+    assert total == len(events)
+    return {event['id'] for event in events}
+
+
+def random_text(rng):
+    return "".join(rng.sample(WORDS, rng.randint(1, 3))) + rng.choice(["", " ", " 2026"])
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_index_matches_brute_force_after_random_changes(shared_store, monkeypatch, seed):
+    monkeypatch.setattr('event_search.COMPACT_MIN_DEAD', 5) # 死んだスロットからの作り直しも通す
+    rng = random.Random(seed)
+    shared_store.apply([('add', make_record(i, title=random_text(rng))) for i in range(30)])
+    next_index = 30
+    for step in range(60):
+        ids = [event['id'] for event in shared_store.events()]
+        kind = rng.choice(['add', 'update', 'update', 'delete'])
+        if kind == 'add' or not ids:
+            shared_store.apply([('add', make_record(next_index, title=random_text(rng)))])
+            next_index += 1
+        elif kind == 'update':
+            index = int(rng.choice(ids).split("-")[1])
+            shared_store.apply([('update', make_record(index, title=random_text(rng), description=random_text(rng)))])
+        else:
+            shared_store.apply([('delete', rng.choice(ids))])
+        if step % 5 == 0: # 検索の前の変更 (索引を作る前) と後の変更 (差分更新) の両方を通す
+            for query in QUERIES:
+                assert search_ids(shared_store, query) == matches(shared_store.events(), query), query
+
+
+def test_short_queries(shared_store):
+    shared_store.apply([('add', make_record(0, title="検定")), ('add', make_record(1, title="英検 2級")),
+                        ('add', make_record(2, title="市民大会", description="検"))])
+    assert search_ids(shared_store, "検") == {"event-000", "event-001", "event-002"}
+    assert search_ids(shared_store, "英検") == {"event-001"}
+    assert search_ids(shared_store, "2") == {"event-001"}
+    assert shared_store.search("") == (0, [])
+    assert shared_store.search("   ") == (0, [])
+
+
+def test_japanese_and_width_normalization(shared_store):
+    shared_store.apply([('add', make_record(0, title="ﾊｰﾌﾏﾗｿﾝ大会")), ('add', make_record(1, title="ＴＯＫＹＯ　Ｒｕｎ")),
+                        ('add', make_record(2, title="トレイルラン"))])
+    assert search_ids(shared_store, "ハーフマラソン") == {"event-000"}
+    assert search_ids(shared_store, "ﾏﾗｿﾝ") == {"event-000"}
+    assert search_ids(shared_store, "tokyo run") == {"event-001"}
+    assert search_ids(shared_store, "ＲＵＮ") == {"event-001"}
+
+
+def test_title_matches_rank_above_description_matches(shared_store):
+    shared_store.apply([('add', make_record(0, title="市民大会", description="マラソンの部あり")),
+                        ('add', make_record(1, title="市民マラソン")),
+                        ('add', make_record(2, title="マラソン大会"))])
+    total, events = shared_store.search("マラソン")
+    assert total == 3
+    assert [event['id'] for event in events] == ["event-001", "event-002", "event-000"] # 同点は登録順
+    total, events = shared_store.search("マラソン", limit=1, offset=1)
+    assert (total, [event['id'] for event in events]) == (3, ["event-002"])
+
+
+def test_update_and_delete_are_reflected(shared_store):
+    shared_store.apply([('add', make_record(0, title="春季マラソン")), ('add', make_record(1, title="春季トレイル"))])
+    assert search_ids(shared_store, "春季") == {"event-000", "event-001"}
+    shared_store.apply([('update', make_record(0, title="秋季マラソン")), ('delete', "event-001")])
+    assert search_ids(shared_store, "春季") == set()
+    assert search_ids(shared_store, "秋季マラソン") == {"event-000"}
+    shared_store.apply([('add', make_record(1, title="春季ハーフ"))])
+    assert search_ids(shared_store, "春季") == {"event-001"}
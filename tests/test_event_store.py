@@ -0,0 +1,86 @@
+import os
+
+from conftest import make_record
+from event_store import JournalStore
+
+
+def titles(store):
+    return {event['id']: event['title'] for event in store.load_events()}
+
+
+def reopened(store, **options):
+    """同じファイルを別プロセスから開いたときのストア"""
+    return JournalStore(store.path, **options)
+
+
+OPS = [('add', make_record(0)), ('add', make_record(1)), ('add', make_record(2)),
+       ('update', make_record(1, title="変更後")), ('delete', "event-002"), ('add', make_record(2, title="追加し直し"))]
+EXPECTED = {"event-000": "イベント 0", "event-001": "変更後", "event-002": "追加し直し"}
+
+
+def test_journal_is_replayed_on_load(journal_store):
+    for op in OPS:
+        journal_store.apply([op])
+    assert not os.path.exists(journal_store.path)
+    assert titles(reopened(journal_store)) == EXPECTED
+
+
+def test_journal_is_replayed_over_snapshot(journal_store):
+    journal_store.save_all([make_record(0, title="スナップショット"), make_record(5)])
+    journal_store.apply(OPS[1:])
+    assert titles(reopened(journal_store)) == {**EXPECTED, "event-000": "スナップショット", "event-005": "イベント 5"}
+
+
+def test_torn_tail_is_ignored_and_truncated_before_append(journal_store):
+    journal_store.apply(OPS[:2])
+    with open(journal_store.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op":"add","event":{"id":"event-009","ti') # 書き込み途中でクラッシュした行
+    assert titles(reopened(journal_store)) == {"event-000": "イベント 0", "event-001": "イベント 1"}
+
+    reopened(journal_store).apply([('add', make_record(3))])
+    with open(journal_store.journal_path, "r", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 3
+    assert titles(reopened(journal_store)) == {"event-000": "イベント 0", "event-001": "イベント 1",
+                                               "event-003": "イベント 3"}
+
+
+def test_compact_folds_journal_into_snapshot(journal_store):
+    journal_store.apply(OPS)
+    journal_store.compact()
+    assert not os.path.exists(journal_store.journal_path)
+    assert not os.path.exists(journal_store.compacting_path)
+    assert titles(reopened(journal_store)) == EXPECTED
+
+    journal_store.apply([('delete', "event-000")])
+    journal_store.compact()
+    assert titles(reopened(journal_store)) == {"event-001": "変更後", "event-002": "追加し直し"}
+
+
+def test_interrupted_compaction_is_replayed_and_finished(journal_store):
+    journal_store.apply(OPS[:3])
+    os.replace(journal_store.journal_path, journal_store.compacting_path) # 切り替えた直後にクラッシュした
+    journal_store.apply(OPS[3:])
+    assert titles(reopened(journal_store)) == EXPECTED
+
+    store = reopened(journal_store)
+    store.compact() # 残っていた畳み込み途中のジャーナルだけを畳み込む
+    assert not os.path.exists(store.compacting_path)
+    assert titles(reopened(store)) == EXPECTED
+    store.compact()
+    assert not os.path.exists(store.journal_path)
+    assert titles(reopened(store)) == EXPECTED
+
+
+def test_compaction_starts_in_background_past_threshold(journal_store):
+    store = reopened(journal_store, compact_threshold=1)
+    store.apply(OPS)
+    store._compactor.join(timeout=10)
+    assert not os.path.exists(store.journal_path)
+    assert titles(reopened(store)) == EXPECTED
+
+
+def test_snapshot_with_multi_day_events_is_loaded_intact(journal_store):
+    records = [make_record(i, end_date="2026-04-20") if i % 3 == 0 else make_record(i) for i in range(10)]
+    records[4]['rrule'] = "FREQ=WEEKLY;COUNT=2"
+    journal_store.save_all(records)
+    assert [event.to_record() for event in reopened(journal_store).load_events()] == records
@@ -0,0 +1,21 @@
+from conftest import make_record
+from event_views import duplicate_warnings
+
+
+def test_duplicate_warnings_are_capped_with_remaining_count(shared_store):
+    # 28日分の定員超えの日付と、期間が重なる複数日イベント 1件
+    shared_store.apply([('add', make_record(i)) for i in range(56)])
+    shared_store.apply([('add', make_record(100, date="2026-04-01", end_date="2026-04-03"))])
+    warnings = duplicate_warnings(shared_store, limit=10)
+    assert len(warnings) == 11
+    assert all("重複注意" in warning for warning in warnings[:10])
+    assert warnings[-1] == "⚠️ ほか 19件の重複があります。"
+    assert len(duplicate_warnings(shared_store, limit=100)) == 29
+
+
+def test_duplicate_warnings_are_cached_per_version(shared_store):
+    shared_store.apply([('add', make_record(0)), ('add', make_record(28))])
+    warnings = duplicate_warnings(shared_store)
+    assert duplicate_warnings(shared_store) is warnings
+    shared_store.apply([('delete', "event-028")])
+    assert duplicate_warnings(shared_store) == []
@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+from conftest import make_record
+from reminder_service import RETRY_SECONDS, ReminderScheduler, ReminderState
+
+
+class FlakyNotifier:
+    """最初の failures 回は送信に失敗する送り先"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, digest):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("接続できません")
+        self.sent.append([reminder.event_id for reminder in digest.reminders])
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    # 締切日 (make_record(0) は 2026-04-01) の知らせる時刻ちょうど
+    return Clock(datetime.datetime(2026, 4, 1, 9).timestamp())
+
+
+def scheduler_for(shared_store, notifier, clock, state=None):
+    shared_store.apply([('add', make_record(0))])
+    scheduler = ReminderScheduler(notifier, state, days_before=(0,), clock=clock)
+    shared_store.add_index('reminders', scheduler)
+    return scheduler
+
+
+def test_failed_delivery_is_retried_with_backoff(shared_store, clock, tmp_path):
+    notifier = FlakyNotifier(failures=2)
+    state = ReminderState(str(tmp_path / "reminder_state.json"))
+    scheduler = scheduler_for(shared_store, notifier, clock, state)
+
+    scheduler.run_pending() # 1回目の失敗: RETRY_SECONDS 後に送り直す
+    assert (len(scheduler), notifier.sent, state.sent) == (1, [], set())
+    clock.now += RETRY_SECONDS - 1
+    scheduler.run_pending()
+    assert notifier.failures == 1
+
+    clock.now += 1
+    scheduler.run_pending() # 2回目の失敗: 次は倍の間を空ける
+    assert (len(scheduler), notifier.failures) == (1, 0)
+    clock.now += RETRY_SECONDS * 2 - 1
+    scheduler.run_pending()
+    assert notifier.sent == []
+
+    clock.now += 1
+    scheduler.run_pending()
+    assert notifier.sent == [["event-000"]]
+    assert (len(scheduler), scheduler.sent_digests) == (0, 1)
+    assert ReminderState(state.path).sent == {"event-000|2026-04-01|0"}
+
+
+def test_failed_reminder_of_deleted_event_is_not_retried(shared_store, clock):
+    notifier = FlakyNotifier(failures=1)
+    scheduler = scheduler_for(shared_store, notifier, clock)
+    due = scheduler._pop_due()
+    shared_store.apply([('delete', "event-000")]) # 送信中に削除された
+    scheduler._deliver(due)
+    assert len(scheduler) == 0
+    clock.now += RETRY_SECONDS
+    scheduler.run_pending()
+    assert notifier.sent == []
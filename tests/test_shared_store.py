@@ -0,0 +1,107 @@
+import datetime
+import os
+import random
+
+import pytest
+
+from conftest import make_record
+from event_store import JournalStore
+from shared_store import SharedEventStore
+
+START = datetime.date(2026, 1, 1)
+
+
+def random_ops(rng, n):
+    """1日だけ・複数日・繰り返し (複数日の回も含む) のイベントを混ぜた追加の列"""
+    ops = []
+    for i in range(n):
+        date = START + datetime.timedelta(days=rng.randint(0, 120))
+        fields = {'date': date.isoformat(), 'deadline': date.isoformat()}
+        if rng.random() < 0.3:
+            fields['end_date'] = (date + datetime.timedelta(days=rng.randint(1, 15))).isoformat()
+        if rng.random() < 0.1:
+            fields['rrule'] = rng.choice(["FREQ=WEEKLY;COUNT=6", "FREQ=MONTHLY", "FREQ=DAILY;INTERVAL=9"])
+        ops.append(('add', make_record(i, **fields)))
+    return ops
+
+
+def clash_ids(clashes):
+    return {event['id']: sorted(other['id'] for other in others) for event, others in clashes}
+
+
+def brute_force_clashes(shared_store):
+    """複数日イベントごとに clashing_events で1件ずつ問い合わせた結果"""
+    expected = {}
+    for event_id in shared_store.indexes['interval'].multi_day_ids:
+        event = shared_store.get(event_id)
+        others = shared_store.clashing_events(event['date'], event['end_date'], exclude_id=event_id)
+        if others:
+            expected[event_id] = sorted(other['id'] for other in others)
+    return expected
+
+
+def check_clashes(shared_store):
+    expected = brute_force_clashes(shared_store)
+    counts = shared_store.multi_day_clash_counts()
+    assert {event['id']: count for event, count in counts} == {event_id: len(ids) for event_id, ids in expected.items()}
+    assert [event['date'] for event, _ in counts] == sorted(event['date'] for event, _ in counts)
+    assert clash_ids(shared_store.multi_day_clashes()) == expected
+    assert shared_store.multi_day_clashes(3) == shared_store.multi_day_clashes()[:3]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_multi_day_clash_counts_match_per_event_queries(shared_store, seed):
+    rng = random.Random(seed)
+    shared_store.apply(random_ops(rng, 200))
+    check_clashes(shared_store)
+
+    # 更新・削除の後も一致する (version ごとに作り直される)
+    events = list(shared_store.events())
+    shared_store.apply([('delete', event['id']) for event in rng.sample(events, 30)])
+    shift = datetime.timedelta(days=3)
+    moved = [event.replace(date=event['date'] + shift, end_date=event['end_date'] + shift if 'end_date' in event else None)
+             for event in rng.sample(list(shared_store.events()), 30)]
+    shared_store.apply([('update', event) for event in moved])
+    check_clashes(shared_store)
+
+
+def test_multi_day_clashes_are_cached_per_version(shared_store):
+    shared_store.apply([('add', make_record(0, end_date="2026-04-03")), ('add', make_record(1))])
+    counts = shared_store.multi_day_clash_counts()
+    assert [(event['id'], count) for event, count in counts] == [("event-000", 1)]
+    assert shared_store.multi_day_clash_counts() is counts
+    shared_store.apply([('delete', "event-001")])
+    assert shared_store.multi_day_clash_counts() == []
+    assert shared_store.multi_day_clashes() == []
+
+
+# --- 外部の変更の検出 ---
+def test_own_compaction_is_not_seen_as_external_change(shared_store, journal_store):
+    shared_store.apply([('add', make_record(i)) for i in range(3)])
+    version = shared_store.version
+    journal_store.compact()
+    assert not os.path.exists(journal_store.journal_path)
+    assert shared_store.refresh_if_stale() is False
+    assert shared_store.version == version
+
+    # 畳み込んだ後の自分の変更と、もう一度の畳み込みも読み直さない
+    shared_store.apply([('delete', "event-000")])
+    journal_store.compact()
+    assert shared_store.refresh_if_stale() is False
+    assert shared_store.version == version + 1
+
+    # 別のプロセスからの変更は検出する
+    JournalStore(journal_store.path).apply([('add', make_record(10))])
+    assert shared_store.refresh_if_stale() is True
+    assert [event['id'] for event in shared_store.events()] == ["event-001", "event-002", "event-010"]
+
+
+def test_background_compaction_does_not_trigger_reload(tmp_path):
+    store = JournalStore(str(tmp_path / "events_data.json"), compact_threshold=1)
+    shared_store = SharedEventStore(store)
+    shared_store.apply([('add', make_record(0))])
+    store._compactor.join(timeout=10)
+    assert not os.path.exists(store.journal_path)
+    version = shared_store.version
+    assert shared_store.refresh_if_stale() is False
+    assert shared_store.version == version
@@ -0,0 +1,93 @@
+import datetime
+import random
+
+import pytest
+
+from conftest import make_record
+from shared_store import SharedEventStore
+from sqlite_store import SqliteStore, migrate_json_to_sqlite
+
+TODAY = datetime.date(2026, 4, 15)
+
+
+def random_records(n, seed=0):
+    """1日に複数のイベント、複数日イベント、繰り返しのイベントが混ざったレコード"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        date = TODAY + datetime.timedelta(days=rng.randint(-40, 40))
+        fields = {'date': date.isoformat(), 'deadline': (date - datetime.timedelta(days=rng.randint(0, 20))).isoformat()}
+        if rng.random() < 0.2:
+            fields['end_date'] = (date + datetime.timedelta(days=rng.randint(1, 10))).isoformat()
+        if rng.random() < 0.1:
+            fields['rrule'] = rng.choice(["FREQ=WEEKLY;COUNT=4", "FREQ=MONTHLY"])
+        records.append(make_record(i, **fields))
+    return records
+
+
+@pytest.fixture
+def stores(tmp_path, shared_store):
+    """同じ内容の (SQLite で問い合わせる共有ストア, メモリ上の索引で問い合わせる共有ストア)"""
+    records = random_records(300)
+    shared_store.apply([('add', record) for record in records])
+    sqlite_shared = SharedEventStore(SqliteStore(str(tmp_path / "events_data.db")))
+    sqlite_shared.apply([('add', record) for record in records])
+    # 更新・削除も1行単位で反映されること
+    changes = [('update', make_record(5, date="2026-04-20", deadline="2026-04-01")), ('delete', "event-007")]
+    for shared in (shared_store, sqlite_shared):
+        shared.apply(changes)
+    assert sqlite_shared._queries is not None and shared_store._queries is None
+    return sqlite_shared, shared_store
+
+
+def ids(events):
+    return [event['id'] for event in events]
+
+
+@pytest.mark.parametrize('offset, limit', [(0, 0), (0, 20), (20, 20), (0, None)])
+def test_deadline_overview_matches_memory_indexes(stores, offset, limit):
+    sqlite_shared, memory_shared = stores
+    expected = memory_shared.deadline_overview(TODAY, offset, limit)
+    actual = sqlite_shared.deadline_overview(TODAY, offset, limit)
+    assert actual[:2] == expected[:2]
+    assert ids(actual[2]) == ids(expected[2])
+
+
+def test_recently_expired_matches_memory_indexes(stores):
+    sqlite_shared, memory_shared = stores
+    assert ids(sqlite_shared.recently_expired(TODAY, 20)) == ids(memory_shared.recently_expired(TODAY, 20))
+
+
+@pytest.mark.parametrize('field', ['date', 'deadline'])
+def test_events_in_window_matches_memory_indexes(stores, field):
+    sqlite_shared, memory_shared = stores
+    start, end = datetime.date(2026, 4, 1), datetime.date(2026, 4, 30)
+    assert (sorted(ids(sqlite_shared.events_in_window(field, start, end)))
+            == sorted(ids(memory_shared.events_in_window(field, start, end))))
+
+
+def test_over_capacity_dates_matches_memory_indexes(stores):
+    sqlite_shared, memory_shared = stores
+    assert sqlite_shared.over_capacity_dates() == memory_shared.over_capacity_dates()
+    assert sqlite_shared.over_capacity_dates()
+
+
+@pytest.mark.parametrize('sql, index', [
+    ("SELECT id FROM events WHERE deadline >= '2026-04-15' ORDER BY deadline, seq", 'idx_events_deadline'),
+    ("SELECT id FROM events WHERE date BETWEEN '2026-04-01' AND '2026-04-30'", 'idx_events_date'),
+    ("SELECT date, COUNT(*) FROM events GROUP BY date", 'idx_events_date'),
+])
+def test_queries_use_date_indexes(tmp_path, sql, index):
+    store = SqliteStore(str(tmp_path / "events_data.db"))
+    plan = " ".join(row[-1] for row in store._conn.execute("EXPLAIN QUERY PLAN " + sql))
+    assert index in plan
+
+
+def test_migrate_json_to_sqlite(journal_store, tmp_path):
+    records = random_records(20)
+    journal_store.save_all(records[:10])
+    journal_store.apply([('add', record) for record in records[10:]])
+    db_path = str(tmp_path / "events_data.db")
+    assert migrate_json_to_sqlite(journal_store.path, db_path) == 20
+    assert [record['id'] for record in SqliteStore(db_path).load_records()] == [record['id'] for record in records]
+    assert migrate_json_to_sqlite(journal_store.path, db_path) == 0 # 移行済みなら何もしない